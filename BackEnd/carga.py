@@ -0,0 +1,302 @@
+"""
+Generador de carga que simula el recorrido real de los clientes.
+
+Cada usuario virtual repite un escenario:
+  - cliente: ver menú, abrir producto, armar carrito, validar cupón,
+    crear pedido, pagar, consultar el seguimiento del envío
+  - admin: revisar alertas de stock y actualizar el stock de un ingrediente
+
+Se reportan throughput y p50/p95/p99 por paso. Los resultados pueden guardarse
+como línea base y las corridas siguientes se comparan contra ella; si algún
+paso empeora más que la tolerancia, el script termina con código 1.
+
+Requiere httpx (pip install httpx) y la API corriendo con datos cargados
+(seed_data.py o el generador de datos a escala).
+
+Ejecutar:
+    python carga.py --usuarios 50 --duracion 60
+    python carga.py --guardar-baseline baseline_carga.json
+    python carga.py --baseline baseline_carga.json --tolerancia 0.15
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import httpx
+
+
+class Resultados:
+    def __init__(self):
+        self.latencias: Dict[str, List[float]] = defaultdict(list)
+        self.errores: Dict[str, int] = defaultdict(int)
+        self.inicio = time.perf_counter()
+        self.fin: Optional[float] = None
+
+    def registrar(self, paso: str, segundos: float, ok: bool):
+        self.latencias[paso].append(segundos)
+        if not ok:
+            self.errores[paso] += 1
+
+    def resumen(self) -> dict:
+        duracion = (self.fin or time.perf_counter()) - self.inicio
+        pasos = {}
+        for paso, valores in sorted(self.latencias.items()):
+            ordenados = sorted(valores)
+            pasos[paso] = {
+                "peticiones": len(ordenados),
+                "errores": self.errores.get(paso, 0),
+                "rps": round(len(ordenados) / duracion, 2),
+                "p50_ms": round(percentil(ordenados, 50) * 1000, 1),
+                "p95_ms": round(percentil(ordenados, 95) * 1000, 1),
+                "p99_ms": round(percentil(ordenados, 99) * 1000, 1),
+            }
+        total = sum(len(v) for v in self.latencias.values())
+        return {
+            "fecha": datetime.utcnow().isoformat(),
+            "duracion_s": round(duracion, 1),
+            "peticiones": total,
+            "rps": round(total / duracion, 2),
+            "errores": sum(self.errores.values()),
+            "pasos": pasos,
+        }
+
+
+def percentil(ordenados: List[float], p: float) -> float:
+    if not ordenados:
+        return 0.0
+    indice = min(len(ordenados) - 1, max(0, round(p / 100 * len(ordenados)) - 1))
+    return ordenados[indice]
+
+
+class Datos:
+    """Identificadores reales que usan los escenarios"""
+
+    def __init__(self):
+        self.productos: List[dict] = []
+        self.usuarios: List[dict] = []
+        self.cupones: List[str] = []
+        self.ingredientes: List[str] = []
+
+    async def cargar(self, cliente: httpx.AsyncClient):
+        menu = (await cliente.get("/api/menu/")).json()
+        for categoria in menu.get("categorias", []):
+            self.productos.extend(categoria.get("productos", []))
+        self.productos.extend(menu.get("sin_categoria", []))
+        self.usuarios = (await cliente.get("/api/usuarios/", params={"limit": 1000})).json()
+        self.cupones = [c["codigo"] for c in (await cliente.get("/api/cupones/", params={"activo": True})).json()]
+        self.ingredientes = [i["_id"] for i in (await cliente.get("/api/ingredientes/")).json()]
+
+        if not self.productos or not self.usuarios:
+            raise SystemExit("❌ No hay productos o usuarios: pobla la base antes de correr la carga")
+
+
+class UsuarioVirtual:
+    def __init__(self, cliente: httpx.AsyncClient, datos: Datos, resultados: Resultados, args):
+        self.cliente = cliente
+        self.datos = datos
+        self.resultados = resultados
+        self.args = args
+
+    async def paso(self, nombre: str, metodo: str, url: str, **kwargs) -> Optional[dict]:
+        inicio = time.perf_counter()
+        try:
+            try:
+                respuesta = await self.cliente.request(metodo, url, **kwargs)
+            except (httpx.ReadError, httpx.RemoteProtocolError):
+                # El servidor cerró una conexión keep-alive justo cuando se reutilizaba
+                # (timeout de inactividad o worker reciclado): un GET se puede repetir
+                if metodo != "GET":
+                    raise
+                respuesta = await self.cliente.request(metodo, url, **kwargs)
+            ok = respuesta.status_code < 400
+        except httpx.HTTPError:
+            respuesta, ok = None, False
+        self.resultados.registrar(nombre, time.perf_counter() - inicio, ok)
+        if ok and respuesta.content:
+            return respuesta.json()
+        return None
+
+    async def pensar(self):
+        if self.args.pausa > 0:
+            await asyncio.sleep(random.expovariate(1 / self.args.pausa))
+
+    async def escenario_cliente(self):
+        usuario = random.choice(self.datos.usuarios)
+        usuario_id = usuario["_id"]
+
+        await self.paso("menu", "GET", "/api/menu/")
+        await self.pensar()
+
+        elegidos = random.sample(self.datos.productos, k=min(len(self.datos.productos), random.randint(1, 3)))
+        for producto in elegidos:
+            await self.paso("producto", "GET", f"/api/productos/{producto['_id']}")
+            await self.pensar()
+
+        carrito = await self.paso("carrito_crear", "POST", "/api/carritos/", json={"usuario_id": usuario_id})
+        subtotal = 0.0
+        for producto in elegidos:
+            cantidad = random.randint(1, 2)
+            precio = float(producto.get("precio") or 0)
+            subtotal += precio * cantidad
+            if carrito is None:
+                # El checkout no depende del carrito: el error ya quedó contado
+                continue
+            await self.paso("carrito_item", "POST", f"/api/carritos/{carrito['_id']}/items", json={
+                "carrito_id": carrito["_id"],
+                "producto_id": producto["_id"],
+                "cantidad": cantidad,
+                "precio_unitario": precio,
+            })
+
+        if self.datos.cupones and random.random() < 0.3:
+            await self.paso("cupon_validar", "POST", f"/api/cupones/validar/{random.choice(self.datos.cupones)}")
+        await self.pensar()
+
+        pedido = await self.paso("pedido_crear", "POST", "/api/pedidos/", json={
+            "usuario_id": usuario_id,
+            "subtotal": subtotal,
+            "envio": 1990,
+            "total": subtotal + 1990,
+        })
+        if pedido is None:
+            return
+        for producto in elegidos:
+            await self.paso("pedido_item", "POST", f"/api/pedidos/{pedido['_id']}/items", json={
+                "pedido_id": pedido["_id"],
+                "producto_id": producto["_id"],
+                "cantidad": 1,
+                "precio_unitario": float(producto.get("precio") or 0),
+            })
+
+        pago = await self.paso("pago_crear", "POST", "/api/pagos/", json={
+            "pedido_id": pedido["_id"],
+            "pasarela": "webpay",
+            "monto": pedido["total"],
+            "medio": "tarjeta_credito",
+        })
+        if pago is None:
+            return
+        await self.paso("pago_aprobar", "POST", f"/api/pagos/{pago['_id']}/aprobar")
+
+        tracking = f"CARGA-{uuid.uuid4().hex[:12]}"
+        await self.paso("envio_crear", "POST", "/api/envios/", json={"tipo": "delivery", "tracking": tracking})
+        for _ in range(random.randint(1, 3)):
+            await self.pensar()
+            await self.paso("tracking", "GET", f"/api/envios/tracking/{tracking}")
+
+    async def escenario_admin(self):
+        await self.paso("stock_alertas", "GET", "/api/ingredientes/alertas")
+        await self.pensar()
+        if self.datos.ingredientes:
+            ingrediente_id = random.choice(self.datos.ingredientes)
+            await self.paso("stock_actualizar", "PUT", f"/api/ingredientes/{ingrediente_id}",
+                            json={"stock": random.randint(0, 200)})
+
+    async def correr(self, hasta: float):
+        while time.perf_counter() < hasta:
+            if random.random() < self.args.admin:
+                await self.escenario_admin()
+            else:
+                await self.escenario_cliente()
+
+
+def comparar(actual: dict, base: dict, tolerancia: float) -> List[str]:
+    """Pasos cuyo p95 subió o cuyo throughput bajó más que la tolerancia"""
+    regresiones = []
+    for paso, datos_base in base["pasos"].items():
+        datos = actual["pasos"].get(paso)
+        if datos is None:
+            continue
+        if datos_base["p95_ms"] and datos["p95_ms"] > datos_base["p95_ms"] * (1 + tolerancia):
+            regresiones.append(f"{paso}: p95 {datos_base['p95_ms']} → {datos['p95_ms']} ms")
+        if datos_base["rps"] and datos["rps"] < datos_base["rps"] * (1 - tolerancia):
+            regresiones.append(f"{paso}: rps {datos_base['rps']} → {datos['rps']}")
+        tasa_base = datos_base["errores"] / max(datos_base["peticiones"], 1)
+        tasa = datos["errores"] / max(datos["peticiones"], 1)
+        if tasa > tasa_base + 0.01:
+            regresiones.append(f"{paso}: errores {tasa_base:.1%} → {tasa:.1%}")
+    return regresiones
+
+
+def imprimir(resumen: dict, base: Optional[dict]):
+    print(f"\n📊 {resumen['peticiones']} peticiones en {resumen['duracion_s']} s "
+          f"({resumen['rps']} rps, {resumen['errores']} errores)\n")
+    print(f"{'paso':<18}{'n':>8}{'err':>6}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}  vs base p95")
+    for paso, datos in resumen["pasos"].items():
+        comparacion = ""
+        if base and paso in base["pasos"] and base["pasos"][paso]["p95_ms"]:
+            cambio = datos["p95_ms"] / base["pasos"][paso]["p95_ms"] - 1
+            comparacion = f"{cambio:+.0%}"
+        print(f"{paso:<18}{datos['peticiones']:>8}{datos['errores']:>6}{datos['rps']:>9}"
+              f"{datos['p50_ms']:>9}{datos['p95_ms']:>9}{datos['p99_ms']:>9}  {comparacion}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga del recorrido de compra")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--usuarios", type=int, default=50, help="Usuarios virtuales concurrentes")
+    parser.add_argument("--duracion", type=float, default=60, help="Segundos de carga")
+    parser.add_argument("--rampa", type=float, default=5, help="Segundos para arrancar todos los usuarios")
+    parser.add_argument("--pausa", type=float, default=0.0, help="Pausa media entre pasos (segundos)")
+    parser.add_argument("--admin", type=float, default=0.05, help="Fracción de escenarios de administración")
+    parser.add_argument("--semilla", type=int, default=None)
+    parser.add_argument("--salida", help="Guardar el resumen en un archivo JSON")
+    parser.add_argument("--baseline", help="Comparar contra un resumen guardado")
+    parser.add_argument("--guardar-baseline", help="Guardar esta corrida como línea base")
+    parser.add_argument("--tolerancia", type=float, default=0.10, help="Empeoramiento permitido vs la línea base")
+    args = parser.parse_args()
+
+    if args.semilla is not None:
+        random.seed(args.semilla)
+
+    # Las conexiones inactivas se descartan antes de que uvicorn las cierre (5 s por defecto)
+    limites = httpx.Limits(max_connections=args.usuarios, max_keepalive_connections=args.usuarios,
+                           keepalive_expiry=2)
+    async with httpx.AsyncClient(base_url=args.url, limits=limites, timeout=30) as cliente:
+        datos = Datos()
+        await datos.cargar(cliente)
+        print(f"🚀 {args.usuarios} usuarios virtuales durante {args.duracion:.0f} s contra {args.url} "
+              f"({len(datos.productos)} productos, {len(datos.usuarios)} usuarios)")
+
+        resultados = Resultados()
+        hasta = time.perf_counter() + args.duracion
+
+        async def arrancar(i: int):
+            await asyncio.sleep(args.rampa * i / max(args.usuarios, 1))
+            await UsuarioVirtual(cliente, datos, resultados, args).correr(hasta)
+
+        await asyncio.gather(*(arrancar(i) for i in range(args.usuarios)))
+        resultados.fin = time.perf_counter()
+
+    resumen = resultados.resumen()
+    base = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as archivo:
+            base = json.load(archivo)
+    imprimir(resumen, base)
+
+    for destino in (args.salida, args.guardar_baseline):
+        if destino:
+            with open(destino, "w", encoding="utf-8") as archivo:
+                json.dump(resumen, archivo, indent=2)
+            print(f"\n💾 Resumen guardado en {destino}")
+
+    if base:
+        regresiones = comparar(resumen, base, args.tolerancia)
+        if regresiones:
+            print(f"\n❌ Regresiones (tolerancia {args.tolerancia:.0%}):")
+            for regresion in regresiones:
+                print(f"   • {regresion}")
+            sys.exit(1)
+        print("\n✅ Sin regresiones respecto de la línea base")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1 @@
+# Este archivo indica que el directorio 'core' es un paquete de Python
@@ -0,0 +1,31 @@
+"""
+Autorización de los endpoints administrativos.
+
+Se usa un token compartido (ADMIN_TOKEN) enviado en el header X-Admin-Token.
+Si ADMIN_TOKEN no está configurado, los endpoints administrativos quedan
+deshabilitados.
+"""
+import os
+import secrets
+from typing import Optional
+
+from fastapi import Header, HTTPException, status
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+
+def token_admin_valido(token: Optional[str]) -> bool:
+    if not ADMIN_TOKEN or not token:
+        return False
+    return secrets.compare_digest(token, ADMIN_TOKEN)
+
+
+async def requerir_admin(x_admin_token: Optional[str] = Header(None)):
+    """Dependencia para endpoints que solo puede usar un administrador"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Endpoints administrativos deshabilitados (ADMIN_TOKEN no configurado)"
+        )
+    if not token_admin_valido(x_admin_token):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token de administrador inválido")
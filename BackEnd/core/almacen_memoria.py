@@ -0,0 +1,801 @@
+"""
+Almacenamiento en memoria con la misma interfaz que usamos de Motor.
+
+Con ALMACENAMIENTO=memoria, connect_to_mongo usa este cliente en lugar de
+AsyncIOMotorClient y get_collection devuelve colecciones en memoria. Sirve
+para correr la API sin mongod y para perfilar la capa de aplicación sin que
+la latencia de la base se mezcle en las mediciones.
+
+Implementa el subconjunto de la API de colecciones que usan los routers y
+los módulos de core: find (con skip/limit/sort/proyección), find_one,
+insert_one/many, update_one/many (con upsert), find_one_and_update,
+delete_one/many, count_documents, distinct, bulk_write y aggregate con las
+etapas simples ($match, $sort, $skip, $limit, $project, $group, $unwind,
+$count). Los operadores de consulta soportados son los de comparación,
+$in/$nin, $exists, $regex, $and/$or/$nor y $not; los de actualización,
+$set/$unset/$inc/$min/$max/$setOnInsert/$push/$addToSet/$pull.
+
+Los índices creados con create_index se mantienen como diccionarios por el
+primer campo: una consulta con igualdad (o $in) sobre ese campo solo recorre
+los documentos que coinciden. Los índices únicos lanzan DuplicateKeyError
+como el servidor. Los documentos se copian al guardarlos y al devolverlos,
+así que modificar un resultado no altera lo almacenado.
+"""
+import re
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set
+
+from bson import ObjectId
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError, OperationFailure
+from pymongo.results import BulkWriteResult, DeleteResult, InsertManyResult, InsertOneResult, UpdateResult
+
+_FALTA = object()
+
+
+# ============= UTILIDADES =============
+
+def _copiar(valor):
+    # Más rápido que deepcopy: los escalares de BSON son inmutables
+    if isinstance(valor, dict):
+        return {k: _copiar(v) for k, v in valor.items()}
+    if isinstance(valor, list):
+        return [_copiar(v) for v in valor]
+    return valor
+
+
+def _obtener(doc, ruta: str):
+    """Valor de un campo con notación de puntos, o _FALTA"""
+    actual = doc
+    for parte in ruta.split("."):
+        if isinstance(actual, dict):
+            actual = actual.get(parte, _FALTA)
+        elif isinstance(actual, list) and parte.isdigit() and int(parte) < len(actual):
+            actual = actual[int(parte)]
+        else:
+            return _FALTA
+        if actual is _FALTA:
+            return _FALTA
+    return actual
+
+
+def _asignar(doc: dict, ruta: str, valor):
+    partes = ruta.split(".")
+    for parte in partes[:-1]:
+        doc = doc.setdefault(parte, {})
+    doc[partes[-1]] = valor
+
+
+def _quitar(doc: dict, ruta: str):
+    partes = ruta.split(".")
+    for parte in partes[:-1]:
+        doc = doc.get(parte)
+        if not isinstance(doc, dict):
+            return
+    doc.pop(partes[-1], None)
+
+
+# Orden de tipos de BSON al comparar valores de distinto tipo
+def _rango(valor) -> int:
+    if valor is None or valor is _FALTA:
+        return 1
+    if isinstance(valor, bool):
+        return 8
+    if isinstance(valor, (int, float)):
+        return 2
+    if isinstance(valor, str):
+        return 3
+    if isinstance(valor, dict):
+        return 4
+    if isinstance(valor, list):
+        return 5
+    if isinstance(valor, ObjectId):
+        return 7
+    if isinstance(valor, datetime):
+        return 9
+    return 10
+
+
+def _clave_orden(valor):
+    if valor is _FALTA:
+        valor = None
+    rango = _rango(valor)
+    if rango in (1, 4, 5, 10):
+        return (rango, repr(valor))
+    return (rango, valor)
+
+
+def _comparar(a, b) -> int:
+    ka, kb = _clave_orden(a), _clave_orden(b)
+    return (ka > kb) - (ka < kb)
+
+
+def _hashable(valor):
+    if isinstance(valor, (dict, list)):
+        return repr(valor)
+    return valor
+
+
+# ============= CONSULTAS =============
+
+def _candidatos(valor) -> list:
+    # Un campo arreglo coincide si coincide el arreglo o cualquiera de sus elementos
+    if isinstance(valor, list):
+        return [valor] + valor
+    return [valor]
+
+
+def _igual(valor, esperado) -> bool:
+    if esperado is None:
+        return valor is _FALTA or valor is None or (isinstance(valor, list) and None in valor)
+    if valor is _FALTA:
+        return False
+    return any(c == esperado and _rango(c) == _rango(esperado) for c in _candidatos(valor))
+
+
+def _operador(valor, operador: str, argumento) -> bool:
+    if operador == "$eq":
+        return _igual(valor, argumento)
+    if operador == "$ne":
+        return not _igual(valor, argumento)
+    if operador in ("$gt", "$gte", "$lt", "$lte"):
+        if valor is _FALTA:
+            return False
+        for candidato in _candidatos(valor):
+            # Como en MongoDB, solo se comparan valores del mismo tipo
+            if _rango(candidato) != _rango(argumento):
+                continue
+            orden = _comparar(candidato, argumento)
+            if (
+                (operador == "$gt" and orden > 0) or (operador == "$gte" and orden >= 0)
+                or (operador == "$lt" and orden < 0) or (operador == "$lte" and orden <= 0)
+            ):
+                return True
+        return False
+    if operador == "$in":
+        return any(_igual(valor, opcion) for opcion in argumento)
+    if operador == "$nin":
+        return not any(_igual(valor, opcion) for opcion in argumento)
+    if operador == "$exists":
+        return (valor is not _FALTA) == bool(argumento)
+    if operador == "$regex":
+        patron = argumento if isinstance(argumento, re.Pattern) else re.compile(argumento)
+        return any(isinstance(c, str) and patron.search(c) for c in _candidatos(valor))
+    if operador == "$size":
+        return isinstance(valor, list) and len(valor) == argumento
+    if operador == "$not":
+        return not _cumple_condicion(valor, argumento)
+    raise OperationFailure(f"Operador no soportado en memoria: {operador}")
+
+
+def _cumple_condicion(valor, condicion) -> bool:
+    if isinstance(condicion, re.Pattern):
+        return _operador(valor, "$regex", condicion)
+    if isinstance(condicion, dict) and condicion and all(k.startswith("$") for k in condicion):
+        if "$regex" in condicion:
+            flags = re.IGNORECASE if "i" in condicion.get("$options", "") else 0
+            condicion = {**condicion, "$regex": re.compile(condicion["$regex"], flags)}
+            condicion.pop("$options", None)
+        return all(_operador(valor, op, arg) for op, arg in condicion.items())
+    return _igual(valor, condicion)
+
+
+def coincide(doc: dict, filtro: Optional[dict]) -> bool:
+    """El documento cumple el filtro de MongoDB"""
+    if not filtro:
+        return True
+    for clave, condicion in filtro.items():
+        if clave == "$and":
+            if not all(coincide(doc, f) for f in condicion):
+                return False
+        elif clave == "$or":
+            if not any(coincide(doc, f) for f in condicion):
+                return False
+        elif clave == "$nor":
+            if any(coincide(doc, f) for f in condicion):
+                return False
+        elif clave.startswith("$"):
+            raise OperationFailure(f"Operador no soportado en memoria: {clave}")
+        elif not _cumple_condicion(_obtener(doc, clave), condicion):
+            return False
+    return True
+
+
+def _normalizar_orden(clave, direccion=None) -> list:
+    if isinstance(clave, str):
+        return [(clave, direccion if direccion is not None else ASCENDING)]
+    if isinstance(clave, dict):
+        return list(clave.items())
+    return list(clave)
+
+
+def _ordenar(docs: list, orden: list) -> list:
+    # Ordenamientos estables sucesivos, del último criterio al primero
+    for campo, direccion in reversed(orden):
+        docs.sort(key=lambda d: _clave_orden(_obtener(d, campo)), reverse=direccion < 0)
+    return docs
+
+
+def _proyectar(doc: dict, proyeccion) -> dict:
+    if not proyeccion:
+        return doc
+    if isinstance(proyeccion, (list, tuple)):
+        proyeccion = {campo: 1 for campo in proyeccion}
+    incluir = {k for k, v in proyeccion.items() if v and k != "_id"}
+    incluir_id = proyeccion.get("_id", 1)
+    if incluir:
+        resultado = {}
+        if incluir_id and "_id" in doc:
+            resultado["_id"] = doc["_id"]
+        for campo in incluir:
+            valor = _obtener(doc, campo)
+            if valor is not _FALTA:
+                _asignar(resultado, campo, valor)
+        return resultado
+    resultado = dict(doc)
+    for campo, valor in proyeccion.items():
+        if not valor:
+            _quitar(resultado, campo)
+    return resultado
+
+
+# ============= ACTUALIZACIONES =============
+
+def _aplicar(doc: dict, actualizacion: dict, insertando: bool = False) -> bool:
+    """Aplicar operadores de actualización; devuelve si el documento cambió"""
+    if not actualizacion or not all(k.startswith("$") for k in actualizacion):
+        raise ValueError("update only works with $ operators")
+    antes = _copiar(doc)
+    for operador, campos in actualizacion.items():
+        for campo, valor in campos.items():
+            actual = _obtener(doc, campo)
+            if operador == "$set" or (operador == "$setOnInsert" and insertando):
+                _asignar(doc, campo, _copiar(valor))
+            elif operador == "$setOnInsert":
+                continue
+            elif operador == "$unset":
+                _quitar(doc, campo)
+            elif operador == "$inc":
+                _asignar(doc, campo, (0 if actual is _FALTA else actual) + valor)
+            elif operador == "$max":
+                if actual is _FALTA or _comparar(valor, actual) > 0:
+                    _asignar(doc, campo, valor)
+            elif operador == "$min":
+                if actual is _FALTA or _comparar(valor, actual) < 0:
+                    _asignar(doc, campo, valor)
+            elif operador in ("$push", "$addToSet"):
+                lista = [] if actual is _FALTA else actual
+                nuevos = valor["$each"] if isinstance(valor, dict) and "$each" in valor else [valor]
+                for nuevo in nuevos:
+                    if operador == "$push" or nuevo not in lista:
+                        lista.append(_copiar(nuevo))
+                _asignar(doc, campo, lista)
+            elif operador == "$pull":
+                if isinstance(actual, list):
+                    _asignar(doc, campo, [v for v in actual if not _cumple_condicion(v, valor)])
+            else:
+                raise OperationFailure(f"Operador de actualización no soportado en memoria: {operador}")
+    return doc != antes
+
+
+def _doc_upsert(filtro: dict) -> dict:
+    """Documento base de un upsert: las igualdades del filtro"""
+    doc = {}
+    for clave, condicion in (filtro or {}).items():
+        if clave.startswith("$"):
+            continue
+        if isinstance(condicion, dict) and any(k.startswith("$") for k in condicion):
+            if "$eq" in condicion:
+                _asignar(doc, clave, _copiar(condicion["$eq"]))
+            continue
+        _asignar(doc, clave, _copiar(condicion))
+    return doc
+
+
+# ============= ÍNDICES =============
+
+class IndiceMemoria:
+    def __init__(self, nombre: str, claves: list, unique: bool):
+        self.nombre = nombre
+        self.claves = claves
+        self.unique = unique
+        # Valor del primer campo -> _id de los documentos
+        self.entradas: Dict[object, Set[object]] = {}
+
+    @property
+    def campo(self) -> str:
+        return self.claves[0][0]
+
+    def _valores(self, doc: dict) -> list:
+        valor = _obtener(doc, self.campo)
+        if valor is _FALTA:
+            return [None]
+        # Multikey: un arreglo se indexa por cada elemento
+        return [_hashable(v) for v in valor] if isinstance(valor, list) and valor else [_hashable(valor)]
+
+    def _clave_unica(self, doc: dict) -> tuple:
+        return tuple(_hashable(None if (v := _obtener(doc, campo)) is _FALTA else v) for campo, _ in self.claves)
+
+    def verificar(self, doc: dict, documentos: Dict[object, dict], ignorar=None):
+        if not self.unique:
+            return
+        clave = self._clave_unica(doc)
+        for valor in self._valores(doc):
+            for _id in self.entradas.get(valor, ()):
+                if _id != ignorar and self._clave_unica(documentos[_id]) == clave:
+                    raise DuplicateKeyError(f"E11000 duplicate key error index: {self.nombre} dup key: {clave}")
+
+    def agregar(self, doc: dict):
+        for valor in self._valores(doc):
+            self.entradas.setdefault(valor, set()).add(_hashable(doc["_id"]))
+
+    def quitar(self, doc: dict):
+        for valor in self._valores(doc):
+            ids = self.entradas.get(valor)
+            if ids is not None:
+                ids.discard(_hashable(doc["_id"]))
+                if not ids:
+                    del self.entradas[valor]
+
+    def buscar(self, condicion) -> Optional[Set[object]]:
+        return _ids_candidatos(condicion, lambda valor: self.entradas.get(_hashable(valor), set()))
+
+
+def _ids_candidatos(condicion, ids_con_valor) -> Optional[Set[object]]:
+    """_id que pueden cumplir una condición de igualdad o $in, o None si no aplica"""
+    if isinstance(condicion, dict) and condicion and all(k.startswith("$") for k in condicion):
+        if set(condicion) == {"$eq"}:
+            condicion = condicion["$eq"]
+        elif set(condicion) == {"$in"}:
+            ids = set()
+            for opcion in condicion["$in"]:
+                ids |= ids_con_valor(opcion)
+            return ids
+        else:
+            return None
+    if isinstance(condicion, (dict, list, re.Pattern)) or condicion is None:
+        return None
+    return set(ids_con_valor(condicion))
+
+
+# ============= CURSORES =============
+
+class CursorMemoria:
+    """Cursor perezoso: el filtro se evalúa al llamar a to_list o al iterar"""
+
+    def __init__(self, coleccion: "ColeccionMemoria", filtro=None, projection=None,
+                 sort=None, skip: int = 0, limit: int = 0):
+        self._coleccion = coleccion
+        self._filtro = filtro or {}
+        self._proyeccion = projection
+        self._orden = _normalizar_orden(sort) if sort else []
+        self._skip = skip
+        self._limit = limit
+
+    def sort(self, clave, direccion=None):
+        self._orden = _normalizar_orden(clave, direccion)
+        return self
+
+    def skip(self, n: int):
+        self._skip = n
+        return self
+
+    def limit(self, n: int):
+        self._limit = n
+        return self
+
+    def _resultados(self) -> list:
+        docs = self._coleccion._filtrar(self._filtro)
+        if self._orden:
+            docs = _ordenar(docs, self._orden)
+        docs = docs[self._skip:]
+        if self._limit:
+            docs = docs[:self._limit]
+        return [_proyectar(_copiar(doc), self._proyeccion) for doc in docs]
+
+    async def to_list(self, length: Optional[int] = None) -> list:
+        docs = self._resultados()
+        return docs if length is None else docs[:length]
+
+    def __aiter__(self):
+        return self._iterar()
+
+    async def _iterar(self):
+        for doc in self._resultados():
+            yield doc
+
+
+class CursorAgregacion:
+    def __init__(self, docs: list):
+        self._docs = docs
+
+    async def to_list(self, length: Optional[int] = None) -> list:
+        return self._docs if length is None else self._docs[:length]
+
+    def __aiter__(self):
+        return self._iterar()
+
+    async def _iterar(self):
+        for doc in self._docs:
+            yield doc
+
+
+# ============= AGREGACIÓN =============
+
+def _expresion(doc: dict, expresion):
+    if isinstance(expresion, str) and expresion.startswith("$"):
+        valor = _obtener(doc, expresion[1:])
+        return None if valor is _FALTA else valor
+    if isinstance(expresion, dict):
+        return {k: _expresion(doc, v) for k, v in expresion.items()}
+    return expresion
+
+
+def _agrupar(docs: list, etapa: dict) -> list:
+    grupos: Dict[object, dict] = {}
+    valores: Dict[object, Dict[str, list]] = {}
+    for doc in docs:
+        _id = _expresion(doc, etapa["_id"])
+        clave = _hashable(_id)
+        if clave not in grupos:
+            grupos[clave] = {"_id": _id}
+            valores[clave] = {campo: [] for campo in etapa if campo != "_id"}
+        for campo, acumulador in etapa.items():
+            if campo != "_id":
+                (operador, expresion), = acumulador.items()
+                valores[clave][campo].append(_expresion(doc, expresion))
+
+    for clave, grupo in grupos.items():
+        for campo, acumulador in etapa.items():
+            if campo == "_id":
+                continue
+            operador = next(iter(acumulador))
+            lista = valores[clave][campo]
+            numeros = [v for v in lista if isinstance(v, (int, float)) and not isinstance(v, bool)]
+            if operador == "$sum":
+                grupo[campo] = sum(numeros)
+            elif operador == "$avg":
+                grupo[campo] = sum(numeros) / len(numeros) if numeros else None
+            elif operador == "$min":
+                grupo[campo] = min((v for v in lista if v is not None), key=_clave_orden, default=None)
+            elif operador == "$max":
+                grupo[campo] = max((v for v in lista if v is not None), key=_clave_orden, default=None)
+            elif operador == "$first":
+                grupo[campo] = lista[0] if lista else None
+            elif operador == "$last":
+                grupo[campo] = lista[-1] if lista else None
+            elif operador == "$push":
+                grupo[campo] = lista
+            elif operador == "$addToSet":
+                grupo[campo] = list({_hashable(v): v for v in lista}.values())
+            else:
+                raise OperationFailure(f"Acumulador no soportado en memoria: {operador}")
+    return list(grupos.values())
+
+
+def agregar(docs: list, pipeline: Iterable[dict]) -> list:
+    for etapa in pipeline:
+        (nombre, argumento), = etapa.items()
+        if nombre == "$match":
+            docs = [doc for doc in docs if coincide(doc, argumento)]
+        elif nombre == "$sort":
+            docs = _ordenar(list(docs), _normalizar_orden(argumento))
+        elif nombre == "$skip":
+            docs = docs[argumento:]
+        elif nombre == "$limit":
+            docs = docs[:argumento]
+        elif nombre == "$project":
+            calculados = {k: v for k, v in argumento.items() if not isinstance(v, (int, bool))}
+            simples = {k: v for k, v in argumento.items() if isinstance(v, (int, bool))}
+            resultado = []
+            for doc in docs:
+                nuevo = _proyectar(doc, simples) if simples else dict(doc)
+                for campo, expresion in calculados.items():
+                    nuevo[campo] = _expresion(doc, expresion)
+                resultado.append(nuevo)
+            docs = resultado
+        elif nombre == "$group":
+            docs = _agrupar(docs, argumento)
+        elif nombre == "$unwind":
+            ruta = (argumento if isinstance(argumento, str) else argumento["path"])[1:]
+            resultado = []
+            for doc in docs:
+                for elemento in _obtener(doc, ruta) or []:
+                    nuevo = dict(doc)
+                    _asignar(nuevo, ruta, elemento)
+                    resultado.append(nuevo)
+            docs = resultado
+        elif nombre == "$count":
+            docs = [{argumento: len(docs)}] if docs else []
+        else:
+            raise OperationFailure(f"Etapa de agregación no soportada en memoria: {nombre}")
+    return docs
+
+
+# ============= COLECCIONES =============
+
+class ColeccionMemoria:
+    def __init__(self, database: "BaseMemoria", nombre: str):
+        self.database = database
+        self.name = nombre
+        self._docs: Dict[object, dict] = {}
+        self._indices: Dict[str, IndiceMemoria] = {}
+        # Orden de inserción de cada documento (para devolver en orden natural)
+        self._posicion: Dict[object, int] = {}
+        self._contador = 0
+
+    # ----- lectura -----
+
+    def _filtrar(self, filtro: dict) -> list:
+        """Documentos almacenados (sin copiar) que cumplen el filtro"""
+        ids = None
+        if "_id" in filtro:
+            ids = _ids_candidatos(filtro["_id"], lambda valor: {_hashable(valor)} & self._docs.keys())
+        if ids is None:
+            for indice in self._indices.values():
+                if indice.campo in filtro:
+                    ids = indice.buscar(filtro[indice.campo])
+                    if ids is not None:
+                        break
+        if ids is None:
+            return [doc for doc in self._docs.values() if coincide(doc, filtro)]
+        # Se conserva el orden de inserción, como en un recorrido natural
+        return [
+            self._docs[_id] for _id in sorted(ids, key=self._posicion.__getitem__)
+            if coincide(self._docs[_id], filtro)
+        ]
+
+    def find(self, filter=None, projection=None, sort=None, skip: int = 0, limit: int = 0, **kwargs):
+        return CursorMemoria(self, filter, projection, sort, skip, limit)
+
+    async def find_one(self, filter=None, projection=None, sort=None, **kwargs):
+        if filter is not None and not isinstance(filter, dict):
+            filter = {"_id": filter}
+        docs = await CursorMemoria(self, filter, projection, sort, limit=1).to_list()
+        return docs[0] if docs else None
+
+    async def count_documents(self, filter, **kwargs) -> int:
+        return len(self._filtrar(filter or {}))
+
+    async def estimated_document_count(self, **kwargs) -> int:
+        return len(self._docs)
+
+    async def distinct(self, key: str, filter=None, **kwargs) -> list:
+        valores = {}
+        for doc in self._filtrar(filter or {}):
+            valor = _obtener(doc, key)
+            if valor is _FALTA:
+                continue
+            for v in (valor if isinstance(valor, list) else [valor]):
+                valores.setdefault(_hashable(v), v)
+        return list(valores.values())
+
+    def aggregate(self, pipeline, **kwargs) -> CursorAgregacion:
+        docs = [_copiar(doc) for doc in self._docs.values()]
+        return CursorAgregacion(agregar(docs, pipeline))
+
+    # ----- escritura -----
+
+    def _insertar(self, doc: dict):
+        if "_id" not in doc:
+            # Como pymongo: el _id generado queda en el documento original
+            doc["_id"] = ObjectId()
+        guardado = _copiar(doc)
+        if _hashable(guardado["_id"]) in self._docs:
+            raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} index: _id_")
+        for indice in self._indices.values():
+            indice.verificar(guardado, self._docs)
+        clave = _hashable(guardado["_id"])
+        self._docs[clave] = guardado
+        self._contador += 1
+        self._posicion[clave] = self._contador
+        for indice in self._indices.values():
+            indice.agregar(guardado)
+        return guardado["_id"]
+
+    def _reemplazar(self, anterior: dict, nuevo: dict):
+        for indice in self._indices.values():
+            indice.verificar(nuevo, self._docs, ignorar=_hashable(anterior["_id"]))
+        for indice in self._indices.values():
+            indice.quitar(anterior)
+        self._docs[_hashable(nuevo["_id"])] = nuevo
+        for indice in self._indices.values():
+            indice.agregar(nuevo)
+
+    def _borrar(self, doc: dict):
+        for indice in self._indices.values():
+            indice.quitar(doc)
+        clave = _hashable(doc["_id"])
+        del self._docs[clave]
+        del self._posicion[clave]
+
+    def _actualizar(self, filtro: dict, actualizacion: dict, upsert: bool, multi: bool, sort=None) -> dict:
+        docs = self._filtrar(filtro or {})
+        if sort:
+            docs = _ordenar(docs, _normalizar_orden(sort))
+        if not multi:
+            docs = docs[:1]
+        modificados = 0
+        for doc in docs:
+            nuevo = _copiar(doc)
+            if _aplicar(nuevo, actualizacion):
+                self._reemplazar(doc, nuevo)
+                modificados += 1
+        resultado = {"n": len(docs), "nModified": modificados, "updatedExisting": bool(docs)}
+        if not docs and upsert:
+            nuevo = _doc_upsert(filtro)
+            _aplicar(nuevo, actualizacion, insertando=True)
+            resultado["upserted"] = self._insertar(nuevo)
+            resultado["n"] = 1
+        return resultado
+
+    async def insert_one(self, document: dict, **kwargs) -> InsertOneResult:
+        return InsertOneResult(self._insertar(document), True)
+
+    async def insert_many(self, documents: Iterable[dict], ordered: bool = True, **kwargs) -> InsertManyResult:
+        ids, error = [], None
+        for doc in documents:
+            try:
+                ids.append(self._insertar(doc))
+            except DuplicateKeyError as exc:
+                if ordered:
+                    raise
+                error = exc
+        if error is not None:
+            raise error
+        return InsertManyResult(ids, True)
+
+    async def update_one(self, filter, update, upsert: bool = False, sort=None, **kwargs) -> UpdateResult:
+        return UpdateResult(self._actualizar(filter, update, upsert, multi=False, sort=sort), True)
+
+    async def update_many(self, filter, update, upsert: bool = False, **kwargs) -> UpdateResult:
+        return UpdateResult(self._actualizar(filter, update, upsert, multi=True), True)
+
+    async def find_one_and_update(self, filter, update, projection=None, sort=None, upsert: bool = False,
+                                  return_document=ReturnDocument.BEFORE, **kwargs):
+        docs = self._filtrar(filter or {})
+        if sort:
+            docs = _ordenar(docs, _normalizar_orden(sort))
+        if docs:
+            anterior = docs[0]
+            nuevo = _copiar(anterior)
+            if _aplicar(nuevo, update):
+                self._reemplazar(anterior, nuevo)
+            resultado = nuevo if return_document == ReturnDocument.AFTER else anterior
+        elif upsert:
+            nuevo = _doc_upsert(filter)
+            _aplicar(nuevo, update, insertando=True)
+            self._insertar(nuevo)
+            resultado = nuevo if return_document == ReturnDocument.AFTER else None
+        else:
+            resultado = None
+        return None if resultado is None else _proyectar(_copiar(resultado), projection)
+
+    async def find_one_and_delete(self, filter, projection=None, sort=None, **kwargs):
+        docs = self._filtrar(filter or {})
+        if sort:
+            docs = _ordenar(docs, _normalizar_orden(sort))
+        if not docs:
+            return None
+        self._borrar(docs[0])
+        return _proyectar(_copiar(docs[0]), projection)
+
+    async def delete_one(self, filter, **kwargs) -> DeleteResult:
+        docs = self._filtrar(filter or {})[:1]
+        for doc in docs:
+            self._borrar(doc)
+        return DeleteResult({"n": len(docs)}, True)
+
+    async def delete_many(self, filter, **kwargs) -> DeleteResult:
+        docs = self._filtrar(filter or {})
+        for doc in docs:
+            self._borrar(doc)
+        return DeleteResult({"n": len(docs)}, True)
+
+    async def bulk_write(self, requests: list, ordered: bool = True, **kwargs) -> BulkWriteResult:
+        """Operaciones de pymongo (InsertOne, UpdateOne, UpdateMany, DeleteOne, DeleteMany)"""
+        total = {"nInserted": 0, "nUpserted": 0, "nMatched": 0, "nModified": 0, "nRemoved": 0, "upserted": []}
+        for indice, operacion in enumerate(requests):
+            tipo = type(operacion).__name__
+            if tipo == "InsertOne":
+                self._insertar(operacion._doc)
+                total["nInserted"] += 1
+            elif tipo in ("UpdateOne", "UpdateMany"):
+                resultado = self._actualizar(operacion._filter, operacion._doc, bool(operacion._upsert),
+                                             multi=tipo == "UpdateMany")
+                if "upserted" in resultado:
+                    total["nUpserted"] += 1
+                    total["upserted"].append({"index": indice, "_id": resultado["upserted"]})
+                else:
+                    total["nMatched"] += resultado["n"]
+                    total["nModified"] += resultado["nModified"]
+            elif tipo in ("DeleteOne", "DeleteMany"):
+                docs = self._filtrar(operacion._filter or {})
+                for doc in docs if tipo == "DeleteMany" else docs[:1]:
+                    self._borrar(doc)
+                    total["nRemoved"] += 1
+            else:
+                raise OperationFailure(f"Operación no soportada en memoria: {tipo}")
+        return BulkWriteResult(total, True)
+
+    # ----- administración -----
+
+    async def create_index(self, keys, unique: bool = False, name: Optional[str] = None, **kwargs) -> str:
+        claves = _normalizar_orden(keys)
+        nombre = name or "_".join(f"{campo}_{direccion}" for campo, direccion in claves)
+        if nombre not in self._indices:
+            indice = IndiceMemoria(nombre, claves, unique)
+            for doc in self._docs.values():
+                indice.verificar(doc, self._docs, ignorar=_hashable(doc["_id"]))
+                indice.agregar(doc)
+            self._indices[nombre] = indice
+        return nombre
+
+    async def index_information(self) -> dict:
+        informacion = {"_id_": {"key": [("_id", 1)]}}
+        for nombre, indice in self._indices.items():
+            informacion[nombre] = {"key": indice.claves, **({"unique": True} if indice.unique else {})}
+        return informacion
+
+    async def drop_index(self, nombre: str):
+        self._indices.pop(nombre, None)
+
+    async def drop(self):
+        self.database._colecciones.pop(self.name, None)
+
+    def with_options(self, **kwargs) -> "ColeccionMemoria":
+        # Read preference, write concern, etc. no aplican en memoria
+        return self
+
+
+# ============= BASE Y CLIENTE =============
+
+class BaseMemoria:
+    def __init__(self, nombre: str):
+        self.name = nombre
+        self._colecciones: Dict[str, ColeccionMemoria] = {}
+
+    def __getitem__(self, nombre: str) -> ColeccionMemoria:
+        coleccion = self._colecciones.get(nombre)
+        if coleccion is None:
+            coleccion = self._colecciones[nombre] = ColeccionMemoria(self, nombre)
+        return coleccion
+
+    def __getattr__(self, nombre: str) -> ColeccionMemoria:
+        if nombre.startswith("_"):
+            raise AttributeError(nombre)
+        return self[nombre]
+
+    def get_collection(self, nombre: str, **kwargs) -> ColeccionMemoria:
+        return self[nombre]
+
+    async def list_collection_names(self, **kwargs) -> List[str]:
+        return list(self._colecciones)
+
+    async def drop_collection(self, nombre: str):
+        self._colecciones.pop(nombre, None)
+
+    async def command(self, comando, **kwargs) -> dict:
+        nombre = comando if isinstance(comando, str) else next(iter(comando))
+        if nombre in ("ping", "hello", "isMaster", "ismaster"):
+            return {"ok": 1.0}
+        raise OperationFailure(f"Comando no soportado en memoria: {nombre}")
+
+
+class ClienteMemoria:
+    """Reemplazo de AsyncIOMotorClient sin servidor"""
+
+    def __init__(self):
+        self._bases: Dict[str, BaseMemoria] = {}
+
+    def __getitem__(self, nombre: str) -> BaseMemoria:
+        base = self._bases.get(nombre)
+        if base is None:
+            base = self._bases[nombre] = BaseMemoria(nombre)
+        return base
+
+    def get_database(self, nombre: str, **kwargs) -> BaseMemoria:
+        return self[nombre]
+
+    def close(self):
+        pass
@@ -0,0 +1,223 @@
+"""
+Calentamiento al arrancar, antes de recibir tráfico.
+
+Justo después de un deploy las primeras peticiones pagaban conexiones del pool
+abiertas a demanda, esquemas y validadores construidos en el primer uso y
+cachés vacías. El lifespan ejecuta estas etapas en orden y cada una se mide:
+
+  pool         abre MONGO_MIN_POOL_SIZE conexiones con pings concurrentes
+  indices      crea (si faltan) los índices de las consultas frecuentes
+  validadores  construye los validadores y serializadores de los modelos
+  openapi      genera el documento OpenAPI que sirve /docs
+  catalogo     precarga productos, categorías e ingredientes en la caché por _id
+  menu         construye el snapshot comprimido de GET /api/menu
+  bcrypt       carga el backend de bcrypt con un hash y una verificación
+
+Una etapa que falla o supera ARRANQUE_TIMEOUT_ETAPA se registra y el arranque
+sigue: el calentamiento acelera, no condiciona. GET /ready responde 503 hasta
+que terminan todas las etapas.
+"""
+import asyncio
+import importlib
+import inspect
+import logging
+import os
+import pkgutil
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, ValidationError
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import PyMongoError
+
+import models
+from core.idempotencia import IDEMPOTENCIA_TTL
+from core.menu import menu_cache
+from core.metricas import registro
+from core.webhooks import WEBHOOK_RETENCION
+from database import MONGO_MIN_POOL_SIZE, caches, get_collection
+
+logger = logging.getLogger("freshbowl.arranque")
+
+# Con false el servidor acepta tráfico de inmediato y calienta en segundo plano
+ARRANQUE_ESPERAR = os.getenv("ARRANQUE_ESPERAR", "true").lower() in ("1", "true", "yes")
+ARRANQUE_TIMEOUT_ETAPA = float(os.getenv("ARRANQUE_TIMEOUT_ETAPA", "30"))
+
+# (colección, claves, opciones) de las consultas que hacen los routers
+INDICES: List[Tuple[str, list, dict]] = [
+    ("usuarios", [("email", ASCENDING)], {}),
+    ("usuario_roles", [("usuario_id", ASCENDING)], {}),
+    ("categorias", [("slug", ASCENDING)], {}),
+    ("productos", [("categoria_id", ASCENDING)], {}),
+    ("variantes", [("producto_id", ASCENDING)], {}),
+    ("producto_ingredientes", [("producto_id", ASCENDING)], {}),
+    ("cupones", [("codigo", ASCENDING)], {}),
+    ("carritos", [("usuario_id", ASCENDING), ("estado", ASCENDING)], {}),
+    ("carrito_items", [("carrito_id", ASCENDING)], {}),
+    ("direcciones", [("usuario_id", ASCENDING)], {}),
+    ("pedidos", [("usuario_id", ASCENDING), ("creado_en", DESCENDING)], {}),
+    ("pedidos", [("creado_en", DESCENDING)], {}),
+    ("pedido_items", [("pedido_id", ASCENDING)], {}),
+    ("pagos", [("pedido_id", ASCENDING)], {}),
+    ("envios", [("pedido_id", ASCENDING)], {}),
+    ("envios", [("tracking", ASCENDING)], {}),
+    ("comprobantes", [("pedido_id", ASCENDING)], {}),
+    ("comprobantes", [("numero", ASCENDING)], {}),
+    ("notificaciones", [("usuario_id", ASCENDING)], {}),
+    # Borra las claves de idempotencia vencidas
+    ("idempotencia", [("creado_en", ASCENDING)], {"expireAfterSeconds": IDEMPOTENCIA_TTL}),
+    # Barrido de la bandeja de webhooks y borrado de los eventos ya procesados
+    ("webhook_eventos", [("estado", ASCENDING), ("recibido_en", ASCENDING)], {}),
+    ("webhook_eventos", [("procesado_en", ASCENDING)], {"expireAfterSeconds": WEBHOOK_RETENCION}),
+    # Eventos anteriores aún pendientes del mismo pedido
+    ("webhook_eventos", [("pedido_id", ASCENDING), ("estado", ASCENDING), ("recibido_en", ASCENDING)], {}),
+]
+
+arranque_etapa_duracion = registro.gauge(
+    "freshbowl_startup_stage_duration_seconds", "Duración de cada etapa del calentamiento", ("stage", "outcome"))
+arranque_listo = registro.gauge(
+    "freshbowl_ready", "1 cuando el calentamiento terminó y la instancia acepta tráfico")
+
+
+# ============= ETAPAS =============
+
+async def abrir_pool():
+    """Abrir las conexiones mínimas del pool antes de la primera petición"""
+    base = get_collection("contadores").database
+    await asyncio.gather(*(base.command("ping") for _ in range(max(1, MONGO_MIN_POOL_SIZE))))
+
+
+async def asegurar_indices():
+    """Crear los índices que faltan; create_index no hace nada si ya existe"""
+    fallidos = []
+    for coleccion, claves, opciones in INDICES:
+        try:
+            await get_collection(coleccion).create_index(claves, **opciones)
+        except PyMongoError as exc:
+            fallidos.append(coleccion)
+            logger.warning("No se pudo crear el índice %s en %s: %s", claves, coleccion, exc)
+    if fallidos:
+        raise RuntimeError(f"índices sin crear en: {', '.join(fallidos)}")
+
+
+def _modelos() -> List[type]:
+    """Modelos Pydantic definidos en el paquete models"""
+    encontrados = []
+    for info in pkgutil.iter_modules(models.__path__):
+        modulo = importlib.import_module(f"models.{info.name}")
+        for valor in vars(modulo).values():
+            if inspect.isclass(valor) and issubclass(valor, BaseModel) and valor.__module__ == modulo.__name__:
+                encontrados.append(valor)
+    return encontrados
+
+
+def construir_validadores(app):
+    """Terminar de construir los modelos y ejercitar su validación"""
+    modelos = set(_modelos())
+    for ruta in app.routes:
+        modelo = getattr(ruta, "response_model", None)
+        if inspect.isclass(modelo) and issubclass(modelo, BaseModel):
+            modelos.add(modelo)
+    for modelo in modelos:
+        modelo.model_rebuild()
+        try:
+            modelo.model_validate({})
+        except ValidationError:
+            # Lo esperado: el camino de error también queda construido
+            pass
+
+
+async def precargar_catalogo():
+    """Llenar la caché por _id con el catálogo (hasta CACHE_MAX_ITEMS por colección)"""
+    for nombre in ("productos", "categorias", "ingredientes"):
+        cache = caches.get(nombre)
+        if cache is None:
+            continue
+        generacion = cache.generacion
+        docs = await get_collection(nombre).find({}).limit(cache.max_items).to_list(length=None)
+        if not cache.precargar(((str(doc["_id"]), doc) for doc in docs), generacion):
+            logger.info("Precarga de %s descartada: la caché se invalidó durante la consulta", nombre)
+
+
+async def construir_menu():
+    await menu_cache.obtener()
+
+
+def preparar_bcrypt():
+    # Import diferido: core no depende de los routers al importarse
+    from routers.usuarios import get_pwd_context
+
+    pwd_context = get_pwd_context()
+    pwd_context.verify("calentamiento", pwd_context.hash("calentamiento"))
+
+
+# ============= EJECUCIÓN =============
+
+class Arranque:
+    def __init__(self):
+        self.listo = False
+        self.etapas: Dict[str, dict] = {}
+        self.duracion: Optional[float] = None
+        self._tarea: Optional[asyncio.Task] = None
+        arranque_listo.fijar((), 0)
+
+    def _plan(self, app) -> List[Tuple[str, Callable[[], Awaitable]]]:
+        return [
+            ("pool", abrir_pool),
+            ("indices", asegurar_indices),
+            ("validadores", lambda: asyncio.to_thread(construir_validadores, app)),
+            ("openapi", lambda: asyncio.to_thread(app.openapi)),
+            ("catalogo", precargar_catalogo),
+            ("menu", construir_menu),
+            ("bcrypt", lambda: asyncio.to_thread(preparar_bcrypt)),
+        ]
+
+    async def _etapa(self, nombre: str, funcion: Callable[[], Awaitable]):
+        inicio = time.perf_counter()
+        error = None
+        try:
+            await asyncio.wait_for(funcion(), ARRANQUE_TIMEOUT_ETAPA)
+        except asyncio.TimeoutError:
+            error = f"superó {ARRANQUE_TIMEOUT_ETAPA:g} s"
+        except Exception as exc:
+            error = str(exc) or type(exc).__name__
+        duracion = time.perf_counter() - inicio
+
+        self.etapas[nombre] = {"duracion_ms": round(duracion * 1000, 1), "ok": error is None}
+        arranque_etapa_duracion.fijar((nombre, "ok" if error is None else "error"), duracion)
+        if error is None:
+            logger.info("Calentamiento %s: %.0f ms", nombre, duracion * 1000)
+        else:
+            self.etapas[nombre]["error"] = error
+            logger.warning("Calentamiento %s falló tras %.0f ms: %s", nombre, duracion * 1000, error)
+
+    async def calentar(self, app):
+        inicio = time.perf_counter()
+        for nombre, funcion in self._plan(app):
+            await self._etapa(nombre, funcion)
+        self.duracion = time.perf_counter() - inicio
+        self.listo = True
+        arranque_listo.fijar((), 1)
+        logger.info("Calentamiento terminado en %.0f ms", self.duracion * 1000)
+
+    async def iniciar(self, app):
+        """Calentar antes de aceptar tráfico (o en segundo plano con ARRANQUE_ESPERAR=false)"""
+        if ARRANQUE_ESPERAR:
+            await self.calentar(app)
+        else:
+            self._tarea = asyncio.create_task(self.calentar(app))
+
+    async def detener(self):
+        if self._tarea is not None and not self._tarea.done():
+            self._tarea.cancel()
+        self._tarea = None
+
+    def estado(self) -> dict:
+        return {
+            "status": "ready" if self.listo else "warming_up",
+            "duracion_ms": round(self.duracion * 1000, 1) if self.duracion is not None else None,
+            "etapas": self.etapas,
+        }
+
+
+arranque = Arranque()
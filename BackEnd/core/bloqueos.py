@@ -0,0 +1,150 @@
+"""
+Detector de bloqueos del event loop.
+
+Una tarea del loop late cada BLOQUEO_LATIDO segundos y mide su propio retraso
+(el lag del loop, que alimenta /metrics). Un hilo vigilante revisa el último
+latido: si el loop lleva más de BLOQUEO_UMBRAL de retraso sobre el latido
+esperado, algo síncrono lo está bloqueando, así que toma la pila del hilo del loop en ese momento y la
+atribuye a la petición cuyo middleware aparece en la pila. Cuando el loop
+vuelve a latir se registra el bloqueo con su duración real: log, métricas y
+los últimos bloqueos en /api/admin/bloqueos.
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime
+from typing import Dict, Optional
+
+from core.metricas import loop_lag, loop_lag_actual, normalizar_ruta, plantilla_ruta, registro
+
+logger = logging.getLogger("freshbowl.bloqueos")
+
+BLOQUEO_LATIDO = float(os.getenv("BLOQUEO_LATIDO", "0.05"))
+# Segundos sin latido a partir de los cuales se considera que el loop está bloqueado
+BLOQUEO_UMBRAL = float(os.getenv("BLOQUEO_UMBRAL", "0.1"))
+BLOQUEO_MAX_FRAMES = int(os.getenv("BLOQUEO_MAX_FRAMES", "25"))
+BLOQUEO_HISTORIAL = int(os.getenv("BLOQUEO_HISTORIAL", "50"))
+
+bloqueos_total = registro.contador(
+    "freshbowl_event_loop_blocks_total", "Bloqueos del event loop sobre el umbral", ("route",))
+bloqueos_duracion = registro.histograma(
+    "freshbowl_event_loop_block_duration_seconds", "Duración de los bloqueos del event loop", ("route",),
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0))
+
+
+class Vigilante:
+    def __init__(self):
+        self.historial: "deque[dict]" = deque(maxlen=BLOQUEO_HISTORIAL)
+        # Frame del middleware de cada petición en curso -> scope
+        self._peticiones: Dict[object, dict] = {}
+        self._latido = time.monotonic()
+        self._hilo_loop: Optional[int] = None
+        self._captura: Optional[dict] = None
+        self._tarea: Optional[asyncio.Task] = None
+        self._activo = False
+
+    # ----- lado del event loop -----
+
+    async def _latir(self):
+        while True:
+            inicio = time.monotonic()
+            self._latido = inicio
+            await asyncio.sleep(BLOQUEO_LATIDO)
+            ahora = time.monotonic()
+            self._latido = ahora
+            lag = max(0.0, ahora - inicio - BLOQUEO_LATIDO)
+            loop_lag.observar((), lag)
+            loop_lag_actual.fijar((), lag)
+            if lag >= BLOQUEO_UMBRAL:
+                self._registrar(lag, inicio)
+            else:
+                # Una captura de un retraso que no llegó al umbral no es de nadie
+                self._captura = None
+
+    def _registrar(self, duracion: float, latido: float):
+        captura, self._captura = self._captura, None
+        if captura is not None and captura["latido"] != latido:
+            captura = None
+        ruta = captura["ruta"] if captura else "desconocida"
+        pila = captura["pila"] if captura else None
+
+        bloqueos_total.inc((ruta,))
+        bloqueos_duracion.observar((ruta,), duracion)
+        self.historial.append({
+            "detectado_en": datetime.utcnow(),
+            "duracion_ms": round(duracion * 1000, 1),
+            "ruta": ruta,
+            "pila": pila,
+        })
+        logger.warning(
+            "Event loop bloqueado %.0f ms en %s%s",
+            duracion * 1000, ruta, "\n" + "".join(pila) if pila else " (sin pila: bloqueo corto)",
+        )
+
+    def iniciar(self):
+        self._hilo_loop = threading.get_ident()
+        self._activo = True
+        self._tarea = asyncio.create_task(self._latir())
+        threading.Thread(target=self._vigilar, name="vigilante-loop", daemon=True).start()
+
+    def detener(self):
+        self._activo = False
+        if self._tarea is not None:
+            self._tarea.cancel()
+            self._tarea = None
+
+    # ----- lado del hilo vigilante -----
+
+    def _vigilar(self):
+        intervalo = BLOQUEO_UMBRAL / 2
+        capturado_en = None
+        while self._activo:
+            time.sleep(intervalo)
+            latido = self._latido
+            # Mismo criterio que _latir: retraso sobre el latido esperado
+            if time.monotonic() - latido - BLOQUEO_LATIDO < BLOQUEO_UMBRAL or latido == capturado_en:
+                continue
+            # Una sola captura por bloqueo: la pila en el momento en que se detecta
+            capturado_en = latido
+            frame = sys._current_frames().get(self._hilo_loop)
+            if frame is not None:
+                self._captura = self._capturar(frame, latido)
+
+    def _capturar(self, frame, latido: float) -> dict:
+        ruta = "sin_peticion"
+        actual = frame
+        while actual is not None:
+            scope = self._peticiones.get(actual)
+            if scope is not None:
+                ruta = f"{scope['method']} {plantilla_ruta(scope) or normalizar_ruta(scope['path'])}"
+                break
+            actual = actual.f_back
+        pila = traceback.format_stack(frame, limit=BLOQUEO_MAX_FRAMES)
+        return {"ruta": ruta, "pila": pila, "latido": latido}
+
+
+vigilante = Vigilante()
+
+
+class BloqueosMiddleware:
+    """Registra el frame de cada petición para atribuirle los bloqueos"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not vigilante._activo:
+            await self.app(scope, receive, send)
+            return
+
+        frame = sys._getframe()
+        vigilante._peticiones[frame] = scope
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            del vigilante._peticiones[frame]
@@ -0,0 +1,89 @@
+"""
+Caché LRU con TTL para lecturas por _id.
+
+Se usa a través de database.find_by_id. Los documentos se devuelven como
+copias superficiales porque los routers modifican el dict al serializarlo.
+"""
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Iterable, Optional, Tuple
+
+
+class CacheLRU:
+    def __init__(self, nombre: str, max_items: int = 1000, ttl: float = 60.0):
+        self.nombre = nombre
+        self.max_items = max_items
+        self.ttl = ttl
+        self._datos: "OrderedDict[str, tuple]" = OrderedDict()
+        # Se incrementa en cada invalidación: una carga iniciada antes de una
+        # invalidación no debe guardar un documento que ya puede estar viejo
+        self._generacion = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirados = 0
+        self.invalidaciones = 0
+
+    async def obtener(self, clave: str, cargar: Callable[[], Awaitable[Optional[dict]]]) -> Optional[dict]:
+        """Devolver el documento desde la caché o cargarlo con `cargar`"""
+        entrada = self._datos.get(clave)
+        if entrada is not None:
+            expira, doc = entrada
+            if expira > time.monotonic():
+                self._datos.move_to_end(clave)
+                self.hits += 1
+                return dict(doc)
+            del self._datos[clave]
+            self.expirados += 1
+
+        self.misses += 1
+        generacion = self._generacion
+        doc = await cargar()
+        if doc is None:
+            return None
+        if generacion == self._generacion:
+            self._guardar(clave, doc)
+        return dict(doc)
+
+    def _guardar(self, clave: str, doc: dict):
+        self._datos[clave] = (time.monotonic() + self.ttl, dict(doc))
+        self._datos.move_to_end(clave)
+        while len(self._datos) > self.max_items:
+            self._datos.popitem(last=False)
+            self.evictions += 1
+
+    @property
+    def generacion(self) -> int:
+        return self._generacion
+
+    def precargar(self, docs: Iterable[Tuple[str, dict]], generacion: Optional[int] = None) -> bool:
+        """Guardar documentos ya leídos (calentamiento al arrancar). `generacion` es la
+        leída antes de la consulta: si hubo una invalidación desde entonces no se guarda nada"""
+        if generacion is not None and generacion != self._generacion:
+            return False
+        for clave, doc in docs:
+            self._guardar(clave, doc)
+        return True
+
+    def invalidar(self, clave: Optional[str] = None):
+        """Invalidar una clave (o toda la caché si no se indica)"""
+        self._generacion += 1
+        self.invalidaciones += 1
+        if clave is None:
+            self._datos.clear()
+        else:
+            self._datos.pop(clave, None)
+
+    def estadisticas(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "items": len(self._datos),
+            "max_items": self.max_items,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            "evictions": self.evictions,
+            "expirados": self.expirados,
+            "invalidaciones": self.invalidaciones,
+        }
@@ -0,0 +1,123 @@
+"""
+ETag, Cache-Control y compresión para los GET del catálogo.
+
+El ETag se deriva de la versión del catálogo (core.catalogo), por lo que un
+If-None-Match vigente se responde con 304 antes de llegar al router, sin
+consultar MongoDB.
+"""
+import os
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from core.catalogo import catalogo
+from core.compresion import COMPRESION_MIN_BYTES, comprimir, elegir_codificacion
+
+# Rutas cuyo contenido depende solo de la versión del catálogo
+PREFIJOS_CATALOGO = (
+    "/api/productos",
+    "/api/categorias",
+    "/api/ingredientes",
+)
+
+CATALOGO_CACHE_CONTROL = os.getenv("CATALOGO_CACHE_CONTROL", "public, max-age=0, must-revalidate")
+
+
+def etag_con_codificacion(etag: str, codificacion: Optional[str]) -> str:
+    """Cada codificación es una representación distinta y necesita su propio ETag fuerte"""
+    if not codificacion:
+        return etag
+    return f'{etag[:-1]}-{codificacion}"'
+
+
+def etag_coincidente(if_none_match: Optional[str], etag: str) -> Optional[str]:
+    """
+    Buscar en If-None-Match un ETag de la versión vigente, ignorando el sufijo
+    de codificación. Devuelve el ETag que tiene el cliente o None.
+    """
+    if not if_none_match:
+        return None
+    if if_none_match.strip() == "*":
+        return etag
+    base = etag[1:-1]
+    for candidato in if_none_match.split(","):
+        valor = candidato.strip()
+        if valor.startswith("W/"):
+            valor = valor[2:]
+        valor = valor.strip('"')
+        if valor == base or (valor.rsplit("-", 1)[0] == base and valor.endswith(("-gzip", "-br"))):
+            return f'"{valor}"'
+    return None
+
+
+class CacheCatalogoMiddleware:
+    """Middleware ASGI para respuestas condicionales y comprimidas del catálogo"""
+
+    def __init__(self, app, prefijos=PREFIJOS_CATALOGO):
+        self.app = app
+        self.prefijos = tuple(prefijos)
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] not in ("GET", "HEAD")
+            or not scope["path"].startswith(self.prefijos)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        # La versión se toma antes de consultar: si cambia durante la consulta,
+        # el cliente simplemente volverá a descargar en la próxima petición
+        etag = catalogo.etag()
+        codificacion = elegir_codificacion(headers.get("accept-encoding"))
+
+        etag_cliente = etag_coincidente(headers.get("if-none-match"), etag)
+        if etag_cliente:
+            await send({
+                "type": "http.response.start",
+                "status": 304,
+                "headers": [
+                    (b"etag", etag_cliente.encode()),
+                    (b"cache-control", CATALOGO_CACHE_CONTROL.encode()),
+                    (b"vary", b"Accept-Encoding"),
+                ],
+            })
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        inicio = None
+        partes = []
+
+        async def capturar(message):
+            nonlocal inicio
+            if message["type"] == "http.response.start":
+                inicio = message
+                return
+            if message["type"] == "http.response.body":
+                partes.append(message.get("body", b""))
+                if message.get("more_body", False):
+                    return
+                await self._enviar(send, inicio, b"".join(partes), etag, codificacion)
+                return
+            await send(message)
+
+        await self.app(scope, receive, capturar)
+
+    async def _enviar(self, send, inicio, cuerpo, etag, codificacion):
+        respuesta_headers = MutableHeaders(raw=list(inicio["headers"]))
+        if inicio["status"] == 200:
+            # Una copia servida en modo degradado no debe quedar asociada al ETag vigente
+            vigente = "x-data-stale" not in respuesta_headers
+            if len(cuerpo) < COMPRESION_MIN_BYTES or "content-encoding" in respuesta_headers:
+                codificacion = None
+            if codificacion:
+                cuerpo = comprimir(cuerpo, codificacion)
+                respuesta_headers["content-encoding"] = codificacion
+                respuesta_headers["content-length"] = str(len(cuerpo))
+            if vigente:
+                respuesta_headers["etag"] = etag_con_codificacion(etag, codificacion)
+                respuesta_headers["cache-control"] = CATALOGO_CACHE_CONTROL
+            respuesta_headers.append("vary", "Accept-Encoding")
+        await send({**inicio, "headers": respuesta_headers.raw})
+        await send({"type": "http.response.body", "body": cuerpo})
@@ -0,0 +1,197 @@
+"""
+Log de cambios del catálogo para sincronización incremental.
+
+Cada escritura del catálogo recibe un número de secuencia monotónico (contador
+en la colección `contadores`) y queda registrada en `catalogo_cambios`. Las
+entradas antiguas se compactan periódicamente; `min_seq` marca desde dónde el
+log está completo.
+
+Con SYNC_SEGUIR_INTERVALO > 0 cada proceso además sigue el log y aplica como
+cambios remotos las entradas escritas por otros procesos (workers del
+lanzador u otras instancias), para que sus cachés y su menú no queden viejos.
+La secuencia aplicada es también la base de los ETags del catálogo
+(core.catalogo), así que todos los workers responden con el mismo ETag.
+"""
+import asyncio
+import logging
+import os
+import secrets
+from datetime import datetime, timedelta
+from typing import Optional
+
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from core.catalogo import catalogo
+from database import get_collection
+
+logger = logging.getLogger("freshbowl.cambios")
+
+COLECCION_LOG = "catalogo_cambios"
+CONTADOR_ID = "catalogo_cambios"
+
+# Horas que se conservan las entradas del log antes de compactarlas
+SYNC_RETENCION_HORAS = float(os.getenv("SYNC_RETENCION_HORAS", "168"))
+# Cada cuántos segundos se ejecuta la compactación
+SYNC_COMPACTAR_INTERVALO = float(os.getenv("SYNC_COMPACTAR_INTERVALO", "3600"))
+# Cada cuántos segundos se leen los cambios de otros procesos (0 = no seguir)
+SYNC_SEGUIR_INTERVALO = float(os.getenv("SYNC_SEGUIR_INTERVALO", "0"))
+# Un hueco en la secuencia puede ser una escritura que aún no se inserta;
+# pasado este tiempo se da por perdida y se sigue adelante
+SYNC_ESPERA_HUECO = 5.0
+
+_tarea_compactacion: Optional[asyncio.Task] = None
+_tarea_seguimiento: Optional[asyncio.Task] = None
+
+
+async def siguiente_seq() -> int:
+    """Reservar el siguiente número de secuencia"""
+    contador = await get_collection("contadores").find_one_and_update(
+        {"_id": CONTADOR_ID},
+        {"$inc": {"seq": 1}, "$setOnInsert": {"min_seq": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return contador["seq"]
+
+
+async def estado_log() -> dict:
+    """Secuencia actual y primera secuencia disponible en el log"""
+    contador = await get_collection("contadores").find_one({"_id": CONTADOR_ID})
+    if not contador:
+        return {"seq": 0, "min_seq": 1, "epoca": None}
+    return {"seq": contador.get("seq", 0), "min_seq": contador.get("min_seq", 1), "epoca": contador.get("epoca")}
+
+
+async def iniciar_version():
+    """Tomar la época y la secuencia del log como base de la versión del catálogo"""
+    contadores = get_collection("contadores")
+    try:
+        await contadores.update_one(
+            {"_id": CONTADOR_ID}, {"$setOnInsert": {"seq": 0, "min_seq": 1}}, upsert=True
+        )
+    except DuplicateKeyError:
+        # Otro worker creó el contador al mismo tiempo
+        pass
+    # La época se fija una sola vez: todos los workers leen la misma
+    await contadores.update_one({"_id": CONTADOR_ID, "epoca": None}, {"$set": {"epoca": secrets.token_hex(4)}})
+    estado = await estado_log()
+    catalogo.iniciar(estado["epoca"], estado["seq"])
+
+
+async def registrar_en_log(coleccion: str, doc_id: Optional[str], operacion: str):
+    """Suscriptor de core.catalogo: agrega la escritura al log de cambios"""
+    if doc_id is None:
+        return
+    try:
+        seq = await siguiente_seq()
+        await get_collection(COLECCION_LOG).insert_one({
+            "seq": seq,
+            "coleccion": coleccion,
+            "doc_id": doc_id,
+            "operacion": operacion,
+            "origen": catalogo.prefijo,
+            "ts": datetime.utcnow(),
+        })
+        catalogo.confirmar(seq)
+    except Exception as exc:
+        # La escritura principal ya se aplicó: no se revierte, solo se informa
+        logger.error("No se pudo registrar el cambio %s/%s: %s", coleccion, doc_id, exc)
+
+
+async def compactar_log() -> int:
+    """Eliminar entradas más antiguas que la retención y avanzar min_seq"""
+    log = get_collection(COLECCION_LOG)
+    limite = datetime.utcnow() - timedelta(hours=SYNC_RETENCION_HORAS)
+
+    ultima = await log.find_one({"ts": {"$lt": limite}}, sort=[("seq", -1)])
+    if not ultima:
+        return 0
+
+    # Primero se avanza la marca: un cliente nunca debe creer que el log está completo
+    await get_collection("contadores").update_one(
+        {"_id": CONTADOR_ID},
+        {"$max": {"min_seq": ultima["seq"] + 1}}
+    )
+    result = await log.delete_many({"seq": {"$lte": ultima["seq"]}})
+    return result.deleted_count
+
+
+async def _compactar_periodicamente():
+    while True:
+        await asyncio.sleep(SYNC_COMPACTAR_INTERVALO)
+        try:
+            eliminadas = await compactar_log()
+            if eliminadas:
+                logger.info("Log de cambios compactado: %d entradas", eliminadas)
+        except Exception as exc:
+            logger.warning("Falló la compactación del log de cambios: %s", exc)
+
+
+def contiguas(entradas: list, desde: int) -> list:
+    """
+    Prefijo de `entradas` (ordenadas por seq, posteriores a `desde`) sin huecos recientes.
+
+    La secuencia se reserva antes de insertar la entrada, así que N+2 puede ser
+    visible antes que N+1: se corta en el primer hueco más nuevo que
+    SYNC_ESPERA_HUECO. Un hueco más viejo se da por perdido.
+    """
+    limite_hueco = datetime.utcnow() - timedelta(seconds=SYNC_ESPERA_HUECO)
+    resultado = []
+    for entrada in entradas:
+        if entrada["seq"] != desde + 1 and entrada["ts"] > limite_hueco:
+            break
+        desde = entrada["seq"]
+        resultado.append(entrada)
+    return resultado
+
+
+async def aplicar_cambios_remotos(ultimo: int) -> int:
+    """Aplicar las entradas de otros procesos posteriores a `ultimo`; devuelve la última aplicada"""
+    entradas = await get_collection(COLECCION_LOG).find(
+        {"seq": {"$gt": ultimo}}
+    ).sort("seq", ASCENDING).limit(1000).to_list(length=None)
+
+    for entrada in contiguas(entradas, ultimo):
+        ultimo = entrada["seq"]
+        if entrada.get("origen") != catalogo.prefijo:
+            await catalogo.registrar_cambio(
+                entrada["coleccion"], entrada["doc_id"], entrada["operacion"], remoto=True
+            )
+        catalogo.avanzar(ultimo)
+    return ultimo
+
+
+async def _seguir_periodicamente():
+    ultimo = catalogo.seq
+    while True:
+        await asyncio.sleep(SYNC_SEGUIR_INTERVALO)
+        try:
+            ultimo = await aplicar_cambios_remotos(ultimo)
+        except Exception as exc:
+            logger.warning("No se pudieron leer los cambios de otros procesos: %s", exc)
+
+
+async def iniciar_log_cambios():
+    """Crear índices y lanzar la compactación (y el seguimiento) periódicos"""
+    global _tarea_compactacion, _tarea_seguimiento
+    log = get_collection(COLECCION_LOG)
+    await log.create_index([("seq", ASCENDING)], unique=True)
+    await log.create_index([("ts", ASCENDING)])
+    await iniciar_version()
+    _tarea_compactacion = asyncio.create_task(_compactar_periodicamente())
+    if SYNC_SEGUIR_INTERVALO > 0:
+        _tarea_seguimiento = asyncio.create_task(_seguir_periodicamente())
+
+
+async def detener_log_cambios():
+    global _tarea_compactacion, _tarea_seguimiento
+    for tarea in (_tarea_compactacion, _tarea_seguimiento):
+        if tarea is not None:
+            tarea.cancel()
+    _tarea_compactacion = None
+    _tarea_seguimiento = None
+
+
+# Los cambios que llegan de otros procesos ya están en el log
+catalogo.suscribir(registrar_en_log, remotos=False)
@@ -0,0 +1,251 @@
+"""
+Captura de tráfico real para reproducirlo después (reproducir.py).
+
+Con CAPTURA_ACTIVA=true el middleware registra cada petición: método, plantilla
+de la ruta, path, query, cuerpo JSON saneado y su forma, estado, duración y el
+_id que devolvió (para que la reproducción pueda remapear los IDs creados).
+Nunca se guardan headers; contraseñas, tokens, correos, teléfonos, nombres,
+direcciones, RUT y coordenadas se reemplazan antes de escribir.
+
+Los registros se acumulan en memoria y se escriben por lotes en archivos NDJSON
+dentro de CAPTURA_DIR, rotando cada CAPTURA_MAX_MB y conservando solo los
+últimos CAPTURA_MAX_ARCHIVOS.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import time
+from collections import deque
+from datetime import datetime
+from typing import Optional
+from urllib.parse import parse_qsl
+
+from core.consultas_lentas import forma_valor
+from core.metricas import plantilla_ruta
+
+logger = logging.getLogger("freshbowl.captura")
+
+CAPTURA_ACTIVA = os.getenv("CAPTURA_ACTIVA", "false").lower() in ("1", "true", "yes")
+CAPTURA_MUESTREO = float(os.getenv("CAPTURA_MUESTREO", "1"))
+CAPTURA_DIR = os.getenv("CAPTURA_DIR", "capturas")
+CAPTURA_MAX_MB = float(os.getenv("CAPTURA_MAX_MB", "50"))
+CAPTURA_MAX_ARCHIVOS = int(os.getenv("CAPTURA_MAX_ARCHIVOS", "20"))
+# Cuerpos más grandes que esto se registran solo con su tamaño
+CAPTURA_MAX_CUERPO = int(os.getenv("CAPTURA_MAX_CUERPO", "65536"))
+CAPTURA_INTERVALO = float(os.getenv("CAPTURA_INTERVALO", "1"))
+
+PREFIJO = "captura-"
+EXTENSION = ".ndjson"
+
+# Rutas que no representan tráfico de clientes
+_EXCLUIDAS = ("/metrics", "/health", "/ready", "/docs", "/openapi.json", "/api/admin", "/api/webhooks")
+
+# Contraseña con la que se reproducen las altas y logins capturados
+PASSWORD_REPRODUCCION = "Captura123!"
+
+
+# ============= SANEAMIENTO =============
+
+def _seudonimo(valor: str) -> str:
+    # Estable: el mismo valor original da el mismo reemplazo (mantiene la unicidad)
+    return hashlib.sha256(valor.encode()).hexdigest()[:12]
+
+
+# Coordenadas: se reemplazan por otras estables dentro del rango válido
+_COORDENADAS = {"lat": 90.0, "lng": 180.0}
+
+
+def _coordenada(valor, limite: float) -> float:
+    fraccion = int(_seudonimo(repr(float(valor))), 16) / float(16 ** 12)
+    return round((fraccion * 2 - 1) * limite, 6)
+
+
+def sanear(valor, clave: str = ""):
+    """Copia del valor sin datos personales ni secretos"""
+    if isinstance(valor, dict):
+        return {k: sanear(v, k.lower()) for k, v in valor.items()}
+    if isinstance(valor, list):
+        return [sanear(v, clave) for v in valor]
+    if clave in _COORDENADAS and valor not in (None, "") and not isinstance(valor, bool):
+        try:
+            coordenada = _coordenada(valor, _COORDENADAS[clave])
+            return str(coordenada) if isinstance(valor, str) else coordenada
+        except (TypeError, ValueError):
+            return None
+    if not isinstance(valor, str) or not valor:
+        return valor
+    if "password" in clave:
+        return PASSWORD_REPRODUCCION
+    if "token" in clave or "secret" in clave or "hash" in clave:
+        return "***"
+    if "email" in clave:
+        return f"captura-{_seudonimo(valor)}@captura.freshbowl.cl"
+    if "telefono" in clave:
+        return "+56900000000"
+    if clave in ("nombre", "calle", "numero", "rut"):
+        return _seudonimo(valor)
+    return valor
+
+
+def _query(query_string: bytes) -> dict:
+    query = {}
+    for clave, valor in parse_qsl(query_string.decode("latin-1"), keep_blank_values=True):
+        query.setdefault(clave, []).append(valor)
+    return sanear(query)
+
+
+def _cuerpo_json(partes: list, tamano: int) -> tuple:
+    """(cuerpo saneado, forma) o (None, None) si no es JSON o es muy grande"""
+    if not partes or tamano > CAPTURA_MAX_CUERPO:
+        return None, None
+    try:
+        cuerpo = json.loads(b"".join(partes))
+    except ValueError:
+        return None, None
+    return sanear(cuerpo), forma_valor(cuerpo)
+
+
+def _id_respuesta(partes: list, tamano: int) -> Optional[str]:
+    if not partes or tamano > CAPTURA_MAX_CUERPO:
+        return None
+    try:
+        cuerpo = json.loads(b"".join(partes))
+    except ValueError:
+        return None
+    if isinstance(cuerpo, dict) and isinstance(cuerpo.get("_id"), str):
+        return cuerpo["_id"]
+    return None
+
+
+# ============= ESCRITOR =============
+
+class CapturaTrafico:
+    """Cola de registros que se escribe por lotes en archivos NDJSON rotativos"""
+
+    def __init__(self):
+        self._cola: deque = deque(maxlen=100_000)
+        self._tarea: Optional[asyncio.Task] = None
+        self._archivo: Optional[str] = None
+        self.activa = CAPTURA_ACTIVA
+        self.escritos = 0
+
+    def agregar(self, registro: dict):
+        self._cola.append(registro)
+
+    def _archivo_actual(self) -> str:
+        if self._archivo is None or os.path.getsize(self._archivo) >= CAPTURA_MAX_MB * 1024 * 1024:
+            os.makedirs(CAPTURA_DIR, exist_ok=True)
+            marca = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+            self._archivo = os.path.join(CAPTURA_DIR, f"{PREFIJO}{marca}{EXTENSION}")
+            open(self._archivo, "a").close()
+            archivos = sorted(f for f in os.listdir(CAPTURA_DIR) if f.startswith(PREFIJO))
+            for antiguo in archivos[:-CAPTURA_MAX_ARCHIVOS]:
+                os.remove(os.path.join(CAPTURA_DIR, antiguo))
+        return self._archivo
+
+    def _escribir(self, registros: list):
+        lineas = "".join(json.dumps(r, ensure_ascii=False, separators=(",", ":")) + "\n" for r in registros)
+        with open(self._archivo_actual(), "a", encoding="utf-8") as archivo:
+            archivo.write(lineas)
+
+    async def escribir(self):
+        if not self._cola:
+            return
+        registros = [self._cola.popleft() for _ in range(len(self._cola))]
+        try:
+            await asyncio.to_thread(self._escribir, registros)
+            self.escritos += len(registros)
+        except OSError as exc:
+            logger.warning("No se pudieron escribir %s registros de captura: %s", len(registros), exc)
+
+    async def _escribir_periodicamente(self):
+        while True:
+            await asyncio.sleep(CAPTURA_INTERVALO)
+            await self.escribir()
+
+    def iniciar(self):
+        if self.activa:
+            logger.info("Captura de tráfico activa en %s", CAPTURA_DIR)
+            self._tarea = asyncio.create_task(self._escribir_periodicamente())
+
+    async def detener(self):
+        if self._tarea is not None:
+            self._tarea.cancel()
+            self._tarea = None
+        await self.escribir()
+
+
+captura = CapturaTrafico()
+
+
+# ============= MIDDLEWARE =============
+
+class CapturaMiddleware:
+    """Middleware ASGI que registra las peticiones para reproducirlas"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or not captura.activa
+            or scope["path"].startswith(_EXCLUIDAS)
+            or (CAPTURA_MUESTREO < 1 and random.random() >= CAPTURA_MUESTREO)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        entrada, tamano_entrada = [], 0
+        salida, tamano_salida = [], 0
+        estado = 500
+        json_respuesta = False
+
+        async def recibir():
+            nonlocal tamano_entrada
+            message = await receive()
+            if message["type"] == "http.request":
+                cuerpo = message.get("body", b"")
+                tamano_entrada += len(cuerpo)
+                if tamano_entrada <= CAPTURA_MAX_CUERPO:
+                    entrada.append(cuerpo)
+            return message
+
+        async def enviar(message):
+            nonlocal estado, tamano_salida, json_respuesta
+            if message["type"] == "http.response.start":
+                estado = message["status"]
+                for nombre, valor in message.get("headers", []):
+                    if nombre == b"content-type":
+                        json_respuesta = valor.startswith(b"application/json")
+            elif message["type"] == "http.response.body" and json_respuesta and scope["method"] == "POST":
+                # Solo las altas (201) interesan para remapear IDs
+                cuerpo = message.get("body", b"")
+                tamano_salida += len(cuerpo)
+                if tamano_salida <= CAPTURA_MAX_CUERPO:
+                    salida.append(cuerpo)
+            await send(message)
+
+        inicio = time.perf_counter()
+        ts = time.time()
+        try:
+            await self.app(scope, recibir, enviar)
+        finally:
+            duracion = time.perf_counter() - inicio
+            cuerpo, forma = _cuerpo_json(entrada, tamano_entrada)
+            captura.agregar({
+                "ts": round(ts, 4),
+                "metodo": scope["method"],
+                "ruta": plantilla_ruta(scope),
+                "path": scope["path"],
+                "query": _query(scope.get("query_string", b"")),
+                "cuerpo": cuerpo,
+                "forma": forma,
+                "bytes": tamano_entrada,
+                "estado": estado,
+                "duracion_ms": round(duracion * 1000, 2),
+                "id_creado": _id_respuesta(salida, tamano_salida) if estado == 201 else None,
+            })
@@ -0,0 +1,110 @@
+"""
+Versión del catálogo (productos, categorías, ingredientes y variantes).
+
+Cada escritura sobre el catálogo llama a `registrar_cambio`, que incrementa
+la versión en memoria y avisa a los suscriptores. La versión se usa para
+generar ETags sin tener que consultar MongoDB.
+
+Con varios procesos, los cambios hechos por otro worker llegan a través del
+log de cambios (core.cambios) como cambios remotos: actualizan versión y
+cachés, pero no se vuelven a registrar en el log.
+
+El ETag sale de la secuencia del log, que es la misma en todos los workers:
+dos procesos que ya aplicaron las mismas entradas generan el mismo ETag. Un
+cambio propio que aún no tiene número en el log (o que quedó por delante de
+entradas de otros workers que este proceso no ha leído) se marca con el
+prefijo del proceso hasta que el seguimiento lo alcanza.
+"""
+import inspect
+import os
+import secrets
+from typing import Awaitable, Callable, List, Optional, Set, Tuple, Union
+
+# Colecciones que forman parte del catálogo
+COLECCIONES_CATALOGO = (
+    "productos",
+    "categorias",
+    "ingredientes",
+    "variantes",
+    "producto_ingredientes",
+)
+
+Suscriptor = Callable[[str, Optional[str], str], Union[None, Awaitable[None]]]
+
+
+class VersionCatalogo:
+    def __init__(self):
+        # El prefijo distingue procesos (origen de las entradas del log)
+        self.prefijo = secrets.token_hex(4)
+        self.valor = 0
+        # Época del log (cambia si se recrea la base) y última entrada ya reflejada aquí
+        self.epoca = self.prefijo
+        self.seq = 0
+        # Cambios propios sin número en el log y números propios por delante de `seq`
+        self._sin_seq = 0
+        self._propias: Set[int] = set()
+        self._suscriptores: List[Tuple[Suscriptor, bool]] = []
+
+    def _nuevo_proceso(self):
+        # Un worker creado con fork no debe compartir prefijo con sus hermanos:
+        # la misma versión en dos procesos no implica el mismo contenido
+        self.prefijo = secrets.token_hex(4)
+        self.valor = 0
+        self._sin_seq = 0
+        self._propias = set()
+
+    def iniciar(self, epoca: str, seq: int):
+        """Partir de la época y la secuencia actuales del log compartido"""
+        self.epoca = epoca
+        self.avanzar(seq)
+
+    def avanzar(self, seq: int):
+        """El log ya se aplicó en este proceso hasta `seq`"""
+        self.seq = max(self.seq, seq)
+        while self.seq + 1 in self._propias:
+            self.seq += 1
+        self._propias = {propia for propia in self._propias if propia > self.seq}
+
+    def confirmar(self, seq: int):
+        """Un cambio propio quedó registrado en el log con el número `seq`"""
+        self._sin_seq = max(self._sin_seq - 1, 0)
+        self._propias.add(seq)
+        self.avanzar(self.seq)
+
+    def version(self) -> str:
+        """Versión compartida por los workers que ya aplicaron el mismo log"""
+        if self._sin_seq or self._propias:
+            return f"{self.epoca}-{self.seq}-{self.prefijo}-{self.valor}"
+        return f"{self.epoca}-{self.seq}"
+
+    def etag(self) -> str:
+        """ETag fuerte asociado a la versión actual"""
+        return f'"{self.version()}"'
+
+    def suscribir(self, callback: Suscriptor, remotos: bool = True):
+        """Registrar una función que se llama tras cada cambio del catálogo
+        (con remotos=False solo tras los cambios hechos en este proceso)"""
+        self._suscriptores.append((callback, remotos))
+
+    async def registrar_cambio(self, coleccion: str, doc_id: Optional[str] = None, operacion: str = "upsert",
+                               remoto: bool = False):
+        """Incrementar la versión y notificar a los suscriptores"""
+        self.valor += 1
+        if not remoto:
+            self._sin_seq += 1
+        for callback, remotos in self._suscriptores:
+            if remoto and not remotos:
+                continue
+            resultado = callback(coleccion, doc_id, operacion)
+            if inspect.isawaitable(resultado):
+                await resultado
+
+
+catalogo = VersionCatalogo()
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=catalogo._nuevo_proceso)
+
+
+async def registrar_cambio(coleccion: str, doc_id: Optional[str] = None, operacion: str = "upsert"):
+    """Atajo usado por los routers después de cada escritura"""
+    await catalogo.registrar_cambio(coleccion, doc_id, operacion)
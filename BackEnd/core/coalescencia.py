@@ -0,0 +1,128 @@
+"""
+Coalescencia de lecturas idénticas concurrentes (single-flight).
+
+Si llegan varios GET iguales (misma ruta y mismos parámetros normalizados)
+mientras el primero sigue en curso, solo el primero llega al router; los
+demás esperan y reciben una copia de la misma respuesta ya codificada.
+Solo aplica a las rutas configuradas en COALESCER_RUTAS.
+
+La clave incluye la versión del catálogo: CacheCatalogoMiddleware, por fuera,
+ya fijó el ETag con esa versión, así que una petición que llega después de una
+escritura no puede unirse a una ejecución que empezó antes.
+"""
+import asyncio
+import os
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode
+
+from starlette.datastructures import Headers
+
+from core.catalogo import catalogo
+
+# Prefijos de ruta con coalescencia activada (separados por coma)
+COALESCER_RUTAS = tuple(
+    ruta.strip()
+    for ruta in os.getenv("COALESCER_RUTAS", "/api/productos,/api/categorias,/api/ingredientes").split(",")
+    if ruta.strip()
+)
+
+Respuesta = Tuple[dict, bytes]
+
+
+def clave_peticion(scope) -> str:
+    """Ruta + parámetros ordenados (y el header Authorization si existe)"""
+    query = scope.get("query_string", b"").decode("latin-1")
+    params = urlencode(sorted(parse_qsl(query, keep_blank_values=True)))
+    clave = f"{scope['method']} {scope['path']}?{params}"
+    autorizacion = Headers(scope=scope).get("authorization")
+    if autorizacion:
+        clave += f"#{autorizacion}"
+    return clave
+
+
+class EstadisticasCoalescencia:
+    def __init__(self):
+        self.ejecutadas: Dict[str, int] = {}
+        self.ahorradas: Dict[str, int] = {}
+
+    def resumen(self) -> dict:
+        total_ejecutadas = sum(self.ejecutadas.values())
+        total_ahorradas = sum(self.ahorradas.values())
+        return {
+            "rutas": list(COALESCER_RUTAS),
+            "consultas_ejecutadas": total_ejecutadas,
+            "consultas_ahorradas": total_ahorradas,
+            "por_ruta": {
+                ruta: {"ejecutadas": self.ejecutadas.get(ruta, 0), "ahorradas": self.ahorradas.get(ruta, 0)}
+                for ruta in sorted(set(self.ejecutadas) | set(self.ahorradas))
+            },
+        }
+
+
+estadisticas_coalescencia = EstadisticasCoalescencia()
+
+
+class CoalescenciaMiddleware:
+    """Middleware ASGI que comparte una sola ejecución entre GET idénticos"""
+
+    def __init__(self, app, prefijos=COALESCER_RUTAS):
+        self.app = app
+        self.prefijos = tuple(prefijos)
+        self._en_vuelo: Dict[str, asyncio.Future] = {}
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "GET"
+            or not self.prefijos
+            or not scope["path"].startswith(self.prefijos)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        clave = f"{catalogo.etag()} {clave_peticion(scope)}"
+        ruta = scope["path"]
+
+        pendiente = self._en_vuelo.get(clave)
+        if pendiente is not None:
+            respuesta: Optional[Respuesta] = await asyncio.shield(pendiente)
+            if respuesta is not None:
+                estadisticas_coalescencia.ahorradas[ruta] = estadisticas_coalescencia.ahorradas.get(ruta, 0) + 1
+                await self._reproducir(send, respuesta)
+                return
+            # La ejecución original falló: esta petición se ejecuta por su cuenta
+            await self.app(scope, receive, send)
+            return
+
+        futuro = asyncio.get_running_loop().create_future()
+        self._en_vuelo[clave] = futuro
+        estadisticas_coalescencia.ejecutadas[ruta] = estadisticas_coalescencia.ejecutadas.get(ruta, 0) + 1
+
+        inicio = None
+        partes = []
+
+        async def capturar(message):
+            nonlocal inicio
+            if message["type"] == "http.response.start":
+                inicio = message
+            elif message["type"] == "http.response.body":
+                partes.append(message.get("body", b""))
+
+        respuesta = None
+        try:
+            await self.app(scope, receive, capturar)
+            if inicio is not None:
+                respuesta = (inicio, b"".join(partes))
+        finally:
+            del self._en_vuelo[clave]
+            futuro.set_result(respuesta)
+
+        if respuesta is not None:
+            await self._reproducir(send, respuesta)
+
+    @staticmethod
+    async def _reproducir(send, respuesta: Respuesta):
+        inicio, cuerpo = respuesta
+        # Cada petición recibe su propia lista: CORS modifica los headers en el lugar
+        await send({**inicio, "headers": list(inicio.get("headers", []))})
+        await send({"type": "http.response.body", "body": cuerpo})
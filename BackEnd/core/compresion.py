@@ -0,0 +1,42 @@
+"""
+Compresión gzip/brotli de respuestas.
+
+brotli es opcional: si el paquete no está instalado solo se usa gzip.
+"""
+import gzip
+import os
+from typing import Optional
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - dependencia opcional
+    brotli = None
+
+# Tamaño mínimo (en bytes) para comprimir una respuesta
+COMPRESION_MIN_BYTES = int(os.getenv("COMPRESION_MIN_BYTES", "1024"))
+GZIP_NIVEL = int(os.getenv("GZIP_NIVEL", "6"))
+BROTLI_CALIDAD = int(os.getenv("BROTLI_CALIDAD", "5"))
+
+
+def elegir_codificacion(accept_encoding: Optional[str]) -> Optional[str]:
+    """Elegir "br" o "gzip" según el header Accept-Encoding del cliente"""
+    if not accept_encoding:
+        return None
+    aceptadas = set()
+    for parte in accept_encoding.lower().split(","):
+        nombre, _, params = parte.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0"):
+            continue
+        aceptadas.add(nombre.strip())
+    if brotli is not None and "br" in aceptadas:
+        return "br"
+    if "gzip" in aceptadas or "*" in aceptadas:
+        return "gzip"
+    return None
+
+
+def comprimir(cuerpo: bytes, codificacion: str) -> bytes:
+    """Comprimir un cuerpo con la codificación indicada"""
+    if codificacion == "br":
+        return brotli.compress(cuerpo, quality=BROTLI_CALIDAD)
+    return gzip.compress(cuerpo, compresslevel=GZIP_NIVEL, mtime=0)
@@ -0,0 +1,318 @@
+"""
+Registro de consultas lentas con captura automática de explain.
+
+Un CommandListener de pymongo registra los comandos de lectura/escritura que
+superan CONSULTA_LENTA_MS, agrupados por forma (colección + comando + filtro
+con los valores literales reemplazados por "?"). La primera vez que aparece
+una forma lenta se ejecuta un explain("executionStats") y se marcan los
+COLLSCAN y las consultas que examinan muchos más documentos de los que
+devuelven. Los agregados se guardan periódicamente en `consultas_lentas`
+para el reporte de línea de comandos (reporte_consultas.py).
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from typing import Dict, Optional
+
+from pymongo import monitoring
+
+logger = logging.getLogger("freshbowl.consultas_lentas")
+
+COLECCION_CONSULTAS = "consultas_lentas"
+
+# Umbral (ms) a partir del cual un comando se considera lento
+CONSULTA_LENTA_MS = float(os.getenv("CONSULTA_LENTA_MS", "100"))
+# Ejecutar explain("executionStats") para cada forma lenta nueva
+CONSULTAS_EXPLAIN = os.getenv("CONSULTAS_EXPLAIN", "true").lower() in ("1", "true", "yes")
+# Documentos examinados por documento devuelto a partir del cual se alerta
+CONSULTAS_RATIO_MAX = float(os.getenv("CONSULTAS_RATIO_MAX", "100"))
+# Cada cuántos segundos se guardan los agregados en MongoDB
+CONSULTAS_FLUSH_INTERVALO = float(os.getenv("CONSULTAS_FLUSH_INTERVALO", "30"))
+CONSULTAS_MAX_FORMAS = int(os.getenv("CONSULTAS_MAX_FORMAS", "500"))
+
+# Comandos cuya forma se registra y que admiten explain
+COMANDOS_CONSULTA = {"find", "aggregate", "count", "distinct", "update", "delete", "findAndModify"}
+# Campos del comando que no forman parte de la consulta
+_CAMPOS_SESION = {"lsid", "txnNumber", "$clusterTime", "$db", "$readPreference", "readConcern", "writeConcern"}
+
+
+# ============= FORMA DE LA CONSULTA =============
+
+def forma_valor(valor):
+    """Reemplazar los valores literales por "?" conservando operadores y campos"""
+    if isinstance(valor, dict):
+        return {clave: forma_valor(v) for clave, v in sorted(valor.items())}
+    if isinstance(valor, (list, tuple)):
+        formas = [forma_valor(v) for v in valor]
+        # Listas de literales ($in, $nin...) tienen la misma forma sin importar su largo
+        if all(forma == "?" for forma in formas):
+            return ["?"] if formas else []
+        return formas
+    if isinstance(valor, str) and valor.startswith("$"):
+        # Referencias a campos en pipelines ("$precio")
+        return valor
+    return "?"
+
+
+def extraer_forma(comando: str, doc: dict) -> dict:
+    """Partes de un comando que determinan el plan de ejecución"""
+    if comando == "find":
+        forma = {"filtro": forma_valor(doc.get("filter", {}))}
+        if doc.get("sort"):
+            forma["orden"] = dict(doc["sort"])
+        return forma
+    if comando == "aggregate":
+        return {"pipeline": forma_valor(doc.get("pipeline", []))}
+    if comando in ("count", "distinct"):
+        forma = {"filtro": forma_valor(doc.get("query", {}))}
+        if comando == "distinct":
+            forma["campo"] = doc.get("key")
+        return forma
+    if comando == "findAndModify":
+        forma = {"filtro": forma_valor(doc.get("query", {}))}
+        if doc.get("sort"):
+            forma["orden"] = dict(doc["sort"])
+        return forma
+    if comando == "update":
+        sentencias = doc.get("updates") or [{}]
+        return {"filtro": forma_valor(sentencias[0].get("q", {}))}
+    if comando == "delete":
+        sentencias = doc.get("deletes") or [{}]
+        return {"filtro": forma_valor(sentencias[0].get("q", {}))}
+    return {}
+
+
+def clave_forma(coleccion: str, comando: str, forma: dict) -> str:
+    texto = json.dumps({"c": coleccion, "cmd": comando, **forma}, sort_keys=True, default=str)
+    return hashlib.sha1(texto.encode()).hexdigest()[:16]
+
+
+def comando_explicable(comando: str, doc: dict) -> dict:
+    """Copia del comando lista para envolver en {"explain": ...}"""
+    explicable = {clave: valor for clave, valor in doc.items() if clave not in _CAMPOS_SESION}
+    # En escrituras múltiples basta con la primera sentencia
+    if comando == "update" and explicable.get("updates"):
+        explicable["updates"] = explicable["updates"][:1]
+    if comando == "delete" and explicable.get("deletes"):
+        explicable["deletes"] = explicable["deletes"][:1]
+    return explicable
+
+
+# ============= ANÁLISIS DEL EXPLAIN =============
+
+def _etapas(plan, encontradas: set):
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            encontradas.add(plan["stage"])
+        for clave in ("inputStage", "queryPlan", "winningPlan"):
+            if clave in plan:
+                _etapas(plan[clave], encontradas)
+        for hijo in plan.get("inputStages", []):
+            _etapas(hijo, encontradas)
+
+
+def analizar_explain(resultado: dict) -> dict:
+    """Resumen del explain: etapas del plan ganador, documentos examinados y alertas"""
+    # En aggregate el plan de la consulta queda dentro de la etapa $cursor
+    if "stages" in resultado and resultado["stages"]:
+        resultado = resultado["stages"][0].get("$cursor", resultado)
+
+    etapas = set()
+    _etapas(resultado.get("queryPlanner", {}).get("winningPlan", {}), etapas)
+
+    stats = resultado.get("executionStats", {})
+    examinados = stats.get("totalDocsExamined", 0)
+    devueltos = stats.get("nReturned", 0)
+    ratio = examinados / max(devueltos, 1)
+
+    alertas = []
+    if "COLLSCAN" in etapas:
+        alertas.append("COLLSCAN")
+    if examinados and ratio > CONSULTAS_RATIO_MAX:
+        alertas.append("RATIO_ALTO")
+
+    return {
+        "etapas": sorted(etapas),
+        "docs_examinados": examinados,
+        "claves_examinadas": stats.get("totalKeysExamined", 0),
+        "devueltos": devueltos,
+        "ratio": round(ratio, 1),
+        "tiempo_ms": stats.get("executionTimeMillis"),
+        "alertas": alertas,
+    }
+
+
+async def explicar(database, comando: str, doc: dict) -> dict:
+    resultado = await database.command({"explain": comando_explicable(comando, doc), "verbosity": "executionStats"})
+    return analizar_explain(resultado)
+
+
+# ============= REGISTRO =============
+
+class RegistroConsultasLentas:
+    """Agregados por forma; se escribe desde los hilos del driver"""
+
+    def __init__(self):
+        self._formas: Dict[str, dict] = {}
+        self._sucias = set()
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tarea_flush: Optional[asyncio.Task] = None
+
+    def registrar(self, database_name: str, coleccion: str, comando: str, doc: dict, ms: float):
+        forma = extraer_forma(comando, doc)
+        clave = clave_forma(coleccion, comando, forma)
+        with self._lock:
+            entrada = self._formas.get(clave)
+            nueva = entrada is None
+            if nueva:
+                if len(self._formas) >= CONSULTAS_MAX_FORMAS:
+                    return
+                entrada = self._formas[clave] = {
+                    "clave": clave,
+                    "coleccion": coleccion,
+                    "comando": comando,
+                    "forma": forma,
+                    "conteo": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                    "explain": None,
+                    "pendiente_conteo": 0,
+                    "pendiente_ms": 0.0,
+                }
+            entrada["conteo"] += 1
+            entrada["total_ms"] += ms
+            entrada["max_ms"] = max(entrada["max_ms"], ms)
+            entrada["ultima_en"] = datetime.utcnow()
+            entrada["pendiente_conteo"] += 1
+            entrada["pendiente_ms"] += ms
+            self._sucias.add(clave)
+
+        if nueva and CONSULTAS_EXPLAIN and self._loop is not None:
+            explicable = comando_explicable(comando, doc)
+            self._loop.call_soon_threadsafe(self._programar_explain, clave, database_name, comando, explicable)
+
+    def _programar_explain(self, clave: str, database_name: str, comando: str, doc: dict):
+        asyncio.ensure_future(self._explicar(clave, database_name, comando, doc))
+
+    async def _explicar(self, clave: str, database_name: str, comando: str, doc: dict):
+        # Import diferido: database registra el listener de este módulo
+        from database import db
+        if db.client is None:
+            return
+        try:
+            analisis = await explicar(db.client[database_name], comando, doc)
+        except Exception as exc:
+            analisis = {"error": str(exc)}
+        with self._lock:
+            entrada = self._formas.get(clave)
+            if entrada is not None:
+                entrada["explain"] = analisis
+                self._sucias.add(clave)
+        if analisis.get("alertas"):
+            logger.warning("Consulta lenta %s.%s %s: %s", doc.get(comando), comando, clave, analisis["alertas"])
+
+    def resumen(self, limite: int = 50) -> list:
+        with self._lock:
+            entradas = [
+                {k: v for k, v in entrada.items() if not k.startswith("pendiente_")}
+                for entrada in self._formas.values()
+            ]
+        entradas.sort(key=lambda e: e["total_ms"], reverse=True)
+        for entrada in entradas:
+            entrada["promedio_ms"] = round(entrada["total_ms"] / entrada["conteo"], 1)
+        return entradas[:limite]
+
+    def reiniciar(self):
+        with self._lock:
+            self._formas.clear()
+            self._sucias.clear()
+
+    async def guardar(self) -> int:
+        """Persistir los agregados modificados desde el último guardado"""
+        from database import get_collection
+        with self._lock:
+            pendientes = []
+            for clave in self._sucias:
+                entrada = self._formas.get(clave)
+                if entrada is None:
+                    continue
+                pendientes.append((dict(entrada), entrada["pendiente_conteo"], entrada["pendiente_ms"]))
+                entrada["pendiente_conteo"] = 0
+                entrada["pendiente_ms"] = 0.0
+            self._sucias.clear()
+
+        coleccion = get_collection(COLECCION_CONSULTAS)
+        for entrada, conteo, total_ms in pendientes:
+            await coleccion.update_one(
+                {"_id": entrada["clave"]},
+                {
+                    "$set": {
+                        "coleccion": entrada["coleccion"],
+                        "comando": entrada["comando"],
+                        # Como texto: la forma contiene claves con "$"
+                        "forma": json.dumps(entrada["forma"], sort_keys=True),
+                        "explain": entrada["explain"],
+                        "ultima_en": entrada["ultima_en"],
+                    },
+                    "$inc": {"conteo": conteo, "total_ms": total_ms},
+                    "$max": {"max_ms": entrada["max_ms"]},
+                },
+                upsert=True,
+            )
+        return len(pendientes)
+
+    async def _guardar_periodicamente(self):
+        while True:
+            await asyncio.sleep(CONSULTAS_FLUSH_INTERVALO)
+            try:
+                await self.guardar()
+            except Exception as exc:
+                logger.error("No se pudieron guardar las consultas lentas: %s", exc)
+
+    def iniciar(self):
+        self._loop = asyncio.get_running_loop()
+        self._tarea_flush = asyncio.create_task(self._guardar_periodicamente())
+
+    async def detener(self):
+        if self._tarea_flush is not None:
+            self._tarea_flush.cancel()
+            self._tarea_flush = None
+        try:
+            await self.guardar()
+        except Exception as exc:
+            logger.error("No se pudieron guardar las consultas lentas: %s", exc)
+        self._loop = None
+
+
+registro_consultas = RegistroConsultasLentas()
+
+
+class OyenteConsultasLentas(monitoring.CommandListener):
+    """Registra los comandos que superan CONSULTA_LENTA_MS (corre en hilos del driver)"""
+
+    def __init__(self, registro: RegistroConsultasLentas = registro_consultas):
+        self.registro = registro
+        self._comandos: Dict[tuple, dict] = {}
+
+    def started(self, event):
+        if event.command_name not in COMANDOS_CONSULTA:
+            return
+        if event.command.get(event.command_name) == COLECCION_CONSULTAS:
+            return
+        self._comandos[(event.request_id, event.connection_id)] = event.command
+
+    def succeeded(self, event):
+        doc = self._comandos.pop((event.request_id, event.connection_id), None)
+        if doc is None:
+            return
+        ms = event.duration_micros / 1000
+        if ms >= CONSULTA_LENTA_MS:
+            self.registro.registrar(event.database_name, doc.get(event.command_name), event.command_name, doc, ms)
+
+    def failed(self, event):
+        self._comandos.pop((event.request_id, event.connection_id), None)
@@ -0,0 +1,183 @@
+"""
+Escritura diferida (write-behind) para actualizaciones frecuentes y de poco valor.
+
+Marcas como `carritos.actualizado_en`, que se tocan en cada cambio de un item,
+no necesitan llegar a MongoDB en el momento. `actualizar()` deja la
+actualización en memoria y la combina con las pendientes del mismo documento
+($set: gana la última, $inc: se suman, $max/$min: se conserva el extremo).
+Cada ESCRITURA_DIFERIDA_INTERVALO segundos, o antes si se juntan
+ESCRITURA_DIFERIDA_MAX documentos, se escribe un único
+bulk_write(ordered=False) por colección y se invalida la caché por _id de los
+documentos escritos. Al apagar se vacía lo pendiente.
+
+Solo sirve para escrituras que el cliente no necesita ver confirmadas: si el
+proceso muere se pierde a lo sumo un intervalo de marcas. Las marcas de tiempo
+se encolan con $max: un vaciado tardío (o reencolado) no debe retroceder un
+valor más nuevo escrito directamente o por otro worker.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict, Optional
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from core.metricas import registro
+from core.resiliencia import MongoNoDisponible
+from database import get_collection, invalidar_cache
+
+logger = logging.getLogger("freshbowl.escritura_diferida")
+
+ESCRITURA_DIFERIDA_INTERVALO = float(os.getenv("ESCRITURA_DIFERIDA_INTERVALO", "1"))
+ESCRITURA_DIFERIDA_MAX = int(os.getenv("ESCRITURA_DIFERIDA_MAX", "500"))
+
+OPERADORES = ("$set", "$inc", "$max", "$min")
+
+escrituras_recibidas = registro.contador(
+    "freshbowl_write_behind_updates_total", "Actualizaciones recibidas por el buffer", ("collection", "outcome"))
+escrituras_documentos = registro.contador(
+    "freshbowl_write_behind_documents_total", "Documentos escritos por el buffer", ("collection", "outcome"))
+escrituras_vaciado = registro.histograma(
+    "freshbowl_write_behind_flush_duration_seconds", "Duración de cada bulk_write del buffer", ("collection",))
+escrituras_pendientes = registro.gauge(
+    "freshbowl_write_behind_pending", "Documentos con actualizaciones pendientes", ("collection",))
+
+
+def _combinar(pendiente: dict, nueva: dict):
+    """Agregar `nueva` sobre `pendiente` (ambas en formato de update de MongoDB)"""
+    for operador, campos in nueva.items():
+        if operador not in OPERADORES:
+            raise ValueError(f"Operador no soportado en escritura diferida: {operador}")
+        for campo in campos:
+            for otro, otros_campos in pendiente.items():
+                if otro != operador and campo in otros_campos:
+                    raise ValueError(f"{campo} ya tiene un {otro} pendiente")
+        destino = pendiente.setdefault(operador, {})
+        for campo, valor in campos.items():
+            if campo not in destino or operador == "$set":
+                destino[campo] = valor
+            elif operador == "$inc":
+                destino[campo] += valor
+            elif operador == "$max":
+                destino[campo] = max(destino[campo], valor)
+            else:
+                destino[campo] = min(destino[campo], valor)
+
+
+class EscrituraDiferida:
+    def __init__(self):
+        # colección -> _id -> update combinado
+        self._pendientes: Dict[str, Dict[Any, dict]] = {}
+        self._total = 0
+        self._lleno = asyncio.Event()
+        self._tarea: Optional[asyncio.Task] = None
+        self._deteniendo = False
+        self.vaciados = 0
+
+    def actualizar(self, coleccion: str, doc_id, update: dict):
+        """Encolar un update_one por _id; se combina con lo pendiente del mismo documento"""
+        documentos = self._pendientes.setdefault(coleccion, {})
+        pendiente = documentos.get(doc_id)
+        if pendiente is None:
+            pendiente = documentos[doc_id] = {}
+            self._total += 1
+            escrituras_pendientes.sumar((coleccion,), 1)
+            escrituras_recibidas.inc((coleccion, "nueva"))
+        else:
+            escrituras_recibidas.inc((coleccion, "combinada"))
+        _combinar(pendiente, update)
+        if self._total >= ESCRITURA_DIFERIDA_MAX:
+            self._lleno.set()
+
+    def _reencolar(self, coleccion: str, lote: Dict[Any, dict]):
+        """Devolver un lote fallido al buffer, debajo de lo que llegó mientras tanto"""
+        documentos = self._pendientes.setdefault(coleccion, {})
+        for doc_id, update in lote.items():
+            nuevo = documentos.get(doc_id)
+            if nuevo is None:
+                documentos[doc_id] = update
+                self._total += 1
+                escrituras_pendientes.sumar((coleccion,), 1)
+                continue
+            try:
+                _combinar(update, nuevo)
+                documentos[doc_id] = update
+            except ValueError:
+                # Forma incompatible: gana lo más reciente
+                pass
+
+    async def _vaciar_coleccion(self, coleccion: str, lote: Dict[Any, dict]):
+        operaciones = [UpdateOne({"_id": doc_id}, update) for doc_id, update in lote.items()]
+        inicio = time.perf_counter()
+        try:
+            await get_collection(coleccion).bulk_write(operaciones, ordered=False)
+            escrituras_documentos.inc((coleccion, "ok"), len(operaciones))
+        except BulkWriteError as exc:
+            # Con ordered=False el resto del lote sí se aplicó
+            errores = len(exc.details.get("writeErrors", []))
+            escrituras_documentos.inc((coleccion, "ok"), len(operaciones) - errores)
+            escrituras_documentos.inc((coleccion, "error"), errores)
+            logger.warning("%d escrituras diferidas fallaron en %s: %s", errores, coleccion,
+                           exc.details.get("writeErrors", [])[:3])
+        except (PyMongoError, MongoNoDisponible) as exc:
+            escrituras_documentos.inc((coleccion, "reintento"), len(operaciones))
+            logger.warning("No se pudieron escribir %d documentos diferidos en %s: %s",
+                           len(operaciones), coleccion, exc)
+            self._reencolar(coleccion, lote)
+            return
+        finally:
+            escrituras_vaciado.observar((coleccion,), time.perf_counter() - inicio)
+        for doc_id in lote:
+            invalidar_cache(coleccion, doc_id)
+
+    async def vaciar(self):
+        """Escribir todo lo pendiente: un bulk_write por colección"""
+        if not self._total:
+            return
+        pendientes, self._pendientes = self._pendientes, {}
+        self._total = 0
+        self._lleno.clear()
+        for coleccion, lote in pendientes.items():
+            escrituras_pendientes.sumar((coleccion,), -len(lote))
+        await asyncio.gather(*(
+            self._vaciar_coleccion(coleccion, lote) for coleccion, lote in pendientes.items() if lote
+        ))
+        self.vaciados += 1
+
+    async def _vaciar_periodicamente(self):
+        while not self._deteniendo:
+            try:
+                await asyncio.wait_for(self._lleno.wait(), ESCRITURA_DIFERIDA_INTERVALO)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.vaciar()
+            except Exception:
+                logger.exception("Error vaciando las escrituras diferidas")
+
+    def iniciar(self):
+        self._deteniendo = False
+        self._tarea = asyncio.create_task(self._vaciar_periodicamente())
+
+    async def detener(self):
+        # No se cancela: un bulk_write interrumpido perdería su lote. Se avisa al
+        # ciclo, que termina el vaciado en curso y sale; luego se vacía el resto
+        if self._tarea is not None:
+            self._deteniendo = True
+            self._lleno.set()
+            await self._tarea
+            self._tarea = None
+        await self.vaciar()
+
+    def resumen(self) -> dict:
+        return {
+            "intervalo": ESCRITURA_DIFERIDA_INTERVALO,
+            "max_pendientes": ESCRITURA_DIFERIDA_MAX,
+            "pendientes": {coleccion: len(lote) for coleccion, lote in self._pendientes.items()},
+            "vaciados": self.vaciados,
+        }
+
+
+escritura_diferida = EscrituraDiferida()
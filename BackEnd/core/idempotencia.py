@@ -0,0 +1,303 @@
+"""
+Claves de idempotencia (header Idempotency-Key) para los POST que crean datos.
+
+Los clientes móviles reintentan `POST /api/pedidos/`, `/api/pagos/` y
+`/api/carritos/{carrito_id}/items` cuando la conexión falla, y cada reintento
+creaba otro pedido o pago. Si la petición trae Idempotency-Key:
+
+- la primera ejecución reserva la clave en la colección `idempotencia`
+  (documento `en_curso`) y, al terminar, guarda ahí su respuesta (estado,
+  headers y cuerpo). Un índice TTL sobre `creado_en` borra las claves después
+  de IDEMPOTENCIA_TTL segundos;
+- los duplicados reciben la respuesta guardada, con el header
+  `Idempotent-Replayed: true`, desde una caché LRU en memoria o desde MongoDB;
+- un duplicado que llega mientras la primera sigue en curso la espera: en el
+  mismo proceso sobre un futuro compartido y, si la ejecuta otro worker,
+  consultando la colección. Si no termina en IDEMPOTENCIA_ESPERA segundos
+  responde 409;
+- la misma clave con otro cuerpo responde 422.
+
+Una vez que la ruta empezó a ejecutarse la clave nunca se libera: la escritura
+pudo haberse hecho aunque la respuesta sea un error. Las respuestas 5xx se
+guardan y se repiten como cualquier otra; si la petición se cancela (plazo
+vencido, desconexión) o el proceso muere, la clave queda `desconocido` y los
+reintentos reciben 409 hasta que vence.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Optional, Pattern, Tuple
+
+from pymongo.errors import DuplicateKeyError, PyMongoError
+from starlette.datastructures import Headers
+
+from core.cache import CacheLRU
+from core.metricas import registro
+from core.plazos import PLAZO_MAXIMO, restante, tarea_sin_plazo
+from core.resiliencia import MongoNoDisponible
+from database import get_collection
+
+logger = logging.getLogger("freshbowl.idempotencia")
+
+# Plantillas de ruta (POST) que aceptan Idempotency-Key, separadas por coma
+IDEMPOTENCIA_RUTAS = tuple(
+    ruta.strip()
+    for ruta in os.getenv(
+        "IDEMPOTENCIA_RUTAS", "/api/pedidos/,/api/pagos/,/api/carritos/{carrito_id}/items"
+    ).split(",")
+    if ruta.strip()
+)
+IDEMPOTENCIA_TTL = int(os.getenv("IDEMPOTENCIA_TTL", "86400"))
+IDEMPOTENCIA_CACHE_MAX = int(os.getenv("IDEMPOTENCIA_CACHE_MAX", "10000"))
+IDEMPOTENCIA_ESPERA = float(os.getenv("IDEMPOTENCIA_ESPERA", "10"))
+# Una petición no dura más que su plazo: pasado esto una reserva en curso quedó abandonada
+IDEMPOTENCIA_BLOQUEO = float(os.getenv("IDEMPOTENCIA_BLOQUEO", str(PLAZO_MAXIMO)))
+IDEMPOTENCIA_SONDEO = 0.1
+
+HEADER_CLAVE = "idempotency-key"
+MAX_LARGO_CLAVE = 255
+COLECCION = "idempotencia"
+
+Registro = dict
+
+peticiones_idempotentes = registro.contador(
+    "freshbowl_idempotency_requests_total", "Peticiones con Idempotency-Key por resultado", ("route", "outcome"))
+
+
+def _compilar(plantilla: str) -> Pattern:
+    partes = re.split(r"\{[^}]+\}", plantilla)
+    return re.compile("[^/]+".join(re.escape(parte) for parte in partes) + "$")
+
+
+_RUTAS: Tuple[Tuple[str, Pattern], ...] = tuple((ruta, _compilar(ruta)) for ruta in IDEMPOTENCIA_RUTAS)
+
+
+def ruta_idempotente(scope) -> Optional[str]:
+    """Plantilla configurada que corresponde a la petición (None si no aplica)"""
+    if scope["method"] != "POST":
+        return None
+    for plantilla, patron in _RUTAS:
+        if patron.match(scope["path"]):
+            return plantilla
+    return None
+
+
+async def _leer_cuerpo(receive) -> Tuple[bytes, Callable[[], Awaitable[dict]]]:
+    """Leer el cuerpo completo y devolver un receive que lo entrega de nuevo"""
+    partes = []
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            break
+        partes.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            break
+    cuerpo = b"".join(partes)
+    entregado = False
+
+    async def recibir():
+        nonlocal entregado
+        if not entregado:
+            entregado = True
+            return {"type": "http.request", "body": cuerpo, "more_body": False}
+        return await receive()
+
+    return cuerpo, recibir
+
+
+def _sin_almacen(exc: Exception):
+    """Con MongoDB caído la idempotencia queda solo dentro del proceso"""
+    if isinstance(exc, PyMongoError) and exc.timeout:
+        # Plazo vencido: lo resuelve PlazosMiddleware
+        raise exc
+    logger.warning("Idempotencia sin almacenamiento: %s", exc)
+
+
+class IdempotenciaMiddleware:
+    """Middleware ASGI que ejecuta una sola vez cada Idempotency-Key"""
+
+    def __init__(self, app):
+        self.app = app
+        self.cache = CacheLRU(COLECCION, max_items=IDEMPOTENCIA_CACHE_MAX, ttl=IDEMPOTENCIA_TTL)
+        self._en_vuelo: Dict[str, asyncio.Future] = {}
+
+    async def __call__(self, scope, receive, send):
+        ruta = ruta_idempotente(scope) if scope["type"] == "http" else None
+        headers = Headers(scope=scope) if ruta else None
+        clave_cliente = headers.get(HEADER_CLAVE) if headers else None
+        if not clave_cliente:
+            await self.app(scope, receive, send)
+            return
+        if len(clave_cliente) > MAX_LARGO_CLAVE:
+            await self._error(send, 400, f"Idempotency-Key no puede superar {MAX_LARGO_CLAVE} caracteres")
+            return
+
+        cuerpo, recibir = await _leer_cuerpo(receive)
+        huella = hashlib.sha256(cuerpo).hexdigest()
+        # La misma clave en otra ruta (o de otro usuario) es otra operación
+        clave = hashlib.sha256(
+            f"{scope['path']}\n{headers.get('authorization', '')}\n{clave_cliente}".encode()
+        ).hexdigest()
+
+        esperada = False
+        queda = restante()
+        limite = time.monotonic() + (IDEMPOTENCIA_ESPERA if queda is None else min(IDEMPOTENCIA_ESPERA, queda))
+        while True:
+            pendiente = self._en_vuelo.get(clave)
+            if pendiente is not None:
+                await asyncio.shield(pendiente)
+                esperada = True
+                continue
+
+            guardado = await self._buscar(clave)
+            if guardado is not None:
+                await self._repetir(send, ruta, guardado, huella, "esperada" if esperada else "repetida")
+                return
+
+            futuro = asyncio.get_running_loop().create_future()
+            self._en_vuelo[clave] = futuro
+            try:
+                if await self._reservar(clave, ruta, huella):
+                    await self._ejecutar(scope, recibir, send, clave, ruta, huella)
+                    return
+            finally:
+                del self._en_vuelo[clave]
+                futuro.set_result(None)
+
+            # Otro worker la está ejecutando
+            if time.monotonic() >= limite:
+                peticiones_idempotentes.inc((ruta, "en_curso"))
+                await self._error(send, 409, "Una petición con la misma Idempotency-Key sigue en curso",
+                                  [(b"retry-after", b"1")])
+                return
+            esperada = True
+            await asyncio.sleep(IDEMPOTENCIA_SONDEO)
+
+    # ============= ALMACENAMIENTO =============
+
+    async def _buscar(self, clave: str) -> Optional[Registro]:
+        """Resultado ya conocido para la clave (caché y luego MongoDB); None si no existe o sigue en curso"""
+        async def cargar():
+            doc = await get_collection(COLECCION).find_one({"_id": clave})
+            if doc is None or (doc["estado"] == "en_curso" and doc["bloqueado_hasta"] > datetime.utcnow()):
+                return None
+            # Una reserva abandonada por un proceso que murió: no se sabe si escribió
+            return doc
+
+        try:
+            return await self.cache.obtener(clave, cargar)
+        except (PyMongoError, MongoNoDisponible) as exc:
+            _sin_almacen(exc)
+            return None
+
+    async def _reservar(self, clave: str, ruta: str, huella: str) -> bool:
+        """Reservar la clave; False si ya existe (en curso o con resultado)"""
+        ahora = datetime.utcnow()
+        try:
+            coleccion = get_collection(COLECCION)
+            try:
+                await coleccion.insert_one({
+                    "_id": clave,
+                    "ruta": ruta,
+                    "huella": huella,
+                    "estado": "en_curso",
+                    "creado_en": ahora,
+                    "bloqueado_hasta": ahora + timedelta(seconds=IDEMPOTENCIA_BLOQUEO),
+                })
+                return True
+            except DuplicateKeyError:
+                return False
+        except (PyMongoError, MongoNoDisponible) as exc:
+            _sin_almacen(exc)
+            return True
+
+    async def _guardar(self, clave: str, registro_respuesta: Registro):
+        self.cache.precargar([(clave, registro_respuesta)])
+        try:
+            await get_collection(COLECCION).update_one(
+                {"_id": clave},
+                {"$set": registro_respuesta, "$unset": {"bloqueado_hasta": ""}},
+            )
+        except (PyMongoError, MongoNoDisponible) as exc:
+            _sin_almacen(exc)
+
+    async def _marcar_desconocido(self, clave: str, huella: str):
+        """La ruta empezó pero no hay respuesta: los reintentos reciben 409 hasta que la clave vence"""
+        registro_respuesta = {"estado": "desconocido", "huella": huella}
+        self.cache.precargar([(clave, registro_respuesta)])
+        try:
+            await get_collection(COLECCION).update_one(
+                {"_id": clave}, {"$set": registro_respuesta, "$unset": {"bloqueado_hasta": ""}},
+            )
+        except Exception as exc:
+            # Si no se pudo escribir, la reserva en curso vence y se trata igual
+            logger.warning("No se pudo marcar la Idempotency-Key %s: %s", clave[:12], exc)
+
+    # ============= EJECUCIÓN =============
+
+    async def _ejecutar(self, scope, recibir, send, clave: str, ruta: str, huella: str):
+        inicio = None
+        partes = []
+
+        async def capturar(message):
+            nonlocal inicio
+            if message["type"] == "http.response.start":
+                inicio = message
+            elif message["type"] == "http.response.body":
+                partes.append(message.get("body", b""))
+
+        try:
+            await self.app(scope, recibir, capturar)
+        except BaseException:
+            # La escritura pudo haberse hecho. Con el plazo vencido la marca va en
+            # una tarea propia; shield evita que una segunda cancelación la corte
+            peticiones_idempotentes.inc((ruta, "desconocido"))
+            await asyncio.shield(tarea_sin_plazo(self._marcar_desconocido(clave, huella)))
+            raise
+        if inicio is None:
+            peticiones_idempotentes.inc((ruta, "desconocido"))
+            await asyncio.shield(tarea_sin_plazo(self._marcar_desconocido(clave, huella)))
+            return
+
+        cuerpo = b"".join(partes)
+        # También los 5xx: la ruta pudo escribir antes de fallar
+        await self._guardar(clave, {
+            "estado": "completa",
+            "huella": huella,
+            "status": inicio["status"],
+            "headers": [[nombre.decode("latin-1"), valor.decode("latin-1")]
+                        for nombre, valor in inicio.get("headers", [])],
+            "cuerpo": cuerpo,
+        })
+        peticiones_idempotentes.inc((ruta, "error" if inicio["status"] >= 500 else "ejecutada"))
+        await send(inicio)
+        await send({"type": "http.response.body", "body": cuerpo})
+
+    async def _repetir(self, send, ruta: str, guardado: Registro, huella: str, resultado: str):
+        if guardado["huella"] != huella:
+            peticiones_idempotentes.inc((ruta, "cuerpo_distinto"))
+            await self._error(send, 422, "Idempotency-Key ya usada con otro cuerpo")
+            return
+        if guardado["estado"] != "completa":
+            peticiones_idempotentes.inc((ruta, "desconocido"))
+            await self._error(send, 409, "La petición con esta Idempotency-Key no terminó; su resultado es desconocido")
+            return
+        peticiones_idempotentes.inc((ruta, resultado))
+        headers = [(nombre.encode("latin-1"), valor.encode("latin-1")) for nombre, valor in guardado["headers"]]
+        headers.append((b"idempotent-replayed", b"true"))
+        await send({"type": "http.response.start", "status": guardado["status"], "headers": headers})
+        await send({"type": "http.response.body", "body": bytes(guardado["cuerpo"])})
+
+    @staticmethod
+    async def _error(send, status: int, detalle: str, headers=()):
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"application/json"), *headers],
+        })
+        await send({"type": "http.response.body", "body": json.dumps({"detail": detalle}).encode()})
@@ -0,0 +1,111 @@
+"""
+Preferencia de lectura por ruta.
+
+Las lecturas de reportes y listados (historial de pedidos, listados de
+administración, alertas de stock) compiten con el checkout en el primario.
+Las rutas GET listadas en LECTURA_SECUNDARIA_RUTAS (plantillas exactas de
+FastAPI) leen con `secondaryPreferred` y un máximo de atraso de
+LECTURA_MAX_ATRASO segundos; todo lo demás, incluidas las escrituras y los
+flujos que leen lo que acaban de escribir (checkout, estado del pedido,
+carrito y pagos, que se buscan por ?usuario_id= y ?pedido_id= justo después de
+escribirlos), sigue en el primario.
+
+database.get_collection consulta `preferencia_actual()`, que conoce la ruta
+en curso gracias a PreferenciaLecturaMiddleware. Sin replica set (o con
+ALMACENAMIENTO=memoria) la preferencia no cambia nada.
+
+OyenteMiembros cuenta los comandos por miembro del replica set y su rol, para
+verificar a quién llega cada consulta.
+"""
+import os
+import threading
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from pymongo import monitoring
+from pymongo.read_preferences import ReadPreference, SecondaryPreferred
+
+from core.metricas import plantilla_ruta, registro
+
+LECTURA_SECUNDARIA_RUTAS = frozenset(
+    ruta.strip()
+    for ruta in os.getenv(
+        "LECTURA_SECUNDARIA_RUTAS",
+        "/api/pedidos/,/api/pedidos/usuario/{usuario_id}/historial,/api/usuarios/,"
+        "/api/envios/,/api/comprobantes/,/api/ingredientes/alertas",
+    ).split(",")
+    if ruta.strip()
+)
+# MongoDB exige al menos 90 segundos (o -1 para no acotar el atraso)
+LECTURA_MAX_ATRASO = int(os.getenv("LECTURA_MAX_ATRASO", "90"))
+
+SECUNDARIA = SecondaryPreferred(max_staleness=LECTURA_MAX_ATRASO)
+
+_peticion: ContextVar[Optional[dict]] = ContextVar("lectura_peticion", default=None)
+
+mongo_comandos_miembro = registro.contador(
+    "freshbowl_mongo_commands_by_member_total", "Comandos por miembro del replica set que los atendió",
+    ("member", "role", "command"))
+
+
+def preferencia_actual() -> Optional[ReadPreference]:
+    """Preferencia de lectura para la petición en curso (None = la del cliente, primario)"""
+    scope = _peticion.get()
+    if scope is None or scope["method"] != "GET":
+        return None
+    if plantilla_ruta(scope) in LECTURA_SECUNDARIA_RUTAS:
+        return SECUNDARIA
+    return None
+
+
+class PreferenciaLecturaMiddleware:
+    """Middleware ASGI que deja la petición en curso al alcance de get_collection"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = _peticion.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _peticion.reset(token)
+
+
+# ============= MÉTRICAS POR MIEMBRO =============
+
+class OyenteMiembros(monitoring.CommandListener, monitoring.ServerListener):
+    """Cuenta los comandos por servidor y rol (se registra como listener de comandos y de servidores)"""
+
+    def __init__(self):
+        self._roles: Dict[tuple, str] = {}
+        self._lock = threading.Lock()
+
+    # ----- servidores -----
+
+    def opened(self, event):
+        pass
+
+    def description_changed(self, event):
+        with self._lock:
+            self._roles[event.server_address] = event.new_description.server_type_name
+
+    def closed(self, event):
+        with self._lock:
+            self._roles.pop(event.server_address, None)
+
+    # ----- comandos -----
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        host, puerto = event.connection_id
+        rol = self._roles.get(event.connection_id, "Unknown")
+        mongo_comandos_miembro.inc((f"{host}:{puerto}", rol, event.command_name))
+
+    def failed(self, event):
+        pass
@@ -0,0 +1,252 @@
+"""
+Perfilado de memoria: snapshots de tracemalloc, diferencias entre ellos,
+incremento de memoria por ruta y RSS del proceso.
+
+tracemalloc se activa bajo demanda desde /api/admin/memoria o al iniciar con
+MEMORIA_TRACEMALLOC=true (tiene costo: úsalo para investigar, no siempre).
+Mientras está activo, el middleware registra por ruta cuánta memoria quedó
+retenida al terminar cada petición y, cuando la petición corrió sola, el pico
+que alcanzó.
+"""
+import asyncio
+import logging
+import os
+import sys
+import tracemalloc
+from collections import deque
+from datetime import datetime
+from typing import Dict, Optional
+
+from core.metricas import plantilla_ruta
+
+try:
+    import resource
+except ImportError:
+    # Windows: no hay getrusage y el RSS se reporta como None
+    resource = None
+
+logger = logging.getLogger("freshbowl.memoria")
+
+MEMORIA_TRACEMALLOC = os.getenv("MEMORIA_TRACEMALLOC", "false").lower() in ("1", "true", "yes")
+MEMORIA_FRAMES = int(os.getenv("MEMORIA_FRAMES", "1"))
+# Cada cuántos segundos se toma un snapshot automático (0 = solo bajo demanda)
+MEMORIA_SNAPSHOT_INTERVALO = float(os.getenv("MEMORIA_SNAPSHOT_INTERVALO", "0"))
+MEMORIA_MAX_SNAPSHOTS = int(os.getenv("MEMORIA_MAX_SNAPSHOTS", "10"))
+
+# Asignaciones propias de la instrumentación que no interesan en los reportes
+_FILTROS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+def rss() -> dict:
+    """RSS actual y pico del proceso en bytes (None si la plataforma no los da)"""
+    actual = pico = None
+    try:
+        with open("/proc/self/status", encoding="ascii") as status:
+            for linea in status:
+                if linea.startswith("VmRSS:"):
+                    actual = int(linea.split()[1]) * 1024
+                elif linea.startswith("VmHWM:"):
+                    pico = int(linea.split()[1]) * 1024
+    except OSError:
+        # Sin /proc (macOS, BSD) solo está el pico; ru_maxrss viene en bytes en
+        # macOS y en KB en el resto. En Windows no hay ninguno de los dos
+        if resource is not None:
+            maximo = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            pico = maximo if sys.platform == "darwin" else maximo * 1024
+    return {"rss": actual, "rss_pico": pico}
+
+
+def _ubicacion(estadistica) -> str:
+    frame = estadistica.traceback[0]
+    # Agrupado por archivo, tracemalloc deja la línea en 0
+    return f"{frame.filename}:{frame.lineno}" if frame.lineno else frame.filename
+
+
+def _formatear(estadistica) -> dict:
+    return {
+        "ubicacion": _ubicacion(estadistica),
+        "bytes": estadistica.size,
+        "bloques": estadistica.count,
+    }
+
+
+def _formatear_diferencia(estadistica) -> dict:
+    return {
+        "ubicacion": _ubicacion(estadistica),
+        "bytes": estadistica.size,
+        "diferencia_bytes": estadistica.size_diff,
+        "bloques": estadistica.count,
+        "diferencia_bloques": estadistica.count_diff,
+    }
+
+
+class EstadisticaRuta:
+    __slots__ = ("peticiones", "retenido_total", "retenido_max", "picos", "pico_max")
+
+    def __init__(self):
+        self.peticiones = 0
+        self.retenido_total = 0
+        self.retenido_max = 0
+        self.picos = 0
+        self.pico_max = 0
+
+    def resumen(self) -> dict:
+        return {
+            "peticiones": self.peticiones,
+            "retenido_promedio": self.retenido_total // max(self.peticiones, 1),
+            "retenido_max": self.retenido_max,
+            "picos_medidos": self.picos,
+            "pico_max": self.pico_max,
+        }
+
+
+class PerfilMemoria:
+    def __init__(self):
+        self.snapshots: "deque[tuple]" = deque(maxlen=MEMORIA_MAX_SNAPSHOTS)
+        self.rutas: Dict[str, EstadisticaRuta] = {}
+        self._siguiente_id = 1
+        self._tarea: Optional[asyncio.Task] = None
+        # Para saber si una petición corrió sola (y su pico es atribuible)
+        self._en_curso = 0
+        self._generacion = 0
+
+    # ----- tracemalloc -----
+
+    def iniciar_tracemalloc(self, frames: int = MEMORIA_FRAMES):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+            logger.info("tracemalloc activado (%s frames)", frames)
+
+    def detener_tracemalloc(self):
+        tracemalloc.stop()
+        self.snapshots.clear()
+        self.rutas.clear()
+
+    def estado(self) -> dict:
+        activo = tracemalloc.is_tracing()
+        actual, pico = tracemalloc.get_traced_memory() if activo else (0, 0)
+        return {
+            **rss(),
+            "tracemalloc": {
+                "activo": activo,
+                "frames": tracemalloc.get_traceback_limit() if activo else None,
+                "actual": actual,
+                "pico": pico,
+            },
+            "snapshots": [{"id": id_, "tomado_en": tomado_en} for id_, tomado_en, _ in self.snapshots],
+            "rutas": {
+                ruta: estadistica.resumen()
+                for ruta, estadistica in sorted(
+                    self.rutas.items(), key=lambda item: item[1].retenido_total, reverse=True
+                )
+            },
+        }
+
+    # ----- snapshots -----
+
+    async def tomar_snapshot(self, limite: int = 20) -> dict:
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("tracemalloc no está activo")
+        # take_snapshot y las estadísticas recorren todo el heap: fuera del event loop
+        snapshot = await asyncio.to_thread(lambda: tracemalloc.take_snapshot().filter_traces(_FILTROS))
+        id_ = self._siguiente_id
+        self._siguiente_id += 1
+        self.snapshots.append((id_, datetime.utcnow(), snapshot))
+        top = await asyncio.to_thread(snapshot.statistics, "lineno")
+        return {"id": id_, "top": [_formatear(estadistica) for estadistica in top[:limite]]}
+
+    def _buscar(self, id_: int):
+        for snapshot_id, _, snapshot in self.snapshots:
+            if snapshot_id == id_:
+                return snapshot
+        return None
+
+    async def diferencia(self, desde: Optional[int] = None, hasta: Optional[int] = None,
+                         agrupar: str = "lineno", limite: int = 20) -> dict:
+        """Principales sitios de asignación que crecieron entre dos snapshots"""
+        if len(self.snapshots) < 2 and (desde is None or hasta is None):
+            raise LookupError("Se necesitan al menos dos snapshots")
+        desde = desde if desde is not None else self.snapshots[-2][0]
+        hasta = hasta if hasta is not None else self.snapshots[-1][0]
+        anterior, posterior = self._buscar(desde), self._buscar(hasta)
+        if anterior is None or posterior is None:
+            raise LookupError("Snapshot no encontrado")
+
+        diferencias = await asyncio.to_thread(posterior.compare_to, anterior, agrupar)
+        return {
+            "desde": desde,
+            "hasta": hasta,
+            "agrupar": agrupar,
+            "crecimiento_total": sum(d.size_diff for d in diferencias),
+            "top": [_formatear_diferencia(d) for d in diferencias[:limite]],
+        }
+
+    async def _snapshots_periodicos(self):
+        while True:
+            await asyncio.sleep(MEMORIA_SNAPSHOT_INTERVALO)
+            if tracemalloc.is_tracing():
+                await self.tomar_snapshot()
+
+    def iniciar(self):
+        if MEMORIA_TRACEMALLOC:
+            self.iniciar_tracemalloc()
+        if MEMORIA_SNAPSHOT_INTERVALO > 0:
+            self._tarea = asyncio.create_task(self._snapshots_periodicos())
+
+    def detener(self):
+        if self._tarea is not None:
+            self._tarea.cancel()
+            self._tarea = None
+
+    # ----- por ruta -----
+
+    def _registrar(self, ruta: str, retenido: int, pico: Optional[int]):
+        estadistica = self.rutas.get(ruta)
+        if estadistica is None:
+            estadistica = self.rutas[ruta] = EstadisticaRuta()
+        estadistica.peticiones += 1
+        estadistica.retenido_total += retenido
+        estadistica.retenido_max = max(estadistica.retenido_max, retenido)
+        if pico is not None:
+            estadistica.picos += 1
+            estadistica.pico_max = max(estadistica.pico_max, pico)
+
+
+perfil_memoria = PerfilMemoria()
+
+
+class MemoriaMiddleware:
+    """Middleware ASGI: memoria retenida y pico por ruta (solo con tracemalloc activo)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not tracemalloc.is_tracing():
+            await self.app(scope, receive, send)
+            return
+
+        perfil = perfil_memoria
+        if perfil._en_curso == 0:
+            # El pico es global: solo se reinicia si esta petición arranca sola
+            tracemalloc.reset_peak()
+        perfil._en_curso += 1
+        perfil._generacion += 1
+        generacion = perfil._generacion
+        sola = perfil._en_curso == 1
+        inicio, _ = tracemalloc.get_traced_memory()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            perfil._en_curso -= 1
+            if tracemalloc.is_tracing():
+                actual, pico = tracemalloc.get_traced_memory()
+                # Si otra petición empezó mientras tanto, el pico no es atribuible
+                atribuible = sola and generacion == perfil._generacion
+                ruta = plantilla_ruta(scope) or "sin_ruta"
+                perfil._registrar(ruta, actual - inicio, pico - inicio if atribuible else None)
@@ -0,0 +1,186 @@
+"""
+Snapshot del menú completo (categorías → productos → variantes → ingredientes).
+
+El snapshot se guarda en memoria ya serializado y comprimido, de modo que
+servir GET /api/menu solo copia bytes. Se reconstruye en segundo plano cada
+vez que cambia el catálogo.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Dict, Optional
+
+from bson import ObjectId
+
+from core.catalogo import catalogo
+from core.compresion import COMPRESION_MIN_BYTES, brotli, comprimir
+from core.plazos import leer_con_reintentos, tarea_sin_plazo
+from core.trazas import span_actual, trazar
+from database import get_collection
+
+logger = logging.getLogger("freshbowl.menu")
+
+# Espera antes de reconstruir, para agrupar ráfagas de escrituras
+MENU_REBUILD_DELAY = float(os.getenv("MENU_REBUILD_DELAY", "0.2"))
+
+
+def _json_default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def codificar_json(data) -> bytes:
+    """Serializar a JSON compacto (UTF-8)"""
+    return json.dumps(data, default=_json_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class MenuSnapshot:
+    def __init__(self, valor: int, version: str, cuerpo: bytes):
+        # Valor local del catálogo al empezar a construirlo y versión compartida en ese momento
+        self.valor = valor
+        self._etag = f'"m-{version}"'
+        self.generado_en = time.time()
+        # Representaciones precalculadas por codificación (None = sin comprimir)
+        self.representaciones: Dict[Optional[str], bytes] = {None: cuerpo}
+        if len(cuerpo) >= COMPRESION_MIN_BYTES:
+            self.representaciones["gzip"] = comprimir(cuerpo, "gzip")
+            if brotli is not None:
+                self.representaciones["br"] = comprimir(cuerpo, "br")
+
+    @property
+    def etag(self) -> str:
+        """Mientras el catálogo no cambie sigue la versión compartida (un cambio
+        propio que recibe su número en el log no altera el contenido)"""
+        if self.valor == catalogo.valor:
+            self._etag = f'"m-{catalogo.version()}"'
+        return self._etag
+
+
+async def _leer(coleccion: str, filtro: dict) -> list:
+    return await leer_con_reintentos(lambda: get_collection(coleccion).find(filtro).to_list(length=None))
+
+
+async def construir_menu() -> dict:
+    """Leer el catálogo y armar el documento desnormalizado del menú"""
+    categorias = await _leer("categorias", {"visible": {"$ne": False}})
+    productos = await _leer("productos", {"activo": {"$ne": False}})
+    variantes = await _leer("variantes", {"activo": {"$ne": False}})
+    relaciones = await _leer("producto_ingredientes", {})
+    ingredientes = await _leer("ingredientes", {})
+
+    ingredientes_por_id = {str(ing["_id"]): ing for ing in ingredientes}
+
+    variantes_por_producto = {}
+    for variante in variantes:
+        variantes_por_producto.setdefault(variante.get("producto_id"), []).append({
+            "_id": str(variante["_id"]),
+            "nombre": variante.get("nombre"),
+            "precio": variante.get("precio"),
+        })
+
+    ingredientes_por_producto = {}
+    for relacion in relaciones:
+        ing = ingredientes_por_id.get(relacion.get("ingrediente_id"))
+        if ing is None:
+            continue
+        ingredientes_por_producto.setdefault(relacion.get("producto_id"), []).append({
+            "_id": str(ing["_id"]),
+            "nombre": ing.get("nombre"),
+            "tipo": relacion.get("tipo"),
+            "opcional": relacion.get("opcional", False),
+            "adicional": ing.get("adicional", False),
+            "precio_adicional": ing.get("precio_adicional", 0),
+            "disponible": ing.get("disponible", True) and ing.get("stock", 100) > 0,
+        })
+
+    productos_por_categoria = {}
+    for prod in productos:
+        producto_id = str(prod["_id"])
+        item = {key: value for key, value in prod.items() if key != "_id"}
+        item["_id"] = producto_id
+        item["variantes"] = variantes_por_producto.get(producto_id, [])
+        item["ingredientes_detalle"] = ingredientes_por_producto.get(producto_id, [])
+        productos_por_categoria.setdefault(prod.get("categoria_id"), []).append(item)
+
+    menu_categorias = []
+    for cat in categorias:
+        categoria_id = str(cat["_id"])
+        menu_categorias.append({
+            "_id": categoria_id,
+            "nombre": cat.get("nombre"),
+            "slug": cat.get("slug"),
+            "descripcion": cat.get("descripcion"),
+            "productos": productos_por_categoria.pop(categoria_id, []),
+        })
+
+    # Productos sin categoría (o con una categoría oculta/inexistente)
+    sin_categoria = [prod for grupo in productos_por_categoria.values() for prod in grupo]
+
+    return {
+        "categorias": menu_categorias,
+        "sin_categoria": sin_categoria,
+    }
+
+
+class MenuCache:
+    def __init__(self):
+        self.actual: Optional[MenuSnapshot] = None
+        self._tarea: Optional[asyncio.Task] = None
+        self._pendiente = False
+        self.ultimo_error: Optional[Exception] = None
+
+    def al_cambiar_catalogo(self, coleccion, doc_id, operacion):
+        """Suscriptor de core.catalogo: programa una reconstrucción"""
+        self.programar_reconstruccion()
+
+    def programar_reconstruccion(self) -> asyncio.Task:
+        if self._tarea is not None and not self._tarea.done():
+            self._pendiente = True
+            return self._tarea
+        # La reconstrucción es compartida: no hereda el plazo de la escritura que la programó
+        self._tarea = tarea_sin_plazo(self._reconstruir(MENU_REBUILD_DELAY if self.actual else 0), span_actual)
+        return self._tarea
+
+    async def _reconstruir(self, espera: float):
+        if espera:
+            await asyncio.sleep(espera)
+        # La tarea conserva la traza de la escritura que la programó
+        with trazar("menu.reconstruir"):
+            await self._reconstruir_snapshot()
+
+    async def _reconstruir_snapshot(self):
+        while True:
+            self._pendiente = False
+            valor, version = catalogo.valor, catalogo.version()
+            try:
+                menu = await construir_menu()
+            except Exception as exc:
+                # Se mantiene el snapshot anterior; el próximo cambio reintenta
+                self.ultimo_error = exc
+                logger.warning("No se pudo reconstruir el menú: %s", exc)
+                return
+            self.ultimo_error = None
+            # Serializar y comprimir fuera del event loop
+            self.actual = await asyncio.to_thread(
+                lambda: MenuSnapshot(valor, version, codificar_json(menu))
+            )
+            if not self._pendiente:
+                break
+
+    async def obtener(self) -> MenuSnapshot:
+        """Devolver el snapshot vigente (lo construye si aún no existe)"""
+        if self.actual is None:
+            await self.programar_reconstruccion()
+            if self.actual is None:
+                raise RuntimeError(f"Menú no disponible: {self.ultimo_error}")
+        return self.actual
+
+
+menu_cache = MenuCache()
+catalogo.suscribir(menu_cache.al_cambiar_catalogo)
@@ -0,0 +1,327 @@
+"""
+Métricas en formato Prometheus (texto) expuestas en GET /metrics.
+
+Los contadores e histogramas no usan locks al escribir: cada hilo escribe en
+su propio shard (threading.local) y los shards solo se suman al generar el
+texto. Esto importa porque los listeners de pymongo corren en los hilos del
+executor de Motor, en paralelo con el event loop.
+"""
+import bisect
+import re
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import monitoring
+
+Etiquetas = Tuple[str, ...]
+
+BUCKETS_LATENCIA = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _escapar(valor: str) -> str:
+    return valor.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _formatear_etiquetas(nombres: Iterable[str], valores: Iterable[str], extra: str = "") -> str:
+    partes = [f'{nombre}="{_escapar(str(valor))}"' for nombre, valor in zip(nombres, valores)]
+    if extra:
+        partes.append(extra)
+    return "{" + ",".join(partes) + "}" if partes else ""
+
+
+class _Sharded:
+    """Base para métricas con un shard por hilo"""
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Tuple[str, ...] = ()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        self._local = threading.local()
+        self._shards: List[dict] = []
+        self._registro_lock = threading.Lock()
+
+    def _shard(self) -> dict:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = {}
+            # El lock solo se toma la primera vez que un hilo escribe
+            with self._registro_lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+        return shard
+
+
+class Contador(_Sharded):
+    tipo = "counter"
+
+    def inc(self, etiquetas: Etiquetas = (), valor: float = 1):
+        shard = self._shard()
+        shard[etiquetas] = shard.get(etiquetas, 0) + valor
+
+    def valores(self) -> Dict[Etiquetas, float]:
+        total: Dict[Etiquetas, float] = {}
+        for shard in list(self._shards):
+            for etiquetas, valor in shard.copy().items():
+                total[etiquetas] = total.get(etiquetas, 0) + valor
+        return total
+
+    def render(self) -> List[str]:
+        return [
+            f"{self.nombre}{_formatear_etiquetas(self.etiquetas, etiquetas)} {valor}"
+            for etiquetas, valor in sorted(self.valores().items())
+        ]
+
+
+class Histograma(_Sharded):
+    tipo = "histogram"
+
+    def __init__(self, nombre, ayuda, etiquetas=(), buckets=BUCKETS_LATENCIA):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.buckets = tuple(buckets)
+
+    def observar(self, etiquetas: Etiquetas, valor: float):
+        shard = self._shard()
+        datos = shard.get(etiquetas)
+        if datos is None:
+            # [conteo por bucket..., +Inf, suma]
+            datos = shard[etiquetas] = [0] * (len(self.buckets) + 1) + [0.0]
+        datos[bisect.bisect_left(self.buckets, valor)] += 1
+        datos[-1] += valor
+
+    def render(self) -> List[str]:
+        total: Dict[Etiquetas, list] = {}
+        for shard in list(self._shards):
+            for etiquetas, datos in shard.copy().items():
+                acumulado = total.setdefault(etiquetas, [0] * len(datos))
+                for i, valor in enumerate(list(datos)):
+                    acumulado[i] += valor
+
+        lineas = []
+        for etiquetas, datos in sorted(total.items()):
+            acumulado = 0
+            for limite, conteo in zip(self.buckets + ("+Inf",), datos[:-1]):
+                acumulado += conteo
+                le = f'le="{limite}"'
+                lineas.append(f"{self.nombre}_bucket{_formatear_etiquetas(self.etiquetas, etiquetas, le)} {acumulado}")
+            lineas.append(f"{self.nombre}_sum{_formatear_etiquetas(self.etiquetas, etiquetas)} {datos[-1]}")
+            lineas.append(f"{self.nombre}_count{_formatear_etiquetas(self.etiquetas, etiquetas)} {acumulado}")
+        return lineas
+
+
+class Gauge:
+    """Gauge escrito solo desde el event loop (no necesita shards)"""
+    tipo = "gauge"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Tuple[str, ...] = ()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        self._valores: Dict[Etiquetas, float] = {}
+
+    def sumar(self, etiquetas: Etiquetas = (), delta: float = 1):
+        self._valores[etiquetas] = self._valores.get(etiquetas, 0) + delta
+
+    def fijar(self, etiquetas: Etiquetas = (), valor: float = 0):
+        self._valores[etiquetas] = valor
+
+    def render(self) -> List[str]:
+        return [
+            f"{self.nombre}{_formatear_etiquetas(self.etiquetas, etiquetas)} {valor}"
+            for etiquetas, valor in sorted(self._valores.copy().items())
+        ]
+
+
+class Registro:
+    def __init__(self):
+        self._metricas = []
+        # Funciones que, al momento del scrape, devuelven (nombre, tipo, ayuda, [(etiquetas, valor)])
+        self._colectores: List[Callable[[], Iterable[tuple]]] = []
+
+    def registrar(self, metrica):
+        self._metricas.append(metrica)
+        return metrica
+
+    def contador(self, nombre, ayuda, etiquetas=()) -> Contador:
+        return self.registrar(Contador(nombre, ayuda, etiquetas))
+
+    def histograma(self, nombre, ayuda, etiquetas=(), buckets=BUCKETS_LATENCIA) -> Histograma:
+        return self.registrar(Histograma(nombre, ayuda, etiquetas, buckets))
+
+    def gauge(self, nombre, ayuda, etiquetas=()) -> Gauge:
+        return self.registrar(Gauge(nombre, ayuda, etiquetas))
+
+    def colector(self, funcion: Callable[[], Iterable[tuple]]):
+        self._colectores.append(funcion)
+        return funcion
+
+    def render(self) -> str:
+        lineas = []
+        for metrica in self._metricas:
+            lineas.append(f"# HELP {metrica.nombre} {metrica.ayuda}")
+            lineas.append(f"# TYPE {metrica.nombre} {metrica.tipo}")
+            lineas.extend(metrica.render())
+        for funcion in self._colectores:
+            for nombre, tipo, ayuda, muestras in funcion():
+                lineas.append(f"# HELP {nombre} {ayuda}")
+                lineas.append(f"# TYPE {nombre} {tipo}")
+                for etiquetas, valor in muestras:
+                    texto = ",".join(f'{k}="{_escapar(str(v))}"' for k, v in etiquetas.items())
+                    lineas.append(f"{nombre}{{{texto}}} {valor}" if texto else f"{nombre} {valor}")
+        return "\n".join(lineas) + "\n"
+
+
+registro = Registro()
+
+# ============= HTTP =============
+
+http_peticiones = registro.contador(
+    "freshbowl_http_requests_total", "Peticiones HTTP atendidas", ("method", "route", "status"))
+http_latencia = registro.histograma(
+    "freshbowl_http_request_duration_seconds", "Latencia de las peticiones HTTP", ("method", "route"))
+http_en_curso = registro.gauge(
+    "freshbowl_http_requests_in_flight", "Peticiones HTTP en curso", ("method", "route"))
+
+# ============= MONGODB =============
+
+mongo_comandos = registro.contador(
+    "freshbowl_mongo_commands_total", "Comandos enviados a MongoDB", ("collection", "command", "outcome"))
+mongo_latencia = registro.histograma(
+    "freshbowl_mongo_command_duration_seconds", "Latencia de los comandos de MongoDB", ("collection", "command"))
+mongo_espera_pool = registro.histograma(
+    "freshbowl_mongo_pool_checkout_wait_seconds", "Espera para obtener una conexión del pool")
+mongo_checkout_fallidos = registro.contador(
+    "freshbowl_mongo_pool_checkout_failed_total", "Checkouts del pool fallidos", ("reason",))
+
+# ============= EVENT LOOP (los alimenta core.bloqueos) =============
+
+loop_lag = registro.histograma(
+    "freshbowl_event_loop_lag_seconds", "Retraso del event loop respecto del intervalo esperado",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5))
+loop_lag_actual = registro.gauge(
+    "freshbowl_event_loop_lag_last_seconds", "Último retraso medido del event loop")
+
+
+# ============= RUTAS =============
+
+_ID_EN_RUTA = re.compile(r"/(?:[0-9a-fA-F]{24}|\d+)(?=/|$)")
+_plantillas: Dict[Tuple[str, str], str] = {}
+_MAX_PLANTILLAS = 1000
+
+
+def normalizar_ruta(path: str) -> str:
+    """Reemplaza los ObjectId y números de la ruta para no crear una serie por documento"""
+    return _ID_EN_RUTA.sub("/{id}", path)
+
+
+def plantilla_ruta(scope) -> Optional[str]:
+    """Plantilla completa de la ruta atendida, o None si no hubo match"""
+    # Las versiones recientes de FastAPI resuelven los routers incluidos de
+    # forma diferida y dejan en scope["route"] la ruta sin el prefijo
+    contexto = scope.get("fastapi", {}).get("effective_route_context")
+    plantilla = getattr(contexto, "path", None)
+    if plantilla is None:
+        plantilla = getattr(scope.get("route"), "path", None)
+    return plantilla
+
+
+class MetricasMiddleware:
+    """
+    Middleware ASGI: conteo, latencia y peticiones en curso por ruta.
+
+    La plantilla de la ruta (p. ej. /api/productos/{producto_id}) solo se
+    conoce después del enrutamiento; para el gauge de peticiones en curso se
+    usa la plantilla aprendida en peticiones anteriores a la misma ruta
+    normalizada.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        metodo = scope["method"]
+        normalizada = normalizar_ruta(scope["path"])
+        en_curso = _plantillas.get((metodo, normalizada), "sin_ruta")
+        estado = 500
+
+        async def enviar(message):
+            nonlocal estado
+            if message["type"] == "http.response.start":
+                estado = message["status"]
+            await send(message)
+
+        http_en_curso.sumar((metodo, en_curso), 1)
+        inicio = time.perf_counter()
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            duracion = time.perf_counter() - inicio
+            http_en_curso.sumar((metodo, en_curso), -1)
+
+            plantilla = plantilla_ruta(scope)
+            if plantilla is None:
+                # Respondida antes del router (p. ej. 304 del catálogo) o 404:
+                # se usa la plantilla aprendida o una sola serie "sin_ruta"
+                plantilla = en_curso
+            elif len(_plantillas) < _MAX_PLANTILLAS:
+                _plantillas[(metodo, normalizada)] = plantilla
+            http_peticiones.inc((metodo, plantilla, str(estado)))
+            http_latencia.observar((metodo, plantilla), duracion)
+
+
+# ============= LISTENERS DE PYMONGO =============
+
+class OyenteComandos(monitoring.CommandListener):
+    """Latencia y errores por colección y comando"""
+
+    def __init__(self):
+        self._colecciones: Dict[tuple, str] = {}
+
+    def started(self, event):
+        coleccion = event.command.get(event.command_name)
+        self._colecciones[(event.request_id, event.connection_id)] = (
+            coleccion if isinstance(coleccion, str) else "-"
+        )
+
+    def _terminar(self, event, resultado: str):
+        coleccion = self._colecciones.pop((event.request_id, event.connection_id), "-")
+        mongo_comandos.inc((coleccion, event.command_name, resultado))
+        mongo_latencia.observar((coleccion, event.command_name), event.duration_micros / 1_000_000)
+
+    def succeeded(self, event):
+        self._terminar(event, "ok")
+
+    def failed(self, event):
+        self._terminar(event, "error")
+
+
+class OyentePool(monitoring.ConnectionPoolListener):
+    """Tiempo de espera para obtener una conexión del pool"""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def connection_check_out_started(self, event):
+        self._local.inicio = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        duracion = getattr(event, "duration", None)
+        if duracion is None:
+            duracion = time.perf_counter() - getattr(self._local, "inicio", time.perf_counter())
+        mongo_espera_pool.observar((), duracion)
+
+    def connection_check_out_failed(self, event):
+        mongo_checkout_fallidos.inc((str(event.reason),))
+
+    # Eventos sin interés para las métricas
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def pool_cleared(self, event): pass
+    def pool_closed(self, event): pass
+    def connection_created(self, event): pass
+    def connection_ready(self, event): pass
+    def connection_closed(self, event): pass
+    def connection_checked_in(self, event): pass
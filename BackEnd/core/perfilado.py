@@ -0,0 +1,196 @@
+"""
+Perfilado de CPU por petición.
+
+Una petición se perfila si trae el header `X-Profile: 1` junto con un
+X-Admin-Token válido, o si cae en la fracción PERFIL_MUESTREO. Mientras dure,
+un hilo muestreador toma la pila del hilo del event loop cada PERFIL_INTERVALO
+segundos y cuenta solo las muestras en las que la pila pasa por el frame del
+middleware de esa petición, así las demás peticiones concurrentes no se mezclan.
+
+El resultado se guarda en PERFILES_DIR en formato de pilas colapsadas
+("a;b;c N"), que speedscope y flamegraph.pl abren directamente. Sin peticiones
+perfiladas no hay hilo muestreador ni costo adicional.
+"""
+import asyncio
+import os
+import random
+import re
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import List, Optional
+
+from core.admin import ADMIN_TOKEN, token_admin_valido
+from core.metricas import plantilla_ruta
+
+PERFIL_MUESTREO = float(os.getenv("PERFIL_MUESTREO", "0"))
+PERFIL_INTERVALO = float(os.getenv("PERFIL_INTERVALO", "0.005"))
+PERFILES_DIR = os.getenv("PERFILES_DIR", "perfiles")
+PERFILES_MAX = int(os.getenv("PERFILES_MAX", "100"))
+
+EXTENSION = ".collapsed.txt"
+_NOMBRE_INVALIDO = re.compile(r"[^A-Za-z0-9_]+")
+
+
+class PerfilPeticion:
+    __slots__ = ("id", "marco", "muestras", "inicio")
+
+    def __init__(self, marco):
+        self.id = secrets.token_hex(6)
+        self.marco = marco
+        self.muestras: Counter = Counter()
+        self.inicio = time.perf_counter()
+
+
+def _nombre_frame(frame) -> str:
+    codigo = frame.f_code
+    return f"{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{codigo.co_firstlineno})"
+
+
+class Muestreador:
+    """Hilo que muestrea la pila del event loop mientras haya perfiles activos"""
+
+    def __init__(self):
+        self._activos: List[PerfilPeticion] = []
+        self._lock = threading.Lock()
+        self._hilo: Optional[threading.Thread] = None
+        self._hilo_loop: Optional[int] = None
+
+    def agregar(self, perfil: PerfilPeticion):
+        with self._lock:
+            self._activos.append(perfil)
+            self._hilo_loop = threading.get_ident()
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._muestrear, name="perfilado", daemon=True)
+                self._hilo.start()
+
+    def quitar(self, perfil: PerfilPeticion):
+        with self._lock:
+            self._activos.remove(perfil)
+
+    def _muestrear(self):
+        while True:
+            with self._lock:
+                activos = list(self._activos)
+                if not activos:
+                    # El hilo termina cuando no queda nada que perfilar
+                    self._hilo = None
+                    return
+            frame = sys._current_frames().get(self._hilo_loop)
+            pila = []
+            while frame is not None:
+                pila.append(frame)
+                frame = frame.f_back
+            for perfil in activos:
+                # Solo cuenta si la petición perfilada es la que está corriendo
+                for i, marco in enumerate(pila):
+                    if marco is perfil.marco:
+                        nombres = [_nombre_frame(f) for f in reversed(pila[:i + 1])]
+                        perfil.muestras[";".join(nombres)] += 1
+                        break
+            time.sleep(PERFIL_INTERVALO)
+
+
+muestreador = Muestreador()
+
+
+# ============= ARCHIVOS =============
+
+def _guardar(perfil: PerfilPeticion, metodo: str, ruta: str) -> str:
+    os.makedirs(PERFILES_DIR, exist_ok=True)
+    marca = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+    nombre_ruta = _NOMBRE_INVALIDO.sub("_", ruta).strip("_") or "raiz"
+    ruta_archivo = os.path.join(PERFILES_DIR, f"{marca}-{metodo}-{nombre_ruta}-{perfil.id}{EXTENSION}")
+    with open(ruta_archivo, "w", encoding="utf-8") as archivo:
+        for pila, conteo in perfil.muestras.most_common():
+            archivo.write(f"{pila} {conteo}\n")
+
+    # Se conservan solo los PERFILES_MAX más recientes
+    archivos = sorted(f for f in os.listdir(PERFILES_DIR) if f.endswith(EXTENSION))
+    for antiguo in archivos[:-PERFILES_MAX]:
+        os.remove(os.path.join(PERFILES_DIR, antiguo))
+    return ruta_archivo
+
+
+def listar_perfiles() -> list:
+    if not os.path.isdir(PERFILES_DIR):
+        return []
+    perfiles = []
+    for nombre in sorted(os.listdir(PERFILES_DIR), reverse=True):
+        if not nombre.endswith(EXTENSION):
+            continue
+        marca, metodo, resto = nombre[:-len(EXTENSION)].split("-", 2)
+        ruta, perfil_id = resto.rsplit("-", 1)
+        perfiles.append({
+            "id": perfil_id,
+            "creado_en": datetime.strptime(marca, "%Y%m%dT%H%M%S"),
+            "metodo": metodo,
+            "ruta": ruta,
+            "bytes": os.path.getsize(os.path.join(PERFILES_DIR, nombre)),
+            "archivo": nombre,
+        })
+    return perfiles
+
+
+def leer_perfil(perfil_id: str) -> Optional[str]:
+    """Contenido del perfil en pilas colapsadas, o None si no existe"""
+    if not re.fullmatch(r"[0-9a-f]{12}", perfil_id) or not os.path.isdir(PERFILES_DIR):
+        return None
+    for nombre in os.listdir(PERFILES_DIR):
+        if nombre.endswith(f"-{perfil_id}{EXTENSION}"):
+            with open(os.path.join(PERFILES_DIR, nombre), encoding="utf-8") as archivo:
+                return archivo.read()
+    return None
+
+
+# ============= MIDDLEWARE =============
+
+def _pide_perfil(scope) -> bool:
+    perfil = token = None
+    for nombre, valor in scope["headers"]:
+        if nombre == b"x-profile":
+            perfil = valor
+        elif nombre == b"x-admin-token":
+            token = valor.decode("latin-1")
+    return perfil == b"1" and token_admin_valido(token)
+
+
+class PerfiladoMiddleware:
+    """
+    Middleware ASGI que perfila la petición. Va lo más adentro posible para
+    que su frame quede en la pila aunque la petición se ejecute en una tarea
+    aparte (modo degradado, coalescencia).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or (PERFIL_MUESTREO <= 0 and not ADMIN_TOKEN)
+            or not (_pide_perfil(scope) or (PERFIL_MUESTREO > 0 and random.random() < PERFIL_MUESTREO))
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        perfil = PerfilPeticion(sys._getframe())
+
+        async def enviar(message):
+            if message["type"] == "http.response.start":
+                message = {
+                    **message,
+                    "headers": list(message.get("headers", [])) + [(b"x-profile-id", perfil.id.encode())],
+                }
+            await send(message)
+
+        muestreador.agregar(perfil)
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            muestreador.quitar(perfil)
+            ruta = plantilla_ruta(scope) or scope["path"]
+            await asyncio.to_thread(_guardar, perfil, scope["method"], ruta)
@@ -0,0 +1,173 @@
+"""
+Plazo por petición, propagado a MongoDB.
+
+Cada petición recibe un plazo: el de su ruta (PLAZO_RUTAS, prefijo=segundos)
+o PLAZO_DEFECTO, y el cliente puede pedir otro con el header X-Request-Timeout
+(segundos, entre PLAZO_MINIMO y PLAZO_MAXIMO). El middleware:
+
+- abre un `pymongo.timeout()` con el plazo: el driver convierte lo que queda
+  en maxTimeMS y en timeouts de socket y de selección de servidor para cada
+  operación de la petición (Motor propaga el contexto a sus hilos);
+- cancela la petición al vencer el plazo, para que no siga ocupando
+  conexiones del pool, y responde 504 si aún no empezó la respuesta.
+
+`leer_con_reintentos` reintenta lecturas idempotentes ante errores
+transitorios, con espera exponencial aleatoria, solo mientras queda plazo.
+Las tareas compartidas que nacen de una petición (reconstrucción del menú) se
+crean con `tarea_sin_plazo`: no deben heredar el plazo de quien las programó.
+"""
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import random
+import time
+from typing import Awaitable, Callable, Coroutine, Optional, TypeVar
+
+import pymongo
+from pymongo.errors import AutoReconnect, ConnectionFailure, PyMongoError
+
+from core.metricas import plantilla_ruta, registro
+
+logger = logging.getLogger("freshbowl.plazos")
+
+PLAZO_DEFECTO = float(os.getenv("PLAZO_DEFECTO", "10"))
+# Límites del plazo pedido por header: uno muy corto haría fallar consultas
+# sanas y, con ellas, abriría el circuit breaker
+PLAZO_MINIMO = float(os.getenv("PLAZO_MINIMO", "1"))
+PLAZO_MAXIMO = float(os.getenv("PLAZO_MAXIMO", "60"))
+PLAZO_RUTAS = {
+    prefijo.strip(): float(segundos)
+    for prefijo, segundos in (
+        regla.split("=", 1)
+        for regla in os.getenv("PLAZO_RUTAS", "/api/menu=3,/api/sync=5,/api/admin=60").split(",")
+        if "=" in regla
+    )
+}
+PLAZO_REINTENTOS = int(os.getenv("PLAZO_REINTENTOS", "3"))
+PLAZO_ESPERA_BASE = float(os.getenv("PLAZO_ESPERA_BASE", "0.05"))
+HEADER_PLAZO = b"x-request-timeout"
+
+T = TypeVar("T")
+
+_limite: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("plazo_limite", default=None)
+
+plazos_vencidos = registro.contador(
+    "freshbowl_http_deadline_exceeded_total", "Peticiones canceladas por superar su plazo", ("route",))
+reintentos_lectura = registro.contador(
+    "freshbowl_mongo_read_retries_total", "Reintentos de lecturas idempotentes", ("outcome",))
+
+
+def plazo_ruta(path: str) -> float:
+    """Plazo configurado para la ruta (gana el prefijo más largo)"""
+    mejor, plazo = "", PLAZO_DEFECTO
+    for prefijo, segundos in PLAZO_RUTAS.items():
+        if path.startswith(prefijo) and len(prefijo) > len(mejor):
+            mejor, plazo = prefijo, segundos
+    return plazo
+
+
+def restante() -> Optional[float]:
+    """Segundos que le quedan a la petición en curso (None fuera de una petición)"""
+    limite = _limite.get()
+    return None if limite is None else limite - time.monotonic()
+
+
+def tarea_sin_plazo(coro: Coroutine, *conservar: contextvars.ContextVar) -> asyncio.Task:
+    """Crear una tarea con un contexto nuevo (sin plazo ni pymongo.timeout), copiando solo `conservar`"""
+    valores = [(variable, variable.get(None)) for variable in conservar]
+
+    def crear():
+        for variable, valor in valores:
+            variable.set(valor)
+        return asyncio.ensure_future(coro)
+
+    return contextvars.Context().run(crear)
+
+
+def _transitorio(exc: Exception) -> bool:
+    if isinstance(exc, PyMongoError) and exc.timeout:
+        # Se agotó el plazo: reintentar no tiene sentido
+        return False
+    return isinstance(exc, (AutoReconnect, ConnectionFailure)) or (
+        isinstance(exc, PyMongoError) and exc.has_error_label("RetryableError")
+    )
+
+
+async def leer_con_reintentos(operacion: Callable[[], Awaitable[T]]) -> T:
+    """Ejecutar una lectura idempotente, reintentando errores transitorios dentro del plazo"""
+    intento = 0
+    while True:
+        try:
+            return await operacion()
+        except Exception as exc:
+            intento += 1
+            if intento > PLAZO_REINTENTOS or not _transitorio(exc):
+                raise
+            # Backoff exponencial con jitter completo
+            espera = random.uniform(0, PLAZO_ESPERA_BASE * 2 ** (intento - 1))
+            queda = restante()
+            if queda is not None and queda <= espera:
+                reintentos_lectura.inc(("sin_plazo",))
+                raise
+            reintentos_lectura.inc(("reintento",))
+            logger.info("Lectura fallida (%s), reintento %d en %.0f ms", exc, intento, espera * 1000)
+            await asyncio.sleep(espera)
+
+
+def _plazo_pedido(scope) -> float:
+    plazo = plazo_ruta(scope["path"])
+    for nombre, valor in scope.get("headers", []):
+        if nombre == HEADER_PLAZO:
+            try:
+                pedido = float(valor.decode("latin-1"))
+            except ValueError:
+                break
+            if pedido > 0:
+                plazo = min(max(pedido, PLAZO_MINIMO), PLAZO_MAXIMO)
+            break
+    return plazo
+
+
+class PlazosMiddleware:
+    """Middleware ASGI que impone el plazo de cada petición"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        plazo = _plazo_pedido(scope)
+        iniciada = False
+
+        async def enviar(message):
+            nonlocal iniciada
+            if message["type"] == "http.response.start":
+                iniciada = True
+            await send(message)
+
+        token = _limite.set(time.monotonic() + plazo)
+        try:
+            with pymongo.timeout(plazo):
+                await asyncio.wait_for(self.app(scope, receive, enviar), plazo)
+        except (asyncio.TimeoutError, PyMongoError) as exc:
+            if isinstance(exc, PyMongoError) and not exc.timeout:
+                raise
+            plazos_vencidos.inc((plantilla_ruta(scope) or "sin_ruta",))
+            if iniciada:
+                raise
+            await send({
+                "type": "http.response.start",
+                "status": 504,
+                "headers": [(b"content-type", b"application/json")],
+            })
+            await send({
+                "type": "http.response.body",
+                "body": json.dumps({"detail": f"La petición superó su plazo de {plazo:g} s"}).encode(),
+            })
+        finally:
+            _limite.reset(token)
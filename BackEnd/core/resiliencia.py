@@ -0,0 +1,97 @@
+"""
+Circuit breaker para MongoDB.
+
+Se alimenta desde un CommandListener de pymongo (fallos por timeout o de red)
+y desde las lecturas que exceden su plazo. Con el circuito abierto,
+database.get_collection falla de inmediato con MongoNoDisponible en lugar de
+esperar al timeout del driver. Pasado el enfriamiento queda semiabierto: se
+deja pasar tráfico y el primer resultado decide si se cierra o se vuelve a abrir.
+"""
+import os
+import time
+
+from pymongo import monitoring
+
+CB_UMBRAL = int(os.getenv("CB_UMBRAL", "5"))
+CB_ENFRIAMIENTO = float(os.getenv("CB_ENFRIAMIENTO", "10"))
+
+# Errores del driver que cuentan como fallo de disponibilidad
+ERRORES_DISPONIBILIDAD = {
+    "NetworkTimeout",
+    "AutoReconnect",
+    "ConnectionFailure",
+    "ServerSelectionTimeoutError",
+    "ExecutionTimeout",
+    "WaitQueueTimeoutError",
+}
+# MaxTimeMSExpired
+CODIGOS_TIMEOUT = {50}
+
+
+class MongoNoDisponible(Exception):
+    """El circuito está abierto: MongoDB se considera caído o saturado"""
+
+
+class CircuitBreaker:
+    CERRADO = "cerrado"
+    ABIERTO = "abierto"
+    SEMIABIERTO = "semiabierto"
+
+    def __init__(self, umbral: int = CB_UMBRAL, enfriamiento: float = CB_ENFRIAMIENTO):
+        self.umbral = umbral
+        self.enfriamiento = enfriamiento
+        self.estado = self.CERRADO
+        self.fallos_consecutivos = 0
+        self.abierto_desde = 0.0
+        self.aperturas = 0
+
+    def permite(self) -> bool:
+        """Indica si se puede intentar una operación contra MongoDB"""
+        if self.estado == self.ABIERTO:
+            if time.monotonic() - self.abierto_desde < self.enfriamiento:
+                return False
+            self.estado = self.SEMIABIERTO
+        return True
+
+    def registrar_exito(self):
+        self.fallos_consecutivos = 0
+        self.estado = self.CERRADO
+
+    def registrar_fallo(self):
+        self.fallos_consecutivos += 1
+        if self.estado == self.SEMIABIERTO or self.fallos_consecutivos >= self.umbral:
+            if self.estado != self.ABIERTO:
+                self.aperturas += 1
+            self.estado = self.ABIERTO
+            self.abierto_desde = time.monotonic()
+
+    def resumen(self) -> dict:
+        return {
+            "estado": self.estado,
+            "fallos_consecutivos": self.fallos_consecutivos,
+            "aperturas": self.aperturas,
+            "umbral": self.umbral,
+            "enfriamiento": self.enfriamiento,
+        }
+
+
+breaker_mongo = CircuitBreaker()
+
+
+class OyenteBreaker(monitoring.CommandListener):
+    """Alimenta el breaker con el resultado de cada comando (corre en hilos del driver)"""
+
+    def __init__(self, breaker: CircuitBreaker):
+        self.breaker = breaker
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        if self.breaker.fallos_consecutivos or self.breaker.estado != CircuitBreaker.CERRADO:
+            self.breaker.registrar_exito()
+
+    def failed(self, event):
+        failure = event.failure or {}
+        if failure.get("errtype") in ERRORES_DISPONIBILIDAD or failure.get("code") in CODIGOS_TIMEOUT:
+            self.breaker.registrar_fallo()
@@ -0,0 +1,189 @@
+"""
+Modo degradado stale-while-revalidate para las lecturas del catálogo.
+
+Se guarda la última respuesta 200 de cada GET (ruta + parámetros). Si MongoDB
+está caído (circuito abierto), la lectura tarda más que SWR_TIMEOUT o termina
+en 5xx, se sirve esa copia de inmediato con el header `X-Data-Stale: 1`,
+siempre que no sea más antigua que SWR_VENTANA. La consulta original sigue en
+segundo plano y, si termina bien, actualiza la copia.
+
+/api/menu no pasa por aquí: ya se sirve desde un snapshot en memoria y negocia
+la codificación (Accept-Encoding, If-None-Match), que la clave de la copia no
+distingue.
+
+Una lectura en curso solo se comparte entre peticiones de la misma versión del
+catálogo: una petición que llega después de una escritura no puede recibir el
+cuerpo de una consulta anterior bajo el ETag nuevo.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from core.catalogo import catalogo
+from core.coalescencia import clave_peticion
+from core.resiliencia import breaker_mongo
+
+logger = logging.getLogger("freshbowl.swr")
+
+PREFIJOS_SWR = (
+    "/api/productos",
+    "/api/categorias",
+    "/api/ingredientes",
+)
+
+# Segundos que se espera a la lectura antes de servir la copia guardada
+SWR_TIMEOUT = float(os.getenv("SWR_TIMEOUT", "2"))
+# Antigüedad máxima (segundos) de una copia para poder servirla
+SWR_VENTANA = float(os.getenv("SWR_VENTANA", "300"))
+SWR_MAX_ENTRADAS = int(os.getenv("SWR_MAX_ENTRADAS", "500"))
+
+
+class Copia:
+    __slots__ = ("inicio", "cuerpo", "valor", "guardada_en")
+
+    def __init__(self, inicio: dict, cuerpo: bytes, valor: int):
+        self.inicio = inicio
+        self.cuerpo = cuerpo
+        # Valor local del catálogo cuando empezó la consulta que la produjo
+        self.valor = valor
+        self.guardada_en = time.monotonic()
+
+    def edad(self) -> float:
+        return time.monotonic() - self.guardada_en
+
+
+class EstadisticasSWR:
+    def __init__(self):
+        self.servidas_stale = 0
+        self.timeouts = 0
+        self.errores = 0
+
+    def resumen(self) -> dict:
+        return {
+            "servidas_stale": self.servidas_stale,
+            "timeouts": self.timeouts,
+            "errores": self.errores,
+            "breaker": breaker_mongo.resumen(),
+        }
+
+
+estadisticas_swr = EstadisticasSWR()
+
+
+class UltimoValidoMiddleware:
+    """Middleware ASGI que sirve la última copia válida cuando MongoDB falla"""
+
+    def __init__(self, app, prefijos=PREFIJOS_SWR):
+        self.app = app
+        self.prefijos = tuple(prefijos)
+        self._copias: "OrderedDict[str, Copia]" = OrderedDict()
+        self._refrescando: Dict[str, asyncio.Task] = {}
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "GET"
+            or not scope["path"].startswith(self.prefijos)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        clave = clave_peticion(scope)
+        copia = self._copia_vigente(clave)
+
+        # Circuito abierto: no se intenta la consulta en esta petición
+        if copia is not None and not breaker_mongo.permite():
+            await self._servir_copia(send, copia)
+            return
+
+        # La lectura en curso se comparte solo dentro de la misma versión
+        en_curso = f"{catalogo.etag()} {clave}"
+        tarea = self._refrescando.get(en_curso)
+        if tarea is None:
+            tarea = asyncio.create_task(self._ejecutar(scope, receive, clave, catalogo.valor))
+            self._refrescando[en_curso] = tarea
+            tarea.add_done_callback(lambda t: self._terminar_refresco(en_curso, t))
+
+        if copia is None:
+            # Sin copia no hay modo degradado: se espera y se propagan los errores
+            inicio, cuerpo = await asyncio.shield(tarea)
+        else:
+            try:
+                inicio, cuerpo = await asyncio.wait_for(asyncio.shield(tarea), SWR_TIMEOUT)
+            except asyncio.TimeoutError:
+                # La consulta sigue en segundo plano y actualizará la copia
+                estadisticas_swr.timeouts += 1
+                breaker_mongo.registrar_fallo()
+                await self._servir_copia(send, copia)
+                return
+            except Exception:
+                await self._servir_copia(send, copia)
+                return
+            if inicio["status"] >= 500:
+                await self._servir_copia(send, copia)
+                return
+
+        # Copia del mensaje: la tarea es compartida y los middlewares de afuera
+        # (CORS) modifican los headers en el lugar
+        await send({**inicio, "headers": list(inicio["headers"])})
+        await send({"type": "http.response.body", "body": cuerpo})
+
+    def _copia_vigente(self, clave: str) -> Optional[Copia]:
+        copia = self._copias.get(clave)
+        if copia is None:
+            return None
+        if copia.edad() > SWR_VENTANA:
+            del self._copias[clave]
+            return None
+        return copia
+
+    def _terminar_refresco(self, clave: str, tarea: asyncio.Task):
+        self._refrescando.pop(clave, None)
+        if not tarea.cancelled() and tarea.exception() is not None:
+            estadisticas_swr.errores += 1
+            logger.warning("Lectura fallida en %s: %s", clave, tarea.exception())
+
+    async def _ejecutar(self, scope, receive, clave: str, valor: int):
+        inicio = None
+        partes = []
+
+        async def capturar(message):
+            nonlocal inicio
+            if message["type"] == "http.response.start":
+                inicio = message
+            elif message["type"] == "http.response.body":
+                partes.append(message.get("body", b""))
+
+        await self.app(scope, receive, capturar)
+
+        cuerpo = b"".join(partes)
+        if inicio["status"] == 200:
+            if breaker_mongo.estado != breaker_mongo.CERRADO:
+                breaker_mongo.registrar_exito()
+            anterior = self._copias.get(clave)
+            # Una consulta más vieja que termina tarde no pisa una copia más nueva
+            if anterior is None or anterior.valor <= valor:
+                self._copias[clave] = Copia({**inicio, "headers": list(inicio["headers"])}, cuerpo, valor)
+                self._copias.move_to_end(clave)
+            while len(self._copias) > SWR_MAX_ENTRADAS:
+                self._copias.popitem(last=False)
+        elif inicio["status"] >= 500:
+            estadisticas_swr.errores += 1
+        return inicio, cuerpo
+
+    async def _servir_copia(self, send, copia: Copia):
+        estadisticas_swr.servidas_stale += 1
+        headers = [
+            (nombre, valor) for nombre, valor in copia.inicio["headers"]
+            if nombre.lower() not in (b"etag", b"cache-control")
+        ]
+        headers += [
+            (b"x-data-stale", b"1"),
+            (b"age", str(int(copia.edad())).encode()),
+            (b"cache-control", b"no-store"),
+        ]
+        await send({**copia.inicio, "headers": headers})
+        await send({"type": "http.response.body", "body": copia.cuerpo})
@@ -0,0 +1,303 @@
+"""
+Trazas distribuidas (spans) con propagación W3C `traceparent`.
+
+Cada petición HTTP muestreada abre un span de servidor; los comandos de
+MongoDB, el hash de contraseñas y el trabajo en segundo plano que la petición
+dispara quedan como spans hijos. El contexto viaja en un ContextVar, así que
+se hereda en las tareas de asyncio y en los hilos del executor de Motor
+(que copia el contexto al ejecutar cada operación).
+
+Los spans terminados se acumulan en una cola y se exportan por lotes en
+formato OTLP/JSON: a un archivo NDJSON (TRAZAS_ARCHIVO) o, si se configura
+TRAZAS_OTLP_URL, a un collector HTTP (/v1/traces).
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import time
+import urllib.request
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from pymongo import monitoring
+
+from core.metricas import plantilla_ruta
+
+logger = logging.getLogger("freshbowl.trazas")
+
+# Fracción de peticiones muestreadas (0 = trazas desactivadas, por defecto: sin
+# TRAZAS_OTLP_URL el archivo crece sin límite). Si el cliente envía un
+# traceparent, se respeta su decisión de muestreo.
+TRAZAS_MUESTREO = float(os.getenv("TRAZAS_MUESTREO", "0"))
+TRAZAS_ARCHIVO = os.getenv("TRAZAS_ARCHIVO", "trazas.ndjson")
+TRAZAS_OTLP_URL = os.getenv("TRAZAS_OTLP_URL", "")
+TRAZAS_LOTE = int(os.getenv("TRAZAS_LOTE", "512"))
+TRAZAS_INTERVALO = float(os.getenv("TRAZAS_INTERVALO", "5"))
+TRAZAS_MAX_COLA = int(os.getenv("TRAZAS_MAX_COLA", "20000"))
+
+SERVICIO = "freshbowl-api"
+
+# Tipos de span de OTLP
+INTERNO, SERVIDOR, CLIENTE = 1, 2, 3
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "nombre", "tipo", "inicio", "fin", "atributos", "error")
+
+    def __init__(self, nombre: str, trace_id: str, parent_id: Optional[str] = None, tipo: int = INTERNO):
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.nombre = nombre
+        self.tipo = tipo
+        self.inicio = time.time_ns()
+        self.fin = 0
+        self.atributos: Dict[str, object] = {}
+        self.error: Optional[str] = None
+
+    def hijo(self, nombre: str, tipo: int = INTERNO) -> "Span":
+        return Span(nombre, self.trace_id, self.span_id, tipo)
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def terminar(self, fin: Optional[int] = None):
+        self.fin = fin or time.time_ns()
+        exportador.agregar(self)
+
+    def a_otlp(self) -> dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.nombre,
+            "kind": self.tipo,
+            "startTimeUnixNano": str(self.inicio),
+            "endTimeUnixNano": str(self.fin),
+            "attributes": [_atributo_otlp(clave, valor) for clave, valor in self.atributos.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def _atributo_otlp(clave: str, valor) -> dict:
+    if isinstance(valor, bool):
+        return {"key": clave, "value": {"boolValue": valor}}
+    if isinstance(valor, int):
+        return {"key": clave, "value": {"intValue": str(valor)}}
+    if isinstance(valor, float):
+        return {"key": clave, "value": {"doubleValue": valor}}
+    return {"key": clave, "value": {"stringValue": str(valor)}}
+
+
+# Span activo de la tarea/hilo actual (None = sin traza o no muestreada)
+span_actual: ContextVar[Optional[Span]] = ContextVar("span_actual", default=None)
+
+
+@contextmanager
+def trazar(nombre: str, **atributos):
+    """Abrir un span hijo del span activo; no hace nada si no hay traza"""
+    padre = span_actual.get()
+    if padre is None:
+        yield None
+        return
+    span = padre.hijo(nombre)
+    span.atributos.update(atributos)
+    token = span_actual.set(span)
+    try:
+        yield span
+    except BaseException as exc:
+        span.error = f"{type(exc).__name__}: {exc}"
+        raise
+    finally:
+        span_actual.reset(token)
+        span.terminar()
+
+
+def muestrear(trace_id: str) -> bool:
+    # Decisión determinística por trace_id: todos los procesos coinciden
+    return int(trace_id[16:], 16) < TRAZAS_MUESTREO * (1 << 64)
+
+
+# ============= EXPORTADOR =============
+
+class ExportadorTrazas:
+    """Cola de spans terminados que se escribe por lotes en segundo plano"""
+
+    def __init__(self):
+        # deque.append es seguro entre hilos; maxlen descarta lo más antiguo si se satura
+        self._cola: deque = deque(maxlen=TRAZAS_MAX_COLA)
+        self._tarea: Optional[asyncio.Task] = None
+        self.exportados = 0
+        self.errores = 0
+
+    def agregar(self, span: Span):
+        self._cola.append(span)
+
+    def _lote(self) -> list:
+        spans = []
+        while self._cola and len(spans) < TRAZAS_LOTE:
+            spans.append(self._cola.popleft())
+        return spans
+
+    @staticmethod
+    def _documento(spans: list) -> dict:
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [_atributo_otlp("service.name", SERVICIO)]},
+                "scopeSpans": [{
+                    "scope": {"name": "freshbowl.trazas"},
+                    "spans": [span.a_otlp() for span in spans],
+                }],
+            }]
+        }
+
+    @staticmethod
+    def _escribir(documento: dict):
+        cuerpo = json.dumps(documento, separators=(",", ":"))
+        if TRAZAS_OTLP_URL:
+            peticion = urllib.request.Request(
+                TRAZAS_OTLP_URL, data=cuerpo.encode(), headers={"Content-Type": "application/json"}
+            )
+            urllib.request.urlopen(peticion, timeout=5).close()
+        else:
+            with open(TRAZAS_ARCHIVO, "a", encoding="utf-8") as archivo:
+                archivo.write(cuerpo + "\n")
+
+    async def exportar(self) -> int:
+        total = 0
+        while self._cola:
+            spans = self._lote()
+            try:
+                # E/S fuera del event loop
+                await asyncio.to_thread(self._escribir, self._documento(spans))
+            except Exception as exc:
+                self.errores += 1
+                logger.warning("No se pudieron exportar %s spans: %s", len(spans), exc)
+                return total
+            total += len(spans)
+        self.exportados += total
+        return total
+
+    async def _exportar_periodicamente(self):
+        while True:
+            await asyncio.sleep(TRAZAS_INTERVALO)
+            await self.exportar()
+
+    def iniciar(self):
+        if TRAZAS_MUESTREO > 0:
+            self._tarea = asyncio.create_task(self._exportar_periodicamente())
+
+    async def detener(self):
+        if self._tarea is not None:
+            self._tarea.cancel()
+            self._tarea = None
+        await self.exportar()
+
+
+exportador = ExportadorTrazas()
+
+
+# ============= HTTP =============
+
+class TrazasMiddleware:
+    """Middleware ASGI: span de servidor por petición y propagación de traceparent"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or TRAZAS_MUESTREO <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        trace_id = parent_id = None
+        muestreada = False
+        for nombre, valor in scope["headers"]:
+            if nombre == b"traceparent":
+                coincidencia = _TRACEPARENT.match(valor.decode("latin-1").strip().lower())
+                if coincidencia:
+                    trace_id, parent_id, flags = coincidencia.groups()
+                    muestreada = int(flags, 16) & 1 == 1
+                break
+        if trace_id is None:
+            trace_id = f"{random.getrandbits(128):032x}"
+            muestreada = muestrear(trace_id)
+
+        if not muestreada:
+            await self.app(scope, receive, send)
+            return
+
+        span = Span(scope["method"], trace_id, parent_id, SERVIDOR)
+        span.atributos["http.method"] = scope["method"]
+        span.atributos["http.target"] = scope["path"]
+        token = span_actual.set(span)
+
+        async def enviar(message):
+            if message["type"] == "http.response.start":
+                span.atributos["http.status_code"] = message["status"]
+                if message["status"] >= 500:
+                    span.error = f"HTTP {message['status']}"
+                message = {
+                    **message,
+                    "headers": list(message.get("headers", [])) + [(b"traceparent", span.traceparent().encode())],
+                }
+            await send(message)
+
+        try:
+            await self.app(scope, receive, enviar)
+        except BaseException as exc:
+            span.error = f"{type(exc).__name__}: {exc}"
+            raise
+        finally:
+            span_actual.reset(token)
+            ruta = plantilla_ruta(scope)
+            if ruta:
+                span.atributos["http.route"] = ruta
+                span.nombre = f"{scope['method']} {ruta}"
+            span.terminar()
+
+
+# ============= MONGODB =============
+
+class OyenteTrazas(monitoring.CommandListener):
+    """Span hijo por cada comando de MongoDB (corre en hilos del driver)"""
+
+    def __init__(self):
+        self._spans: Dict[tuple, Span] = {}
+
+    def started(self, event):
+        padre = span_actual.get()
+        if padre is None:
+            return
+        span = padre.hijo(f"mongodb.{event.command_name}", CLIENTE)
+        coleccion = event.command.get(event.command_name)
+        span.atributos["db.system"] = "mongodb"
+        span.atributos["db.name"] = event.database_name
+        span.atributos["db.operation"] = event.command_name
+        if isinstance(coleccion, str):
+            span.atributos["db.mongodb.collection"] = coleccion
+        self._spans[(event.request_id, event.connection_id)] = span
+
+    def _terminar(self, event, error: Optional[str] = None):
+        span = self._spans.pop((event.request_id, event.connection_id), None)
+        if span is None:
+            return
+        span.error = error
+        span.fin = span.inicio + event.duration_micros * 1000
+        exportador.agregar(span)
+
+    def succeeded(self, event):
+        self._terminar(event)
+
+    def failed(self, event):
+        failure = event.failure or {}
+        self._terminar(event, failure.get("errmsg") or failure.get("errtype") or "error")
@@ -0,0 +1,332 @@
+"""
+Ingesta asíncrona de webhooks de las pasarelas de pago.
+
+La pasarela (webpay, mercadopago: `PagoBase.pasarela`) envía cada cambio de
+estado firmado con HMAC-SHA256 en el header X-Webhook-Signature
+(`t=<unix>,v1=<hex>`, firma de `"<t>.<cuerpo>"` con el secreto de la pasarela
+en WEBHOOK_SECRETOS). El endpoint solo verifica la firma, guarda el evento
+crudo en la bandeja (`webhook_eventos`, _id = pasarela:id del evento, así los
+reenvíos de la pasarela son duplicados) y responde 200.
+
+Un pool de WEBHOOK_WORKERS tareas procesa la bandeja. Los eventos se reparten
+por hash de `pedido_id`, así que los de un mismo pedido se aplican en el orden
+en que llegaron. Las transiciones son idempotentes: el pago solo cambia desde
+los estados de origen permitidos y si el evento no es anterior al último
+aplicado (`ultimo_evento_en`), de modo que un reenvío o un evento atrasado
+procesado por otro worker del lanzador no hace nada.
+
+Cada evento se toma con un arriendo (`tomado_hasta`) antes de procesarlo. Si
+falla, el worker lo reintenta en el lugar (con espera creciente y renovando el
+arriendo) antes de pasar al siguiente, así que un evento posterior del mismo
+pedido nunca se adelanta. Un evento que tiene otro anterior del mismo pedido aún
+pendiente (p. ej. arrendado por un proceso que murió) se pospone. Un barrido
+periódico recoge los que quedaron pendientes: los que no cupieron en la cola,
+los de un proceso que murió y los pospuestos.
+"""
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import os
+import time
+import zlib
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+from core.metricas import registro
+from core.resiliencia import MongoNoDisponible
+from database import get_collection, invalidar_cache
+
+logger = logging.getLogger("freshbowl.webhooks")
+
+# pasarela=secreto, separados por coma. Sin secreto la pasarela no acepta webhooks
+WEBHOOK_SECRETOS = {
+    pasarela.strip(): secreto.strip()
+    for pasarela, secreto in (
+        par.split("=", 1) for par in os.getenv("WEBHOOK_SECRETOS", "").split(",") if "=" in par
+    )
+}
+# Antigüedad máxima de la firma (protege contra reenvíos de un tercero)
+WEBHOOK_TOLERANCIA = int(os.getenv("WEBHOOK_TOLERANCIA", "300"))
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "4"))
+WEBHOOK_COLA_MAX = int(os.getenv("WEBHOOK_COLA_MAX", "1000"))
+WEBHOOK_BARRIDO = float(os.getenv("WEBHOOK_BARRIDO", "10"))
+WEBHOOK_ARRIENDO = float(os.getenv("WEBHOOK_ARRIENDO", "30"))
+WEBHOOK_MAX_INTENTOS = int(os.getenv("WEBHOOK_MAX_INTENTOS", "5"))
+WEBHOOK_REINTENTO_BASE = float(os.getenv("WEBHOOK_REINTENTO_BASE", "0.5"))
+# Los eventos procesados se borran pasado este tiempo (índice TTL)
+WEBHOOK_RETENCION = int(os.getenv("WEBHOOK_RETENCION", str(7 * 24 * 3600)))
+
+HEADER_FIRMA = "x-webhook-signature"
+COLECCION = "webhook_eventos"
+
+# tipo de evento -> (estado del pago, estados de origen, estado del pedido, estados de origen del pedido)
+TRANSICIONES: Dict[str, Tuple[str, Tuple[str, ...], Optional[str], Tuple[str, ...]]] = {
+    "pago.aprobado": ("aprobado", ("pendiente", "rechazado"), "confirmado", ("pendiente",)),
+    "pago.rechazado": ("rechazado", ("pendiente",), None, ()),
+    "pago.reembolsado": ("reembolsado", ("aprobado",), "cancelado", ("pendiente", "confirmado", "preparando")),
+}
+
+webhooks_recibidos = registro.contador(
+    "freshbowl_webhook_received_total", "Webhooks recibidos por pasarela y resultado", ("gateway", "outcome"))
+webhooks_procesados = registro.contador(
+    "freshbowl_webhook_processed_total", "Eventos de la bandeja procesados por tipo y resultado", ("type", "outcome"))
+webhooks_demora = registro.histograma(
+    "freshbowl_webhook_processing_lag_seconds", "Tiempo entre la recepción y la aplicación del evento", ("type",))
+webhooks_cola = registro.gauge(
+    "freshbowl_webhook_queue_depth", "Eventos en las colas de los workers")
+
+
+class EventoInvalido(ValueError):
+    pass
+
+
+# ============= FIRMA =============
+
+def firmar(secreto: str, cuerpo: bytes, marca: Optional[int] = None) -> str:
+    """Valor del header X-Webhook-Signature para un cuerpo"""
+    marca = int(time.time()) if marca is None else marca
+    firma = hmac.new(secreto.encode(), f"{marca}.".encode() + cuerpo, hashlib.sha256).hexdigest()
+    return f"t={marca},v1={firma}"
+
+
+def firma_valida(pasarela: str, cuerpo: bytes, header: Optional[str]) -> bool:
+    secreto = WEBHOOK_SECRETOS.get(pasarela)
+    if not secreto or not header:
+        return False
+    partes = dict(parte.split("=", 1) for parte in header.split(",") if "=" in parte)
+    try:
+        marca = int(partes.get("t", ""))
+    except ValueError:
+        return False
+    if abs(time.time() - marca) > WEBHOOK_TOLERANCIA:
+        return False
+    esperada = firmar(secreto, cuerpo, marca).split("v1=", 1)[1]
+    return hmac.compare_digest(esperada, partes.get("v1", ""))
+
+
+# ============= RECEPCIÓN =============
+
+def leer_evento(pasarela: str, cuerpo: bytes) -> dict:
+    """Documento de la bandeja para un webhook ya verificado"""
+    try:
+        payload = json.loads(cuerpo)
+    except ValueError:
+        raise EventoInvalido("El cuerpo no es JSON")
+    if not isinstance(payload, dict):
+        raise EventoInvalido("El cuerpo debe ser un objeto")
+    faltantes = [campo for campo in ("id", "tipo", "pedido_id") if not payload.get(campo)]
+    if faltantes:
+        raise EventoInvalido(f"Faltan campos: {', '.join(faltantes)}")
+    if payload["tipo"] not in TRANSICIONES:
+        raise EventoInvalido(f"Tipo de evento desconocido: {payload['tipo']}")
+    ahora = datetime.utcnow()
+    creado = payload.get("creado")
+    return {
+        "_id": f"{pasarela}:{payload['id']}",
+        "pasarela": pasarela,
+        "tipo": payload["tipo"],
+        "pedido_id": str(payload["pedido_id"]),
+        "pago_id": payload.get("pago_id"),
+        # Momento del cambio según la pasarela: ordena eventos que llegan desordenados
+        "ocurrido_en": datetime.utcfromtimestamp(creado) if isinstance(creado, (int, float)) else ahora,
+        "payload": payload,
+        "estado": "pendiente",
+        "intentos": 0,
+        "recibido_en": ahora,
+    }
+
+
+# ============= PROCESAMIENTO =============
+
+async def aplicar_evento(evento: dict) -> str:
+    """Aplicar las transiciones del evento; devuelve 'aplicado' o 'sin_cambio'"""
+    estado_pago, origenes_pago, estado_pedido, origenes_pedido = TRANSICIONES[evento["tipo"]]
+    base = {"pedido_id": evento["pedido_id"], "pasarela": evento["pasarela"]}
+    if evento.get("pago_id") and ObjectId.is_valid(evento["pago_id"]):
+        base = {"_id": ObjectId(evento["pago_id"])}
+    pagos = get_collection("pagos")
+    pago = await pagos.find_one_and_update(
+        {
+            **base,
+            "estado": {"$in": list(origenes_pago)},
+            "$or": [{"ultimo_evento_en": {"$exists": False}}, {"ultimo_evento_en": {"$lte": evento["ocurrido_en"]}}],
+        },
+        {"$set": {"estado": estado_pago, "ultimo_evento_en": evento["ocurrido_en"], "ultimo_evento_id": evento["_id"]}},
+        return_document=ReturnDocument.AFTER,
+    )
+    aplicado = pago is not None
+    if aplicado:
+        invalidar_cache("pagos", pago["_id"])
+    elif await pagos.find_one({**base, "ultimo_evento_id": evento["_id"]}, {"_id": 1}) is None:
+        return "sin_cambio"
+    # Si el pago ya tiene este evento, un intento anterior se cortó antes de
+    # actualizar el pedido: se completa ahora
+
+    if estado_pedido and ObjectId.is_valid(evento["pedido_id"]):
+        resultado = await get_collection("pedidos").update_one(
+            {"_id": ObjectId(evento["pedido_id"]), "estado": {"$in": list(origenes_pedido)}},
+            {"$set": {"estado": estado_pedido}},
+        )
+        if resultado.modified_count:
+            aplicado = True
+            invalidar_cache("pedidos", evento["pedido_id"])
+    return "aplicado" if aplicado else "sin_cambio"
+
+
+class BandejaWebhooks:
+    def __init__(self):
+        self._colas: List[asyncio.Queue] = []
+        self._tareas: List[asyncio.Task] = []
+        # Eventos ya encolados en este proceso (evita que el barrido los duplique)
+        self._encolados: set = set()
+
+    def encolar(self, evento: dict) -> bool:
+        """Pasar el evento al worker de su pedido; False si la cola está llena (lo tomará el barrido)"""
+        if not self._colas or evento["_id"] in self._encolados:
+            return False
+        cola = self._colas[zlib.crc32(evento["pedido_id"].encode()) % len(self._colas)]
+        if cola.qsize() >= WEBHOOK_COLA_MAX:
+            return False
+        self._encolados.add(evento["_id"])
+        cola.put_nowait(evento)
+        webhooks_cola.sumar((), 1)
+        return True
+
+    async def recibir(self, evento: dict) -> bool:
+        """Guardar el evento en la bandeja; False si ya estaba (reenvío de la pasarela)"""
+        try:
+            await get_collection(COLECCION).insert_one(evento)
+        except DuplicateKeyError:
+            webhooks_recibidos.inc((evento["pasarela"], "duplicado"))
+            return False
+        webhooks_recibidos.inc((evento["pasarela"], "recibido"))
+        self.encolar(evento)
+        return True
+
+    async def _tomar(self, evento_id: str) -> Optional[dict]:
+        """Tomar el evento con un arriendo; None si ya lo procesó o lo tiene otro worker"""
+        ahora = datetime.utcnow()
+        return await get_collection(COLECCION).find_one_and_update(
+            {
+                "_id": evento_id,
+                "estado": "pendiente",
+                "$or": [{"tomado_hasta": {"$exists": False}}, {"tomado_hasta": {"$lt": ahora}}],
+            },
+            {"$set": {"tomado_hasta": ahora + timedelta(seconds=WEBHOOK_ARRIENDO)}, "$inc": {"intentos": 1}},
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def _hay_anterior(self, evento: dict) -> bool:
+        """¿Queda un evento del mismo pedido recibido antes y aún pendiente?"""
+        anterior = await get_collection(COLECCION).find_one(
+            {
+                "pedido_id": evento["pedido_id"],
+                "estado": "pendiente",
+                "recibido_en": {"$lt": evento["recibido_en"]},
+                "_id": {"$ne": evento["_id"]},
+            },
+            {"_id": 1},
+        )
+        return anterior is not None
+
+    async def _procesar(self, evento_id: str):
+        coleccion = get_collection(COLECCION)
+        evento = await self._tomar(evento_id)
+        if evento is None:
+            return
+        if await self._hay_anterior(evento):
+            # No se adelanta a un evento anterior del pedido: lo retoma el barrido
+            webhooks_procesados.inc((evento["tipo"], "pospuesto"))
+            await coleccion.update_one(
+                {"_id": evento_id}, {"$unset": {"tomado_hasta": ""}, "$inc": {"intentos": -1}}
+            )
+            return
+        while True:
+            try:
+                resultado = await aplicar_evento(evento)
+                break
+            except (PyMongoError, MongoNoDisponible) as exc:
+                fallido = evento["intentos"] >= WEBHOOK_MAX_INTENTOS
+                webhooks_procesados.inc((evento["tipo"], "fallido" if fallido else "error"))
+                logger.warning("Error procesando el webhook %s (intento %d): %s", evento_id, evento["intentos"], exc)
+                if fallido:
+                    await coleccion.update_one(
+                        {"_id": evento_id}, {"$set": {"estado": "fallido", "ultimo_error": str(exc)}}
+                    )
+                    return
+                error = str(exc)
+            # Se reintenta aquí, antes del siguiente evento del pedido, renovando el arriendo
+            await asyncio.sleep(WEBHOOK_REINTENTO_BASE * 2 ** (evento["intentos"] - 1))
+            evento["intentos"] += 1
+            await coleccion.update_one(
+                {"_id": evento_id},
+                {"$set": {"ultimo_error": error,
+                          "tomado_hasta": datetime.utcnow() + timedelta(seconds=WEBHOOK_ARRIENDO)},
+                 "$inc": {"intentos": 1}},
+            )
+        ahora = datetime.utcnow()
+        await coleccion.update_one(
+            {"_id": evento_id},
+            {"$set": {"estado": "procesado", "resultado": resultado, "procesado_en": ahora},
+             "$unset": {"tomado_hasta": ""}},
+        )
+        webhooks_procesados.inc((evento["tipo"], resultado))
+        webhooks_demora.observar((evento["tipo"],), (ahora - evento["recibido_en"]).total_seconds())
+
+    async def _worker(self, cola: asyncio.Queue):
+        while True:
+            evento = await cola.get()
+            webhooks_cola.sumar((), -1)
+            try:
+                await self._procesar(evento["_id"])
+            except Exception:
+                logger.exception("Error inesperado procesando el webhook %s", evento["_id"])
+            finally:
+                self._encolados.discard(evento["_id"])
+
+    async def _barrer(self):
+        """Encolar los pendientes que nadie está procesando, en orden de llegada"""
+        ahora = datetime.utcnow()
+        pendientes = await get_collection(COLECCION).find(
+            {
+                "estado": "pendiente",
+                # Los recién llegados ya están en la cola de quien los recibió
+                "recibido_en": {"$lt": ahora - timedelta(seconds=WEBHOOK_BARRIDO)},
+                "$or": [{"tomado_hasta": {"$exists": False}}, {"tomado_hasta": {"$lt": ahora}}],
+            },
+            {"payload": 0},
+        ).sort("recibido_en", ASCENDING).limit(WEBHOOK_COLA_MAX).to_list(length=WEBHOOK_COLA_MAX)
+        for evento in pendientes:
+            self.encolar(evento)
+
+    async def _barrer_periodicamente(self):
+        while True:
+            try:
+                await self._barrer()
+            except (PyMongoError, MongoNoDisponible) as exc:
+                logger.warning("No se pudo barrer la bandeja de webhooks: %s", exc)
+            await asyncio.sleep(WEBHOOK_BARRIDO)
+
+    def iniciar(self):
+        self._colas = [asyncio.Queue() for _ in range(max(1, WEBHOOK_WORKERS))]
+        self._tareas = [asyncio.create_task(self._worker(cola)) for cola in self._colas]
+        self._tareas.append(asyncio.create_task(self._barrer_periodicamente()))
+
+    async def detener(self):
+        # Lo que quede en las colas sigue pendiente en la bandeja y lo toma el barrido
+        for tarea in self._tareas:
+            tarea.cancel()
+        await asyncio.gather(*self._tareas, return_exceptions=True)
+        pendientes = sum(cola.qsize() for cola in self._colas)
+        webhooks_cola.sumar((), -pendientes)
+        self._tareas, self._colas = [], []
+        self._encolados.clear()
+
+
+bandeja_webhooks = BandejaWebhooks()
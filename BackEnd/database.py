@@ -1,7 +1,17 @@
 from motor.motor_asyncio import AsyncIOMotorClient
-from typing import Optional
+from typing import Optional, Union
+from bson import ObjectId
 import os
 from dotenv import load_dotenv
+from core.almacen_memoria import ClienteMemoria
+from core.cache import CacheLRU
+from core.catalogo import catalogo
+from core.resiliencia import breaker_mongo, MongoNoDisponible, OyenteBreaker
+from core.metricas import OyenteComandos, OyentePool
+from core.lectura import OyenteMiembros, preferencia_actual
+from core.plazos import leer_con_reintentos
+from core.consultas_lentas import OyenteConsultasLentas
+from core.trazas import OyenteTrazas
 
 # Cargar variables de entorno
 load_dotenv()
@@ -15,13 +25,58 @@ db = Database()
 # Configuración de MongoDB
 MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
 DATABASE_NAME = os.getenv("DATABASE_NAME", "freshbowl")
+# "mongo" o "memoria" (sin servidor, para pruebas y para perfilar solo la aplicación)
+ALMACENAMIENTO = os.getenv("ALMACENAMIENTO", "mongo").lower()
+
+# Timeouts del driver: evitan que una petición quede colgada si MongoDB no responde
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "10000"))
+# Conexiones que el pool mantiene abiertas (el calentamiento las abre antes del tráfico)
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "10"))
+# Máximo por proceso; el lanzador lo reparte entre los workers
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+
+# Caché de lecturas por _id
+CACHE_MAX_ITEMS = int(os.getenv("CACHE_MAX_ITEMS", "1000"))
+CACHE_TTL = float(os.getenv("CACHE_TTL", "60"))
+# Solo las colecciones del catálogo se invalidan en los demás procesos (log de
+# cambios); con varios workers el lanzador deja fuera usuarios y carritos
+COLECCIONES_CACHEADAS = tuple(
+    nombre.strip()
+    for nombre in os.getenv("CACHE_COLECCIONES", "productos,categorias,ingredientes,usuarios,carritos").split(",")
+    if nombre.strip()
+)
+
+# Campos que find_by_id no lee: no deben quedar en memoria ni salir en las respuestas
+CAMPOS_EXCLUIDOS = {"usuarios": {"hash_password": 0}}
+
+caches = {
+    nombre: CacheLRU(nombre, max_items=CACHE_MAX_ITEMS, ttl=CACHE_TTL)
+    for nombre in COLECCIONES_CACHEADAS
+}
+
+# Las escrituras del catálogo invalidan la caché a través de core.catalogo
+catalogo.suscribir(lambda coleccion, doc_id, operacion: invalidar_cache(coleccion, doc_id))
 
 async def get_database():
     return db.database
 
 async def connect_to_mongo():
-    """Conectar a MongoDB"""
-    db.client = AsyncIOMotorClient(MONGODB_URL)
+    """Conectar a MongoDB (o crear el almacenamiento en memoria)"""
+    if ALMACENAMIENTO == "memoria":
+        db.client = ClienteMemoria()
+        db.database = db.client[DATABASE_NAME]
+        print(f"✅ Almacenamiento en memoria: {DATABASE_NAME}")
+        return
+    db.client = AsyncIOMotorClient(
+        MONGODB_URL,
+        serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+        minPoolSize=min(MONGO_MIN_POOL_SIZE, MONGO_MAX_POOL_SIZE),
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        event_listeners=[OyenteBreaker(breaker_mongo), OyenteComandos(), OyentePool(),
+                         OyenteConsultasLentas(), OyenteTrazas(), OyenteMiembros()]
+    )
     db.database = db.client[DATABASE_NAME]
     print(f"✅ Conectado a MongoDB: {DATABASE_NAME}")
 
@@ -37,4 +92,31 @@ def get_collection(collection_name: str):
     """Obtener una colección de MongoDB"""
     if db.database is None:
         raise Exception("No hay conexión a MongoDB. Asegúrate de ejecutar connect_to_mongo primero.")
-    return db.database[collection_name]
+    if not breaker_mongo.permite():
+        raise MongoNoDisponible("MongoDB no disponible (circuito abierto)")
+    collection = db.database[collection_name]
+    preferencia = preferencia_actual()
+    if preferencia is not None:
+        # Reportes y listados: secundario si hay uno al día (core.lectura)
+        collection = collection.with_options(read_preference=preferencia)
+    return collection
+
+async def find_by_id(collection_name: str, doc_id: Union[str, ObjectId]):
+    """Buscar un documento por _id, usando la caché si la colección la tiene"""
+    oid = doc_id if isinstance(doc_id, ObjectId) else ObjectId(doc_id)
+    collection = get_collection(collection_name)
+    cache = caches.get(collection_name)
+    proyeccion = CAMPOS_EXCLUIDOS.get(collection_name)
+
+    def cargar():
+        return leer_con_reintentos(lambda: collection.find_one({"_id": oid}, proyeccion))
+
+    if cache is None:
+        return await cargar()
+    return await cache.obtener(str(oid), cargar)
+
+def invalidar_cache(collection_name: str, doc_id: Optional[Union[str, ObjectId]] = None):
+    """Invalidar un documento (o toda la colección) en la caché por _id"""
+    cache = caches.get(collection_name)
+    if cache is not None:
+        cache.invalidar(str(doc_id) if doc_id is not None else None)
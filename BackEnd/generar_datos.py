@@ -0,0 +1,483 @@
+"""
+Generador de datos sintéticos a escala para pruebas de rendimiento.
+
+A diferencia de seed_data.py (un puñado de documentos de demostración), crea
+un catálogo completo y una base de clientes con historia: usuarios con
+direcciones, pedidos con items, pagos, envíos, comprobantes, carritos,
+notificaciones y cupones. Las referencias entre colecciones son consistentes
+y las distribuciones imitan producción:
+  - la popularidad de productos y cupones sigue una ley de Zipf
+  - pocos usuarios concentran muchos pedidos (cola larga)
+  - los pedidos crecen hacia el presente y se agrupan en almuerzo y cena
+  - el estado de pedidos, pagos y envíos depende de su antigüedad
+
+Todo se deriva de --semilla y --hasta (incluidos los _id), así que dos
+corridas con los mismos parámetros producen exactamente los mismos datos.
+Los documentos se insertan con insert_many por lotes y varias inserciones en
+paralelo; la contraseña de todos los usuarios se hashea una sola vez.
+
+Ejecutar:
+    python generar_datos.py --usuarios 100000 --limpiar
+    python generar_datos.py --usuarios 2000000 --lote 5000 --concurrencia 16 --limpiar
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import struct
+import time
+from bisect import bisect
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence
+
+from bson import ObjectId
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from passlib.context import CryptContext
+from pymongo import UpdateOne
+
+load_dotenv()
+
+MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
+DATABASE_NAME = os.getenv("DATABASE_NAME", "freshbowl")
+
+PASSWORD = "demo123"
+DOMINIO_EMAIL = "carga.freshbowl.cl"
+ALFABETO_BCRYPT = "./ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789"
+
+COLECCIONES = (
+    "categorias", "productos", "variantes", "ingredientes", "producto_ingredientes",
+    "cupones", "usuarios", "direcciones", "pedidos", "pedido_items", "pagos", "envios",
+    "comprobantes", "carritos", "carrito_items", "notificaciones",
+)
+
+CATEGORIAS = [
+    "Ensaladas Clásicas", "Bowls Proteicos", "Veganas", "Poke", "Wraps", "Sopas",
+    "Postres", "Bebidas", "Jugos", "Snacks", "Desayunos", "Promociones",
+]
+BASES = ["Quinoa", "Arroz integral", "Mix verdes", "Kale", "Fideos de arroz", "Cuscús", "Lentejas"]
+PROTEINAS = ["Pollo", "Salmón", "Tofu", "Atún", "Carne", "Garbanzos", "Huevo", "Camarón", "Falafel"]
+ESTILOS = ["César", "Teriyaki", "Mediterráneo", "Thai", "Mexicano", "Detox", "Power", "Hawaiano"]
+INGREDIENTES = [
+    "Lechuga romana", "Espinaca", "Kale", "Rúcula", "Palta", "Tomate cherry", "Pepino", "Zanahoria",
+    "Repollo morado", "Choclo", "Edamame", "Cebolla morada", "Pimentón", "Champiñones", "Aceitunas",
+    "Queso feta", "Parmesano", "Crutones", "Sésamo", "Maní", "Almendras", "Nueces", "Semillas de zapallo",
+    "Quinoa", "Arroz integral", "Garbanzos", "Lentejas", "Pollo", "Salmón", "Tofu", "Atún", "Huevo",
+    "Aderezo César", "Vinagreta de limón", "Salsa de maní", "Salsa teriyaki", "Aderezo de eneldo",
+]
+COMUNAS = [
+    "Providencia", "Las Condes", "Ñuñoa", "Santiago", "Vitacura", "La Reina", "Macul",
+    "San Miguel", "Maipú", "La Florida", "Independencia", "Recoleta", "Estación Central",
+]
+CALLES = ["Av. Providencia", "Los Leones", "Irarrázaval", "Av. Apoquindo", "Manuel Montt", "Suecia", "Bilbao"]
+NOMBRES = ["Camila", "Matías", "Valentina", "Benjamín", "Sofía", "Vicente", "Isidora", "Agustín", "Antonia", "Tomás"]
+APELLIDOS = ["González", "Muñoz", "Rojas", "Díaz", "Pérez", "Soto", "Contreras", "Silva", "Martínez", "Sepúlveda"]
+
+# Peso relativo de cada hora del día (almuerzo y cena concentran los pedidos)
+PESO_HORAS = [0, 0, 0, 0, 0, 0, 1, 2, 3, 3, 4, 8, 20, 24, 14, 5, 4, 5, 9, 18, 20, 12, 5, 2]
+# Fin de semana algo más cargado (lunes = 0)
+PESO_DIAS = [0.9, 0.9, 1.0, 1.0, 1.2, 1.4, 1.1]
+
+
+# ============= AZAR DETERMINÍSTICO =============
+
+class Azar(random.Random):
+    """random.Random con los generadores que necesitan los datos"""
+
+    def object_id(self, instante: datetime) -> ObjectId:
+        # Timestamp real del documento + 8 bytes derivados de la semilla
+        return ObjectId(struct.pack(">I", int(instante.timestamp())) + self.getrandbits(64).to_bytes(8, "big"))
+
+    def elegir(self, acumulados: Sequence[float]) -> int:
+        """Índice elegido según pesos acumulados"""
+        return bisect(acumulados, self.random() * acumulados[-1])
+
+
+def pesos_zipf(n: int, s: float) -> List[float]:
+    return list(itertools.accumulate(1 / (rango ** s) for rango in range(1, n + 1)))
+
+
+class Calendario:
+    """Instantes con crecimiento hacia el presente y picos por hora y día"""
+
+    def __init__(self, hasta: datetime, dias: int):
+        self.hasta = hasta.replace(hour=0, minute=0, second=0, microsecond=0)
+        self.dias = dias
+        self.horas = list(itertools.accumulate(PESO_HORAS))
+
+    def instante(self, azar: Azar) -> datetime:
+        while True:
+            # random() ** 2 concentra los días cerca del presente
+            dia = self.hasta - timedelta(days=int(self.dias * azar.random() ** 2))
+            if azar.random() * max(PESO_DIAS) <= PESO_DIAS[dia.weekday()]:
+                break
+        hora = azar.elegir(self.horas)
+        return dia + timedelta(hours=hora, seconds=azar.randrange(3600))
+
+
+def hash_compartido(semilla: int) -> str:
+    """
+    Hash bcrypt de PASSWORD para todos los usuarios (bcrypt por usuario
+    tomaría horas). La sal también sale de la semilla, así el hash es estable.
+    """
+    azar = Azar(f"{semilla}-password")
+    sal = "".join(azar.choice(ALFABETO_BCRYPT) for _ in range(21)) + azar.choice(".Oeu")
+    bcrypt = CryptContext(schemes=["bcrypt"], deprecated="auto").handler("bcrypt")
+    return bcrypt.using(salt=sal).hash(PASSWORD)
+
+
+# ============= INSERCIÓN =============
+
+class Insertador:
+    """insert_many por lotes con un máximo de inserciones en paralelo"""
+
+    def __init__(self, db, lote: int, concurrencia: int):
+        self.db = db
+        self.lote = lote
+        self._semaforo = asyncio.Semaphore(concurrencia)
+        self._pendientes: Dict[str, list] = {}
+        self._tareas = set()
+        # Primer lote que falló: se relanza en el siguiente envío o al vaciar
+        self._error: Optional[BaseException] = None
+        self.totales: Counter = Counter()
+
+    async def agregar(self, coleccion: str, doc: dict):
+        docs = self._pendientes.setdefault(coleccion, [])
+        docs.append(doc)
+        if len(docs) >= self.lote:
+            self._pendientes[coleccion] = []
+            await self._enviar(coleccion, docs)
+
+    async def _enviar(self, coleccion: str, docs: list):
+        # Se espera el semáforo antes de crear la tarea: limita la memoria en vuelo
+        await self._semaforo.acquire()
+        if self._error is not None:
+            self._semaforo.release()
+            raise self._error
+        tarea = asyncio.create_task(self._insertar(coleccion, docs))
+        self._tareas.add(tarea)
+        tarea.add_done_callback(self._terminada)
+
+    def _terminada(self, tarea: asyncio.Task):
+        self._tareas.discard(tarea)
+        if not tarea.cancelled() and tarea.exception() is not None and self._error is None:
+            self._error = tarea.exception()
+
+    async def _insertar(self, coleccion: str, docs: list):
+        try:
+            await self.db[coleccion].insert_many(docs, ordered=False)
+            self.totales[coleccion] += len(docs)
+        finally:
+            self._semaforo.release()
+
+    async def vaciar(self):
+        for coleccion, docs in self._pendientes.items():
+            if docs:
+                await self._enviar(coleccion, docs)
+        self._pendientes = {}
+        await asyncio.gather(*self._tareas, return_exceptions=True)
+        if self._error is not None:
+            raise self._error
+
+
+# ============= CATÁLOGO =============
+
+async def generar_catalogo(args, azar: Azar, ins: Insertador, ahora: datetime) -> dict:
+    alta = ahora - timedelta(days=args.dias)
+
+    categoria_ids = []
+    for nombre in CATEGORIAS[:args.categorias]:
+        _id = azar.object_id(alta)
+        categoria_ids.append(str(_id))
+        slug = nombre.lower().replace(" ", "-").replace("á", "a").replace("ú", "u")
+        await ins.agregar("categorias", {"_id": _id, "nombre": nombre, "slug": slug, "visible": True, "activa": True})
+
+    ingrediente_ids = []
+    for nombre in INGREDIENTES[:args.ingredientes]:
+        _id = azar.object_id(alta)
+        ingrediente_ids.append(str(_id))
+        await ins.agregar("ingredientes", {
+            "_id": _id,
+            "nombre": nombre,
+            "adicional": azar.random() < 0.4,
+            "precio_adicional": float(azar.choice([0, 490, 790, 990, 1490])),
+            "stock": azar.randint(0, 300),
+            "stock_minimo": 10,
+            "disponible": True,
+        })
+
+    productos = []
+    combinaciones = list(itertools.product(ESTILOS, PROTEINAS, BASES))
+    azar.shuffle(combinaciones)
+    for i in range(args.productos):
+        estilo, proteina, base = combinaciones[i % len(combinaciones)]
+        _id = azar.object_id(alta)
+        precio = float(azar.randrange(5990, 13990, 500))
+        nombre = f"{estilo} de {proteina.lower()} con {base.lower()}"
+        if i >= len(combinaciones):
+            nombre += f" #{i // len(combinaciones) + 1}"
+        await ins.agregar("productos", {
+            "_id": _id,
+            "categoria_id": azar.choice(categoria_ids),
+            "nombre": nombre,
+            "descripcion": f"Bowl {estilo.lower()} con {proteina.lower()}, {base.lower()} y vegetales de temporada.",
+            "precio": precio,
+            "imagen_url": f"https://picsum.photos/seed/freshbowl-{i}/800/600",
+            "activo": azar.random() > 0.03,
+            "agotado": azar.random() < 0.05,
+            "disponible": True,
+            "stock": azar.randint(0, 200),
+            "ingredientes": [proteina, base],
+        })
+        variantes = []
+        for nombre_variante, recargo in (("Mediano", 0), ("Grande", 2000))[:azar.randint(0, 2)]:
+            variante_id = azar.object_id(alta)
+            variantes.append((str(variante_id), precio + recargo))
+            await ins.agregar("variantes", {
+                "_id": variante_id, "producto_id": str(_id), "nombre": nombre_variante,
+                "precio": precio + recargo, "activo": True,
+            })
+        for ingrediente_id in azar.sample(ingrediente_ids, k=min(len(ingrediente_ids), azar.randint(3, 6))):
+            await ins.agregar("producto_ingredientes", {
+                "_id": azar.object_id(alta), "producto_id": str(_id), "ingrediente_id": ingrediente_id,
+                "tipo": azar.choice(["base", "base", "adicional", "extra"]), "opcional": azar.random() < 0.3,
+            })
+        productos.append({"_id": str(_id), "precio": precio, "variantes": variantes})
+
+    cupones = []
+    for i in range(args.cupones):
+        desde = alta + timedelta(days=azar.randrange(max(args.dias, 1)))
+        porcentaje = azar.random() < 0.6
+        cupon = {
+            "_id": azar.object_id(desde),
+            "codigo": f"FRESH{i:05d}",
+            "descuento_porcentaje": float(azar.choice([5, 10, 15, 20])) if porcentaje else 0.0,
+            "descuento_fijo": 0.0 if porcentaje else float(azar.choice([1000, 2000, 3000])),
+            "valido_desde": desde,
+            "valido_hasta": desde + timedelta(days=azar.choice([7, 30, 90, 365])),
+            "uso_maximo": azar.choice([0, 0, 100, 1000, 10000]),
+            "uso_actual": 0,
+            "activo": True,
+        }
+        cupones.append(cupon)
+        await ins.agregar("cupones", cupon)
+
+    return {
+        "productos": productos,
+        "popularidad_productos": pesos_zipf(len(productos), 1.1),
+        "cupones": cupones,
+        "popularidad_cupones": pesos_zipf(len(cupones), 1.3) if cupones else None,
+    }
+
+
+# ============= CLIENTES =============
+
+def estado_por_antiguedad(azar: Azar, horas: float) -> str:
+    if horas < 1:
+        return azar.choice(["pendiente", "confirmado", "preparando"])
+    if horas < 3:
+        return azar.choice(["preparando", "enviado", "enviado"])
+    return "cancelado" if azar.random() < 0.04 else "entregado"
+
+
+def pedidos_del_usuario(azar: Azar, media: float) -> int:
+    # Pareto: la mayoría pide poco y unos pocos piden muchísimo
+    if media <= 0:
+        return 0
+    return min(int(azar.paretovariate(1.5) * media / 3), int(media * 100))
+
+
+async def generar_usuario(i: int, args, ins: Insertador, catalogo: dict, calendario: Calendario,
+                          hash_password: str, ahora: datetime, uso_cupones: Counter):
+    # Un generador por usuario: el resultado no depende del orden de inserción
+    azar = Azar(f"{args.semilla}-usuario-{i}")
+    registro = calendario.instante(azar)
+    usuario_id = azar.object_id(registro)
+    uid = str(usuario_id)
+    nombre = f"{azar.choice(NOMBRES)} {azar.choice(APELLIDOS)}"
+    await ins.agregar("usuarios", {
+        "_id": usuario_id,
+        "nombre": nombre,
+        "email": f"usuario{i}@{DOMINIO_EMAIL}",
+        "hash_password": hash_password,
+        "telefono": f"+569{azar.randrange(10**8):08d}",
+        "email_verificado": azar.random() < 0.8,
+        "activo": azar.random() > 0.02,
+    })
+
+    direcciones = []
+    for n in range(azar.choice([1, 1, 1, 2, 2, 3])):
+        direccion_id = azar.object_id(registro)
+        direcciones.append(str(direccion_id))
+        await ins.agregar("direcciones", {
+            "_id": direccion_id, "usuario_id": uid,
+            "calle": azar.choice(CALLES), "numero": str(azar.randint(100, 9999)),
+            "comuna": azar.choice(COMUNAS), "ciudad": "Santiago",
+            "lat": round(-33.45 + azar.uniform(-0.1, 0.1), 6), "lng": round(-70.65 + azar.uniform(-0.1, 0.1), 6),
+            "favorita": n == 0,
+        })
+
+    productos = catalogo["productos"]
+    popularidad = catalogo["popularidad_productos"]
+
+    for _ in range(pedidos_del_usuario(azar, args.pedidos_por_usuario)):
+        creado = max(calendario.instante(azar), registro)
+        horas = (ahora - creado).total_seconds() / 3600
+        estado = estado_por_antiguedad(azar, horas)
+        pedido_id = azar.object_id(creado)
+        pid = str(pedido_id)
+
+        subtotal = 0.0
+        for _ in range(azar.choice([1, 1, 2, 2, 3, 4])):
+            producto = productos[azar.elegir(popularidad)]
+            variante_id, precio = (azar.choice(producto["variantes"]) if producto["variantes"] and azar.random() < 0.5
+                                   else (None, producto["precio"]))
+            cantidad = azar.choice([1, 1, 1, 2])
+            subtotal += precio * cantidad
+            await ins.agregar("pedido_items", {
+                "_id": azar.object_id(creado), "pedido_id": pid, "producto_id": producto["_id"],
+                "variante_id": variante_id, "cantidad": cantidad, "precio_unitario": precio,
+            })
+
+        descuento = 0.0
+        if catalogo["cupones"] and azar.random() < args.uso_cupones:
+            cupon = catalogo["cupones"][azar.elegir(catalogo["popularidad_cupones"])]
+            uso_cupones[cupon["codigo"]] += 1
+            descuento = cupon["descuento_fijo"] or round(subtotal * cupon["descuento_porcentaje"] / 100)
+            descuento = min(descuento, subtotal)
+        delivery = azar.random() < 0.7
+        envio = 1990.0 if delivery else 0.0
+        total = subtotal - descuento + envio
+
+        await ins.agregar("pedidos", {
+            "_id": pedido_id, "usuario_id": uid,
+            "direccion_id": azar.choice(direcciones) if delivery else None,
+            "estado": estado, "subtotal": subtotal, "descuento": descuento, "envio": envio, "total": total,
+            "creado_en": creado,
+        })
+
+        pagado = estado != "cancelado" or azar.random() < 0.5
+        await ins.agregar("pagos", {
+            "_id": azar.object_id(creado), "pedido_id": pid,
+            "pasarela": azar.choice(["webpay", "webpay", "mercadopago"]),
+            "estado": ("reembolsado" if estado == "cancelado" else "aprobado") if pagado else "rechazado",
+            "monto": total,
+            "medio": azar.choice(["tarjeta_credito", "tarjeta_debito", "tarjeta_debito", "transferencia"]),
+            "token": f"tok_{azar.getrandbits(64):016x}",
+            "creado_en": creado,
+        })
+
+        if estado != "cancelado":
+            await ins.agregar("envios", {
+                "_id": azar.object_id(creado),
+                "tipo": "delivery" if delivery else "retiro",
+                "proveedor": azar.choice(["propio", "uber", "rappi"]) if delivery else None,
+                "tracking": f"FB{pid[-12:].upper()}" if delivery else None,
+                "estimado": creado + timedelta(minutes=azar.randint(25, 60)),
+                "estado": {"entregado": "entregado", "enviado": "en_camino"}.get(estado, "pendiente"),
+            })
+            await ins.agregar("comprobantes", {
+                "_id": azar.object_id(creado), "pedido_id": pid,
+                "tipo": "factura" if azar.random() < 0.05 else "boleta",
+                "numero": f"B-{pid[-10:].upper()}",
+                "pdf_url": None,
+            })
+
+        for canal, asunto in (("email", "Confirmación de tu pedido"), ("push", "Tu pedido va en camino")):
+            if canal == "push" and not delivery:
+                continue
+            await ins.agregar("notificaciones", {
+                "_id": azar.object_id(creado), "usuario_id": uid, "canal": canal, "asunto": asunto,
+                "estado": "enviado" if azar.random() > 0.02 else "fallido",
+                "enviado_en": creado,
+            })
+
+    # Carritos: uno activo para una parte de los usuarios y algunos abandonados
+    for estado_carrito, probabilidad in (("activo", 0.3), ("abandonado", 0.4)):
+        if azar.random() >= probabilidad:
+            continue
+        actualizado = max(calendario.instante(azar), registro)
+        carrito_id = azar.object_id(actualizado)
+        await ins.agregar("carritos", {
+            "_id": carrito_id, "usuario_id": uid, "estado": estado_carrito,
+            "cupon_codigo": None, "actualizado_en": actualizado,
+        })
+        for _ in range(azar.randint(1, 4)):
+            producto = productos[azar.elegir(popularidad)]
+            await ins.agregar("carrito_items", {
+                "_id": azar.object_id(actualizado), "carrito_id": str(carrito_id),
+                "producto_id": producto["_id"], "variante_id": None,
+                "cantidad": azar.choice([1, 1, 2]), "precio_unitario": producto["precio"],
+            })
+
+
+# ============= PRINCIPAL =============
+
+async def main():
+    parser = argparse.ArgumentParser(description="Datos sintéticos a escala para pruebas de rendimiento")
+    parser.add_argument("--usuarios", type=int, default=10_000)
+    parser.add_argument("--pedidos-por-usuario", type=float, default=3.0, help="Media de pedidos por usuario")
+    parser.add_argument("--productos", type=int, default=300)
+    parser.add_argument("--categorias", type=int, default=len(CATEGORIAS))
+    parser.add_argument("--ingredientes", type=int, default=len(INGREDIENTES))
+    parser.add_argument("--cupones", type=int, default=500)
+    parser.add_argument("--uso-cupones", type=float, default=0.15, help="Fracción de pedidos con cupón")
+    parser.add_argument("--dias", type=int, default=365, help="Días de historia")
+    parser.add_argument("--hasta", type=datetime.fromisoformat, default=None,
+                        help="Fecha final de la historia, AAAA-MM-DD (por defecto hoy)")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--lote", type=int, default=2000, help="Documentos por insert_many")
+    parser.add_argument("--concurrencia", type=int, default=8, help="insert_many en paralelo")
+    parser.add_argument("--limpiar", action="store_true", help="Vaciar las colecciones antes de generar")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(MONGODB_URL, maxPoolSize=args.concurrencia + 2)
+    db = client[DATABASE_NAME]
+
+    if args.limpiar:
+        print("🗑️  Limpiando datos anteriores...")
+        for coleccion in COLECCIONES:
+            await db[coleccion].drop()
+
+    hash_password = hash_compartido(args.semilla)
+    # Con día de granularidad: mismo día y misma semilla, mismos datos
+    ahora = args.hasta or datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    calendario = Calendario(ahora, args.dias)
+    ins = Insertador(db, args.lote, args.concurrencia)
+    inicio = time.perf_counter()
+
+    print(f"🥗 Generando catálogo ({args.productos} productos, {args.cupones} cupones)...")
+    catalogo = await generar_catalogo(args, Azar(f"{args.semilla}-catalogo"), ins, ahora)
+
+    print(f"👤 Generando {args.usuarios:,} usuarios con su historia...")
+    uso_cupones: Counter = Counter()
+    paso = max(args.usuarios // 20, 1)
+    for i in range(args.usuarios):
+        await generar_usuario(i, args, ins, catalogo, calendario, hash_password, ahora, uso_cupones)
+        if (i + 1) % paso == 0:
+            transcurrido = time.perf_counter() - inicio
+            print(f"   {i + 1:>12,} usuarios  ({sum(ins.totales.values()):,} documentos, {transcurrido:.0f} s)")
+    await ins.vaciar()
+
+    if uso_cupones:
+        await db.cupones.bulk_write(
+            [UpdateOne({"codigo": codigo}, {"$set": {"uso_actual": usos}}) for codigo, usos in uso_cupones.items()],
+            ordered=False,
+        )
+
+    transcurrido = time.perf_counter() - inicio
+    total = sum(ins.totales.values())
+    print("\n" + "=" * 50)
+    print(f"🎉 {total:,} documentos en {transcurrido:.1f} s ({total / transcurrido:,.0f} docs/s)")
+    print("=" * 50)
+    for coleccion in COLECCIONES:
+        print(f"   • {coleccion}: {ins.totales[coleccion]:,}")
+    print(f"\n🔑 Todos los usuarios: usuario<N>@{DOMINIO_EMAIL} / {PASSWORD}")
+
+    client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
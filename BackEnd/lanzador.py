@@ -0,0 +1,254 @@
+"""
+Lanzador de producción: varios workers de uvicorn sobre el mismo puerto.
+
+El proceso principal abre el socket, importa la app una sola vez (los workers
+se crean con fork y la heredan ya cargada) y mantiene N workers vivos:
+
+- N = núcleos disponibles por defecto (--workers para fijarlo).
+- El pool de MongoDB se reparte: cada worker recibe --pool-total / N como
+  MONGO_MAX_POOL_SIZE. El cliente Motor se crea en el lifespan de cada
+  worker, nunca antes del fork.
+- Un worker que muere se reemplaza (con espera creciente si falla al
+  arrancar una y otra vez).
+- Un worker se recicla al atender --max-peticiones (con variación aleatoria
+  para que no se reciclen todos juntos) o al superar --max-memoria-mb de RSS:
+  deja de aceptar, termina lo que tiene en curso y el principal crea otro.
+- Con SIGTERM o SIGINT el principal deja de crear workers y les reenvía la
+  señal: cada uno deja de aceptar conexiones, espera hasta --drenaje segundos
+  a que terminen las peticiones en curso (los WebSocket se cierran con 1012),
+  ejecuta el shutdown del lifespan (cierra el cliente Motor) y sale. Los que
+  no terminen a tiempo reciben SIGKILL.
+
+Como los workers no comparten memoria, el lanzador activa el seguimiento del
+log de cambios del catálogo (SYNC_SEGUIR_INTERVALO) para que la escritura en
+un worker invalide las cachés del catálogo de los demás. Usuarios y carritos no
+están en ese log, así que con varios workers no se cachean por proceso
+(CACHE_COLECCIONES).
+
+fork no existe en Windows: ahí se usa el modo multiproceso de uvicorn, sin
+precarga ni reciclaje por memoria.
+
+Ejecutar:
+    python lanzador.py --host 0.0.0.0 --port 8000
+    python lanzador.py --workers 4 --pool-total 200 --max-peticiones 50000 --max-memoria-mb 512
+"""
+import argparse
+import inspect
+import logging
+import os
+import random
+import signal
+import sys
+import time
+from typing import Dict, Optional
+
+import uvicorn
+
+logger = logging.getLogger("freshbowl.lanzador")
+
+# Un worker que sale antes de esto se considera un fallo al arrancar
+ARRANQUE_MINIMO = 5.0
+ESPERA_MAXIMA_REINICIO = 30.0
+
+
+def nucleos_disponibles() -> int:
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def rss_mb() -> Optional[float]:
+    from core.memoria import rss
+
+    actual = rss()["rss"]
+    return None if actual is None else actual / (1024 * 1024)
+
+
+# uvicorn agregó limit_max_requests_jitter en versiones recientes; con las
+# anteriores la variación la aplica cada worker al arrancar
+JITTER_NATIVO = "limit_max_requests_jitter" in inspect.signature(uvicorn.Config).parameters
+
+
+class Worker:
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.inicio = time.monotonic()
+
+
+class Lanzador:
+    def __init__(self, args, config: uvicorn.Config):
+        self.args = args
+        self.config = config
+        self.socket = config.bind_socket()
+        self.workers: Dict[int, Worker] = {}
+        self.deteniendo = False
+        self.fallos_seguidos = 0
+
+    # ----- worker -----
+
+    def _ejecutar_worker(self):
+        for senal in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(senal, signal.SIG_DFL)
+        # Grupo propio: Ctrl+C llega solo al principal, que reenvía una única
+        # señal (una segunda señal haría que uvicorn cortara sin drenar)
+        os.setpgid(0, 0)
+        padre = os.getppid()
+        if not JITTER_NATIVO and self.config.limit_max_requests and self.args.variacion_peticiones:
+            self.config.limit_max_requests += random.randint(0, self.args.variacion_peticiones)
+        server = uvicorn.Server(self.config)
+
+        async def revisar():
+            if server.should_exit:
+                return
+            if os.getppid() != padre:
+                logger.warning("El proceso principal terminó: el worker %s se detiene", os.getpid())
+                server.should_exit = True
+            elif self.args.max_memoria_mb and (rss_mb() or 0) > self.args.max_memoria_mb:
+                logger.info("Worker %s supera %s MB de RSS: se recicla", os.getpid(), self.args.max_memoria_mb)
+                server.should_exit = True
+
+        self.config.callback_notify = revisar
+        self.config.timeout_notify = self.args.intervalo_revision
+        server.run(sockets=[self.socket])
+
+    def iniciar_worker(self):
+        pid = os.fork()
+        if pid == 0:
+            codigo = 0
+            try:
+                self._ejecutar_worker()
+            except BaseException:
+                logger.exception("El worker %s terminó con un error", os.getpid())
+                codigo = 1
+            finally:
+                os._exit(codigo)
+        self.workers[pid] = Worker(pid)
+
+    # ----- principal -----
+
+    def _al_recibir_senal(self, senal, frame):
+        if not self.deteniendo:
+            print(f"🛑 {signal.Signals(senal).name}: drenando {len(self.workers)} workers "
+                  f"(hasta {self.args.drenaje:g} s)")
+        self.deteniendo = True
+
+    def _recoger(self):
+        """Registrar los workers que terminaron y reemplazarlos si corresponde"""
+        while self.workers:
+            try:
+                pid, estado = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            worker = self.workers.pop(pid, None)
+            if worker is None or self.deteniendo:
+                continue
+
+            vida = time.monotonic() - worker.inicio
+            codigo = os.waitstatus_to_exitcode(estado)
+            if codigo == 0:
+                # Reciclado por peticiones o memoria
+                self.fallos_seguidos = 0
+            else:
+                print(f"❌ Worker {pid} terminó con código {codigo} tras {vida:.0f} s, reemplazando")
+                self.fallos_seguidos = self.fallos_seguidos + 1 if vida < ARRANQUE_MINIMO else 0
+                if self.fallos_seguidos:
+                    time.sleep(min(ESPERA_MAXIMA_REINICIO, 2 ** (self.fallos_seguidos - 1)))
+            if not self.deteniendo:
+                self.iniciar_worker()
+
+    def _drenar(self):
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        limite = time.monotonic() + self.args.drenaje + 5
+        while self.workers and time.monotonic() < limite:
+            self._recoger()
+            time.sleep(0.1)
+        for pid in list(self.workers):
+            print(f"⚠️  Worker {pid} no terminó a tiempo, se fuerza el cierre")
+            try:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+            except (ProcessLookupError, ChildProcessError):
+                pass
+        self.workers.clear()
+
+    def ejecutar(self):
+        signal.signal(signal.SIGTERM, self._al_recibir_senal)
+        signal.signal(signal.SIGINT, self._al_recibir_senal)
+        for _ in range(self.args.workers):
+            self.iniciar_worker()
+        print(f"🚀 {self.args.workers} workers en http://{self.args.host}:{self.args.port} "
+              f"(pool MongoDB {os.environ['MONGO_MAX_POOL_SIZE']} por worker)")
+
+        while not self.deteniendo:
+            self._recoger()
+            time.sleep(0.2)
+
+        self.socket.close()
+        self._drenar()
+        print("✅ Todos los workers terminaron")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor de producción con varios workers")
+    parser.add_argument("--host", default=os.getenv("HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WORKERS", "0")),
+                        help="0 = un worker por núcleo disponible")
+    parser.add_argument("--pool-total", type=int, default=int(os.getenv("MONGO_POOL_TOTAL", "100")),
+                        help="Conexiones a MongoDB entre todos los workers")
+    parser.add_argument("--max-peticiones", type=int, default=int(os.getenv("WORKER_MAX_PETICIONES", "0")),
+                        help="Reciclar cada worker tras N peticiones (0 = nunca)")
+    parser.add_argument("--variacion-peticiones", type=int, default=None,
+                        help="Variación aleatoria de --max-peticiones (por defecto 10%%)")
+    parser.add_argument("--max-memoria-mb", type=float, default=float(os.getenv("WORKER_MAX_MEMORIA_MB", "0")),
+                        help="Reciclar el worker que supere este RSS (0 = nunca; requiere /proc)")
+    parser.add_argument("--intervalo-revision", type=float, default=5.0,
+                        help="Cada cuántos segundos el worker revisa su memoria y al principal")
+    parser.add_argument("--drenaje", type=float, default=float(os.getenv("WORKER_DRENAJE", "30")),
+                        help="Segundos para terminar las peticiones en curso al detenerse")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    args.workers = args.workers or nucleos_disponibles()
+    por_worker = max(1, args.pool_total // args.workers)
+    os.environ["MONGO_MAX_POOL_SIZE"] = str(por_worker)
+    os.environ["MONGO_MIN_POOL_SIZE"] = str(min(int(os.getenv("MONGO_MIN_POOL_SIZE", "10")), por_worker))
+    if args.workers > 1:
+        os.environ.setdefault("SYNC_SEGUIR_INTERVALO", "1")
+        # Usuarios y carritos no pasan por el log: una caché por worker quedaría vieja
+        os.environ.setdefault("CACHE_COLECCIONES", "productos,categorias,ingredientes")
+    if args.variacion_peticiones is None:
+        args.variacion_peticiones = args.max_peticiones // 10
+
+    opciones = dict(
+        host=args.host,
+        port=args.port,
+        log_level=args.log_level,
+        limit_max_requests=args.max_peticiones or None,
+        timeout_graceful_shutdown=int(args.drenaje),
+    )
+    if JITTER_NATIVO:
+        opciones["limit_max_requests_jitter"] = args.variacion_peticiones
+
+    if not hasattr(os, "fork"):
+        print("⚠️  Sin fork (Windows): modo multiproceso de uvicorn, sin precarga ni reciclaje por memoria")
+        uvicorn.run("main:app", workers=args.workers, **opciones)
+        return
+
+    # Precarga: la app se importa una vez aquí y los workers la heredan
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import main as aplicacion
+
+    config = uvicorn.Config(aplicacion.app, **opciones)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s:     %(message)s")
+    Lanzador(args, config).ejecutar()
+
+
+if __name__ == "__main__":
+    main()
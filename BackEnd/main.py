@@ -1,7 +1,26 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from database import connect_to_mongo, close_mongo_connection
+from core.cache_http import CacheCatalogoMiddleware
+from core.coalescencia import CoalescenciaMiddleware
+from core.plazos import PlazosMiddleware
+from core.lectura import PreferenciaLecturaMiddleware
+from core.resiliencia import MongoNoDisponible, CB_ENFRIAMIENTO
+from core.swr import UltimoValidoMiddleware
+from core.cambios import iniciar_log_cambios, detener_log_cambios
+from core.consultas_lentas import registro_consultas
+from core.perfilado import PerfiladoMiddleware
+from core.memoria import MemoriaMiddleware, perfil_memoria
+from core.trazas import TrazasMiddleware, exportador as exportador_trazas
+from core.captura import CapturaMiddleware, captura
+from core.metricas import MetricasMiddleware, registro
+from core.bloqueos import BloqueosMiddleware, vigilante
+from core.arranque import arranque
+from core.escritura_diferida import escritura_diferida
+from core.idempotencia import IdempotenciaMiddleware
+from core.webhooks import bandeja_webhooks
 from routers import (
     usuarios,
     roles,
@@ -15,15 +34,39 @@ from routers import (
     notificaciones,
     pagos,
     envios,
-    comprobantes
+    comprobantes,
+    menu,
+    sync,
+    webhooks,
+    admin
 )
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup: conectar a MongoDB
     await connect_to_mongo()
+    await iniciar_log_cambios()
+    vigilante.iniciar()
+    registro_consultas.iniciar()
+    exportador_trazas.iniciar()
+    perfil_memoria.iniciar()
+    captura.iniciar()
+    escritura_diferida.iniciar()
+    bandeja_webhooks.iniciar()
+    # Calentamiento: el servidor empieza a aceptar conexiones cuando termina
+    await arranque.iniciar(app)
     yield
-    # Shutdown: cerrar conexión
+    # Shutdown: detener tareas y cerrar conexión
+    await arranque.detener()
+    await captura.detener()
+    await bandeja_webhooks.detener()
+    # Escribir lo pendiente antes de cerrar la conexión
+    await escritura_diferida.detener()
+    perfil_memoria.detener()
+    await exportador_trazas.detener()
+    await registro_consultas.detener()
+    vigilante.detener()
+    await detener_log_cambios()
     await close_mongo_connection()
 
 app = FastAPI(
@@ -33,6 +76,21 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Los middlewares agregados primero quedan más adentro:
+# métricas -> trazas -> captura de tráfico -> CORS -> plazo de la petición -> Idempotency-Key
+# -> ETag/compresión del catálogo -> última copia válida -> coalescencia de lecturas -> perfilado -> memoria -> bloqueos -> preferencia de lectura
+# -> routers. Así las respuestas 304 también llevan los headers CORS (también los 504 por plazo vencido) y la
+# coalescencia comparte la respuesta sin comprimir.
+app.add_middleware(PreferenciaLecturaMiddleware)
+app.add_middleware(BloqueosMiddleware)
+app.add_middleware(MemoriaMiddleware)
+app.add_middleware(PerfiladoMiddleware)
+app.add_middleware(CoalescenciaMiddleware)
+app.add_middleware(UltimoValidoMiddleware)
+app.add_middleware(CacheCatalogoMiddleware)
+app.add_middleware(IdempotenciaMiddleware)
+app.add_middleware(PlazosMiddleware)
+
 # Configurar CORS
 app.add_middleware(
     CORSMiddleware,
@@ -40,8 +98,22 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Data-Stale", "traceparent", "Idempotent-Replayed"],
 )
 
+# Captura, trazas y métricas por fuera de todo lo demás para medir la latencia completa
+app.add_middleware(CapturaMiddleware)
+app.add_middleware(TrazasMiddleware)
+app.add_middleware(MetricasMiddleware)
+
+@app.exception_handler(MongoNoDisponible)
+async def mongo_no_disponible_handler(request: Request, exc: MongoNoDisponible):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Base de datos no disponible, intenta nuevamente"},
+        headers={"Retry-After": str(int(CB_ENFRIAMIENTO))}
+    )
+
 # Incluir routers
 app.include_router(usuarios.router, prefix="/api/usuarios", tags=["Usuarios"])
 app.include_router(roles.router, prefix="/api/roles", tags=["Roles"])
@@ -56,6 +128,10 @@ app.include_router(notificaciones.router, prefix="/api/notificaciones", tags=["N
 app.include_router(pagos.router, prefix="/api/pagos", tags=["Pagos"])
 app.include_router(envios.router, prefix="/api/envios", tags=["Envíos"])
 app.include_router(comprobantes.router, prefix="/api/comprobantes", tags=["Comprobantes"])
+app.include_router(menu.router, prefix="/api/menu", tags=["Menú"])
+app.include_router(sync.router, prefix="/api/sync", tags=["Sincronización"])
+app.include_router(webhooks.router, prefix="/api/webhooks", tags=["Webhooks"])
+app.include_router(admin.router, prefix="/api/admin", tags=["Administración"])
 
 @app.get("/")
 async def root():
@@ -65,6 +141,15 @@ async def root():
         "docs": "/docs"
     }
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(registro.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
+
+@app.get("/ready")
+async def ready_check():
+    """Lista para recibir tráfico: el calentamiento terminó"""
+    return JSONResponse(status_code=200 if arranque.listo else 503, content=arranque.estado())
@@ -0,0 +1,203 @@
+"""
+Microbenchmarks de las piezas que toca cada petición.
+
+Mide validación de modelos Pydantic, las variantes de serialize_doc de los
+routers, el parseo/validación de ObjectId, la codificación JSON de listados de
+100/1.000/10.000 documentos y el costo de verificar una contraseña con el
+CryptContext de la API. No necesita MongoDB.
+
+Cada caso se calibra con timeit (autorange) y se repite varias veces; se
+reporta la mediana y el mínimo por operación. Con --salida el resultado queda
+en JSON, y con --comparar se muestra la variación contra una corrida anterior.
+
+Ejecutar:
+    python microbench.py
+    python microbench.py --salida bench.json
+    python microbench.py --comparar bench.json --filtro json
+"""
+import argparse
+import json
+import platform
+import statistics
+import timeit
+from datetime import datetime
+from typing import Callable, Dict, List
+
+import fastapi
+import pydantic
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from core.menu import codificar_json
+from models.pedido import PedidoCreate, PedidoResponse
+from models.producto import ProductoCreate, ProductoResponse
+from models.utils import validate_object_id
+from routers import pedidos, productos
+from routers.usuarios import get_pwd_context
+
+TAMANOS_LISTADO = (100, 1_000, 10_000)
+
+
+# ============= DATOS =============
+
+def doc_producto(i: int) -> dict:
+    """Documento de producto tal como sale de MongoDB"""
+    return {
+        "_id": ObjectId(),
+        "categoria_id": str(ObjectId()),
+        "nombre": f"Bowl {i}",
+        "descripcion": "Quinoa, espinaca, palta, tomates cherry, garbanzos y vinagreta de limón.",
+        "precio": 8990.0 + i % 7 * 500,
+        "imagen_url": "https://images.unsplash.com/photo-1512621776951-a57141f2eefd?w=800",
+        "activo": True,
+        "agotado": False,
+        "disponible": True,
+        "stock": 50,
+        "ingredientes": ["Quinoa", "Espinaca", "Palta", "Tomate cherry", "Garbanzos"],
+    }
+
+
+def doc_pedido() -> dict:
+    """Pedido con items embebidos, el caso que recorre el serialize_doc recursivo"""
+    return {
+        "_id": ObjectId(),
+        "usuario_id": ObjectId(),
+        "direccion_id": ObjectId(),
+        "estado": "pendiente",
+        "subtotal": 18980.0,
+        "descuento": 0.0,
+        "envio": 1990.0,
+        "total": 20970.0,
+        "creado_en": datetime.utcnow(),
+        "items": [
+            {"_id": ObjectId(), "producto_id": ObjectId(), "cantidad": 2, "precio_unitario": 8990.0}
+            for _ in range(5)
+        ],
+    }
+
+
+PAYLOAD_PRODUCTO = {
+    "categoria_id": str(ObjectId()),
+    "nombre": "Quinoa Power Bowl",
+    "descripcion": "Bowl energético con quinoa y palta.",
+    "precio": 9490,
+    "imagen_url": "https://images.unsplash.com/photo-1512621776951-a57141f2eefd?w=800",
+    "stock": 50,
+    "ingredientes": ["Quinoa", "Espinaca", "Palta"],
+}
+
+PAYLOAD_PEDIDO = {
+    "usuario_id": str(ObjectId()),
+    "direccion_id": str(ObjectId()),
+    "subtotal": 18980,
+    "envio": 1990,
+    "total": 20970,
+}
+
+
+# ============= CASOS =============
+
+def casos() -> Dict[str, Callable[[], object]]:
+    producto_serializado = productos.serialize_doc(doc_producto(0))
+    pedido = doc_pedido()
+    pedido_serializado = pedidos.serialize_doc(pedido)
+    id_texto = str(ObjectId())
+    id_objeto = ObjectId(id_texto)
+    pwd_context = get_pwd_context()
+    hash_password = pwd_context.hash("demo123")
+
+    resultado = {
+        # Modelos
+        "modelo.ProductoCreate": lambda: ProductoCreate.model_validate(PAYLOAD_PRODUCTO),
+        "modelo.PedidoCreate": lambda: PedidoCreate.model_validate(PAYLOAD_PEDIDO),
+        "modelo.ProductoResponse": lambda: ProductoResponse.model_validate(producto_serializado),
+        "modelo.PedidoResponse": lambda: PedidoResponse.model_validate(pedido_serializado),
+        # serialize_doc: la copia del dict se incluye en ambos para que sean comparables
+        "serialize_doc.simple": lambda: productos.serialize_doc(dict(pedido)),
+        "serialize_doc.recursivo": lambda: pedidos.serialize_doc(dict(pedido)),
+        # ObjectId
+        "objectid.is_valid": lambda: ObjectId.is_valid(id_texto),
+        "objectid.desde_texto": lambda: ObjectId(id_texto),
+        "objectid.validate_texto": lambda: validate_object_id(id_texto),
+        "objectid.validate_objeto": lambda: validate_object_id(id_objeto),
+        # Contraseñas
+        "bcrypt.verify": lambda: pwd_context.verify("demo123", hash_password),
+    }
+
+    lista_productos = TypeAdapter(List[ProductoResponse])
+    for tamano in TAMANOS_LISTADO:
+        docs = productos.serialize_docs([doc_producto(i) for i in range(tamano)])
+        validados = lista_productos.validate_python(docs)
+        resultado.update({
+            # Lo que hace FastAPI con response_model=List[ProductoResponse]
+            f"json.{tamano}.response_model": lambda docs=docs: JSONResponse(
+                jsonable_encoder(lista_productos.validate_python(docs))
+            ).body,
+            f"json.{tamano}.jsonable_encoder": lambda docs=docs: JSONResponse(jsonable_encoder(docs)).body,
+            f"json.{tamano}.pydantic_dump_json": lambda validados=validados: lista_productos.dump_json(
+                validados, by_alias=True
+            ),
+            f"json.{tamano}.codificar_json": lambda docs=docs: codificar_json(docs),
+        })
+    return resultado
+
+
+# ============= MEDICIÓN =============
+
+def medir(fn: Callable[[], object], repeticiones: int) -> dict:
+    timer = timeit.Timer(fn)
+    numero, _ = timer.autorange()
+    tiempos = [total / numero for total in timer.repeat(repeat=repeticiones, number=numero)]
+    mediana = statistics.median(tiempos)
+    return {
+        "iteraciones": numero,
+        "repeticiones": repeticiones,
+        "mediana_us": round(mediana * 1e6, 3),
+        "min_us": round(min(tiempos) * 1e6, 3),
+        "ops_por_segundo": round(1 / mediana, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks del camino caliente de las peticiones")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--filtro", default="", help="Solo casos cuyo nombre contenga este texto")
+    parser.add_argument("--salida", help="Guardar los resultados en un archivo JSON")
+    parser.add_argument("--comparar", help="Resultados anteriores contra los que comparar")
+    args = parser.parse_args()
+
+    base = {}
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as archivo:
+            base = json.load(archivo)["resultados"]
+
+    print(f"⏱️  Python {platform.python_version()}, pydantic {pydantic.VERSION}, fastapi {fastapi.__version__}\n")
+    print(f"{'caso':<40}{'mediana µs':>14}{'min µs':>14}{'ops/s':>14}  vs base")
+
+    resultados = {}
+    for nombre, fn in casos().items():
+        if args.filtro not in nombre:
+            continue
+        medicion = resultados[nombre] = medir(fn, args.repeticiones)
+        comparacion = ""
+        if nombre in base:
+            comparacion = f"{medicion['mediana_us'] / base[nombre]['mediana_us'] - 1:+.1%}"
+        print(f"{nombre:<40}{medicion['mediana_us']:>14}{medicion['min_us']:>14}"
+              f"{medicion['ops_por_segundo']:>14}  {comparacion}")
+
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as archivo:
+            json.dump({
+                "fecha": datetime.utcnow().isoformat(),
+                "python": platform.python_version(),
+                "plataforma": platform.platform(),
+                "versiones": {"pydantic": pydantic.VERSION, "fastapi": fastapi.__version__},
+                "resultados": resultados,
+            }, archivo, indent=2)
+        print(f"\n💾 Resultados guardados en {args.salida}")
+
+
+if __name__ == "__main__":
+    main()
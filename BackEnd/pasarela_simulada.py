@@ -0,0 +1,186 @@
+"""
+Pasarela de pago simulada: envía ráfagas de webhooks firmados a la API.
+
+Crea --pedidos pedidos con su pago pendiente y, para cada uno, una secuencia de
+eventos como la de una pasarela real: aprobado o rechazado y, a veces, un
+reembolso posterior. Todos los pedidos se disparan a la vez (la ráfaga); dentro
+de un pedido los eventos salen en orden. Además reenvía una fracción de los
+eventos (la pasarela reintenta) y manda algunos con firma inválida.
+
+Reporta la latencia del acuse (p50/p95/p99), espera a que la bandeja procese
+todo y verifica el estado final de cada pago y pedido. Termina con código 1 si
+alguno no quedó como se esperaba.
+
+La API debe tener configurado el mismo secreto (WEBHOOK_SECRETOS=webpay=...).
+Requiere httpx (pip install httpx).
+
+Ejecutar:
+    python pasarela_simulada.py --pedidos 500 --secreto secreto-local
+    python pasarela_simulada.py --pasarela mercadopago --reenvios 0.5 --reembolsos 0.2
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+import uuid
+from typing import Dict, List, Tuple
+
+import httpx
+
+from carga import percentil
+from core.webhooks import WEBHOOK_SECRETOS, firmar
+
+ESTADO_PEDIDO = {"aprobado": "confirmado", "rechazado": "pendiente", "reembolsado": "cancelado"}
+
+
+async def crear_pedido(cliente: httpx.AsyncClient, pasarela: str) -> Tuple[str, str]:
+    total = random.choice([5990, 7990, 9990, 12990])
+    pedido = (await cliente.post("/api/pedidos/", json={
+        "usuario_id": "pasarela-simulada", "subtotal": total, "total": total,
+    })).json()
+    pago = (await cliente.post("/api/pagos/", json={
+        "pedido_id": pedido["_id"], "pasarela": pasarela, "monto": total, "medio": "tarjeta_credito",
+    })).json()
+    return pedido["_id"], pago["_id"]
+
+
+def secuencia(pedido_id: str, pago_id: str, args) -> Tuple[List[dict], str]:
+    """Eventos de un pedido en orden y el estado final esperado del pago"""
+    creado = time.time()
+    if random.random() < args.rechazos:
+        tipos = ["pago.rechazado"]
+    else:
+        tipos = ["pago.aprobado"]
+        if random.random() < args.reembolsos:
+            tipos.append("pago.reembolsado")
+    eventos = []
+    for i, tipo in enumerate(tipos):
+        eventos.append({
+            "id": uuid.uuid4().hex,
+            "tipo": tipo,
+            "pedido_id": pedido_id,
+            "pago_id": pago_id,
+            "creado": creado + i * 0.001,
+        })
+    return eventos, tipos[-1].split(".", 1)[1]
+
+
+async def enviar(cliente: httpx.AsyncClient, args, evento: dict, latencias: List[float],
+                 estados: Dict[int, int], valida: bool = True):
+    cuerpo = json.dumps(evento).encode()
+    firma = firmar(args.secreto if valida else "firma-falsa", cuerpo)
+    inicio = time.perf_counter()
+    try:
+        respuesta = await cliente.post(
+            f"/api/webhooks/pagos/{args.pasarela}", content=cuerpo,
+            headers={"Content-Type": "application/json", "X-Webhook-Signature": firma},
+        )
+        estado = respuesta.status_code
+    except httpx.HTTPError:
+        estado = 0
+    latencias.append(time.perf_counter() - inicio)
+    estados[estado] = estados.get(estado, 0) + 1
+
+
+async def verificar(cliente: httpx.AsyncClient, esperados: Dict[str, Tuple[str, str]], espera: float) -> List[str]:
+    """Esperar a que la bandeja procese todo; devuelve los pagos que no quedaron como se esperaba"""
+    hasta = time.monotonic() + espera
+    pendientes = dict(esperados)
+    while pendientes and time.monotonic() < hasta:
+        for pago_id, (pedido_id, estado) in list(pendientes.items()):
+            pago = (await cliente.get(f"/api/pagos/{pago_id}")).json()
+            pedido = (await cliente.get(f"/api/pedidos/{pedido_id}")).json()
+            if pago.get("estado") == estado and pedido.get("estado") == ESTADO_PEDIDO[estado]:
+                del pendientes[pago_id]
+        if pendientes:
+            await asyncio.sleep(0.5)
+    return [
+        f"{pago_id}: se esperaba {estado} (pedido {ESTADO_PEDIDO[estado]})"
+        for pago_id, (_, estado) in pendientes.items()
+    ]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Pasarela de pago simulada (ráfagas de webhooks)")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--pasarela", default="webpay")
+    parser.add_argument("--secreto", help="Secreto compartido (por defecto el de WEBHOOK_SECRETOS)")
+    parser.add_argument("--pedidos", type=int, default=200)
+    parser.add_argument("--concurrencia", type=int, default=100, help="Conexiones simultáneas")
+    parser.add_argument("--rechazos", type=float, default=0.1, help="Fracción de pagos rechazados")
+    parser.add_argument("--reembolsos", type=float, default=0.1, help="Fracción de pagos aprobados y reembolsados")
+    parser.add_argument("--reenvios", type=float, default=0.2, help="Fracción de eventos que se envían dos veces")
+    parser.add_argument("--invalidas", type=int, default=5, help="Webhooks con firma inválida")
+    parser.add_argument("--espera", type=float, default=60, help="Segundos máximos para verificar el resultado")
+    parser.add_argument("--semilla", type=int, default=None)
+    args = parser.parse_args()
+
+    args.secreto = args.secreto or WEBHOOK_SECRETOS.get(args.pasarela)
+    if not args.secreto:
+        sys.exit(f"❌ Falta el secreto de {args.pasarela} (--secreto o WEBHOOK_SECRETOS)")
+    if args.semilla is not None:
+        random.seed(args.semilla)
+
+    limites = httpx.Limits(max_connections=args.concurrencia, max_keepalive_connections=args.concurrencia)
+    async with httpx.AsyncClient(base_url=args.url, limits=limites, timeout=30) as cliente:
+        print(f"🧾 Creando {args.pedidos} pedidos con pago pendiente en {args.url}...")
+        semaforo = asyncio.Semaphore(args.concurrencia)
+
+        async def crear():
+            async with semaforo:
+                return await crear_pedido(cliente, args.pasarela)
+
+        creados = await asyncio.gather(*(crear() for _ in range(args.pedidos)))
+
+        esperados: Dict[str, Tuple[str, str]] = {}
+        secuencias = []
+        for pedido_id, pago_id in creados:
+            eventos, final = secuencia(pedido_id, pago_id, args)
+            secuencias.append(eventos)
+            esperados[pago_id] = (pedido_id, final)
+
+        latencias: List[float] = []
+        estados: Dict[int, int] = {}
+
+        async def disparar(eventos: List[dict]):
+            for evento in eventos:
+                async with semaforo:
+                    await enviar(cliente, args, evento, latencias, estados)
+                if random.random() < args.reenvios:
+                    async with semaforo:
+                        await enviar(cliente, args, evento, latencias, estados)
+
+        async def falsos():
+            for _ in range(args.invalidas):
+                evento = random.choice(secuencias)[0]
+                async with semaforo:
+                    await enviar(cliente, args, dict(evento, tipo="pago.reembolsado"), latencias, estados, valida=False)
+
+        total = sum(len(eventos) for eventos in secuencias)
+        print(f"💥 Ráfaga de {total} eventos (+ reenvíos y {args.invalidas} con firma inválida)...")
+        inicio = time.perf_counter()
+        await asyncio.gather(*(disparar(eventos) for eventos in secuencias), falsos())
+        duracion = time.perf_counter() - inicio
+
+        ordenadas = sorted(latencias)
+        print(f"\n{'webhooks':<12}{'por s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        print(f"{len(ordenadas):<12}{len(ordenadas) / duracion:>10.1f}"
+              f"{percentil(ordenadas, 50) * 1000:>10.1f}{percentil(ordenadas, 95) * 1000:>10.1f}"
+              f"{percentil(ordenadas, 99) * 1000:>10.1f}")
+        print("Respuestas: " + ", ".join(f"{estado}={n}" for estado, n in sorted(estados.items())))
+
+        print("\n⏳ Esperando a que se procese la bandeja...")
+        errores = await verificar(cliente, esperados, args.espera)
+
+    if errores:
+        print(f"❌ {len(errores)} pagos no quedaron como se esperaba:")
+        for error in errores[:20]:
+            print(f"   {error}")
+        sys.exit(1)
+    print(f"✅ Los {len(esperados)} pagos y pedidos quedaron en el estado esperado")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
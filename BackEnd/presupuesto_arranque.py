@@ -0,0 +1,97 @@
+"""
+Presupuesto de tiempo de importación de la API (arranque en frío de un worker).
+
+Importa main en procesos nuevos con `python -X importtime`, toma la mediana
+del tiempo acumulado de `main` y falla (código de salida 1) si supera el
+presupuesto, de modo que sirve como chequeo en CI antes de un deploy. Además
+muestra los módulos que más pesan, separando el código propio (main,
+database, core, routers, models) de las dependencias.
+
+Con --reporte se guarda la salida cruda de importtime de la última corrida,
+que se puede abrir con herramientas como tuna.
+
+Ejecutar:
+    python presupuesto_arranque.py
+    python presupuesto_arranque.py --presupuesto-ms 700 --corridas 7
+    python presupuesto_arranque.py --reporte importtime.txt
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+PRESUPUESTO_MS = float(os.getenv("ARRANQUE_PRESUPUESTO_MS", "900"))
+PROPIOS = ("main", "database", "core", "routers", "models")
+
+
+def medir_importacion(modulo: str) -> Tuple[List[Tuple[int, int, int, str]], str]:
+    """Importar el módulo en un proceso nuevo y devolver (self_us, acumulado_us, nivel, nombre) por módulo"""
+    proceso = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {modulo}"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+    )
+    if proceso.returncode != 0:
+        sys.exit(f"❌ No se pudo importar {modulo}:\n{proceso.stderr[-2000:]}")
+
+    filas = []
+    for linea in proceso.stderr.splitlines():
+        if not linea.startswith("import time:") or "self [us]" in linea:
+            continue
+        propio, acumulado, nombre = linea[len("import time:"):].split("|")
+        nivel = (len(nombre) - len(nombre.lstrip())) // 2
+        filas.append((int(propio), int(acumulado), nivel, nombre.strip()))
+    return filas, proceso.stderr
+
+
+def es_propio(nombre: str) -> bool:
+    return nombre.split(".")[0] in PROPIOS
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Presupuesto de tiempo de importación de la API")
+    parser.add_argument("--modulo", default="main")
+    parser.add_argument("--presupuesto-ms", type=float, default=PRESUPUESTO_MS)
+    parser.add_argument("--corridas", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--reporte", help="Guardar la salida de -X importtime de la última corrida")
+    args = parser.parse_args()
+
+    totales = []
+    for _ in range(args.corridas):
+        filas, crudo = medir_importacion(args.modulo)
+        total = next(acumulado for _, acumulado, nivel, nombre in filas if nombre == args.modulo and nivel == 0)
+        totales.append(total / 1000)
+    mediana = statistics.median(totales)
+
+    if args.reporte:
+        with open(args.reporte, "w", encoding="utf-8") as archivo:
+            archivo.write(crudo)
+
+    # Peso por paquete de primer nivel (tiempo propio de todos sus módulos)
+    por_paquete: Dict[str, int] = {}
+    for propio, _, _, nombre in filas:
+        por_paquete[nombre.split(".")[0]] = por_paquete.get(nombre.split(".")[0], 0) + propio
+
+    print(f"⏱️  import {args.modulo}: mediana {mediana:.0f} ms en {args.corridas} corridas "
+          f"(min {min(totales):.0f}, max {max(totales):.0f}); presupuesto {args.presupuesto_ms:.0f} ms\n")
+    print(f"{'paquete':<32}{'ms':>10}")
+    for paquete, propio in sorted(por_paquete.items(), key=lambda p: -p[1])[:args.top]:
+        print(f"{paquete + (' *' if es_propio(paquete) else ''):<32}{propio / 1000:>10.1f}")
+
+    print(f"\n{'módulos propios más lentos':<40}{'propio ms':>12}{'acumulado ms':>14}")
+    propios = sorted((f for f in filas if es_propio(f[3])), key=lambda f: -f[1])
+    for propio, acumulado, _, nombre in propios[:args.top]:
+        print(f"{nombre:<40}{propio / 1000:>12.1f}{acumulado / 1000:>14.1f}")
+
+    if mediana > args.presupuesto_ms:
+        print(f"\n❌ El arranque en frío ({mediana:.0f} ms) supera el presupuesto de {args.presupuesto_ms:.0f} ms")
+        sys.exit(1)
+    print(f"\n✅ Dentro del presupuesto ({args.presupuesto_ms - mediana:.0f} ms de margen)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Replica set local de tres miembros para probar la preferencia de lectura.
+
+Levanta tres mongod (puertos 27017-27019 por defecto) con --replSet, inicia el
+replica set y espera a que haya primario y secundarios. Luego basta con
+apuntar la API al replica set:
+
+    MONGODB_URL=mongodb://127.0.0.1:27017,127.0.0.1:27018,127.0.0.1:27019/?replicaSet=rs0
+
+--verificar llama a una ruta de reporte y a una de checkout de la API en
+marcha y muestra, desde /metrics, qué miembro atendió los comandos
+(freshbowl_mongo_commands_by_member_total).
+
+Requiere mongod en el PATH (y httpx para --verificar).
+
+Ejecutar:
+    python replica_local.py --iniciar
+    python replica_local.py --verificar --url http://127.0.0.1:8000
+    python replica_local.py --detener
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import time
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import OperationFailure, PyMongoError
+
+NOMBRE_REPLICA = "rs0"
+
+
+def puertos(args) -> list:
+    return [args.puerto + i for i in range(3)]
+
+
+def url_replica(args) -> str:
+    miembros = ",".join(f"127.0.0.1:{p}" for p in puertos(args))
+    return f"mongodb://{miembros}/?replicaSet={NOMBRE_REPLICA}"
+
+
+def iniciar_procesos(args):
+    if shutil.which("mongod") is None:
+        sys.exit("❌ mongod no está en el PATH")
+    for puerto in puertos(args):
+        datos = os.path.join(args.directorio, str(puerto))
+        os.makedirs(datos, exist_ok=True)
+        subprocess.Popen(
+            ["mongod", "--replSet", NOMBRE_REPLICA, "--port", str(puerto), "--bind_ip", "127.0.0.1",
+             "--dbpath", datos, "--pidfilepath", os.path.join(datos, "mongod.pid"),
+             "--logpath", os.path.join(datos, "mongod.log")],
+            stdout=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+        print(f"▶️  mongod en el puerto {puerto} ({datos})")
+
+
+async def iniciar_replica(args):
+    primero = f"mongodb://127.0.0.1:{args.puerto}/?directConnection=true"
+    cliente = AsyncIOMotorClient(primero, serverSelectionTimeoutMS=30000)
+    try:
+        await cliente.admin.command("replSetInitiate", {
+            "_id": NOMBRE_REPLICA,
+            "members": [
+                # El primer miembro tiene más prioridad para que sea el primario
+                {"_id": i, "host": f"127.0.0.1:{puerto}", "priority": 2 if i == 0 else 1}
+                for i, puerto in enumerate(puertos(args))
+            ],
+        })
+    except OperationFailure as exc:
+        if exc.code != 23:  # AlreadyInitialized
+            raise
+    finally:
+        cliente.close()
+
+    cliente = AsyncIOMotorClient(url_replica(args), serverSelectionTimeoutMS=30000)
+    try:
+        limite = time.monotonic() + 60
+        while time.monotonic() < limite:
+            estado = await cliente.admin.command("replSetGetStatus")
+            roles = sorted(m["stateStr"] for m in estado["members"])
+            if roles == ["PRIMARY", "SECONDARY", "SECONDARY"]:
+                print(f"✅ Replica set {NOMBRE_REPLICA} listo")
+                print(f"   MONGODB_URL={url_replica(args)}")
+                return
+            await asyncio.sleep(1)
+        sys.exit(f"❌ El replica set no quedó listo: {roles}")
+    finally:
+        cliente.close()
+
+
+def detener(args):
+    for puerto in puertos(args):
+        archivo = os.path.join(args.directorio, str(puerto), "mongod.pid")
+        try:
+            with open(archivo) as pid:
+                os.kill(int(pid.read().strip()), signal.SIGTERM)
+            print(f"🛑 mongod del puerto {puerto} detenido")
+        except (OSError, ValueError):
+            print(f"⚠️  No hay mongod en el puerto {puerto}")
+
+
+async def verificar(args):
+    import httpx
+
+    async with httpx.AsyncClient(base_url=args.url, timeout=30) as cliente:
+        pedidos = (await cliente.get("/api/pedidos/", params={"limit": 1})).json()
+        for _ in range(args.peticiones):
+            # Reporte: secundario
+            await cliente.get("/api/pedidos/", params={"limit": 20})
+            # Estado del pedido (leer lo recién escrito): primario
+            if pedidos:
+                await cliente.get(f"/api/pedidos/{pedidos[0]['_id']}")
+        metricas = (await cliente.get("/metrics")).text
+
+    print(f"\n{'miembro':<22}{'rol':<14}{'comando':<12}{'comandos':>10}")
+    for linea in metricas.splitlines():
+        if linea.startswith("freshbowl_mongo_commands_by_member_total{"):
+            etiquetas, valor = linea.rsplit(" ", 1)
+            campos = dict(parte.split("=", 1) for parte in etiquetas[etiquetas.index("{") + 1:-1].split(","))
+            campos = {k: v.strip('"') for k, v in campos.items()}
+            if campos["command"] in ("find", "aggregate", "count"):
+                print(f"{campos['member']:<22}{campos['role']:<14}{campos['command']:<12}{float(valor):>10.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replica set local de tres miembros")
+    accion = parser.add_mutually_exclusive_group(required=True)
+    accion.add_argument("--iniciar", action="store_true")
+    accion.add_argument("--detener", action="store_true")
+    accion.add_argument("--verificar", action="store_true")
+    parser.add_argument("--puerto", type=int, default=27017, help="Puerto del primer miembro")
+    parser.add_argument("--directorio", default=os.path.join("datos", "replica"))
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="API para --verificar")
+    parser.add_argument("--peticiones", type=int, default=20)
+    args = parser.parse_args()
+
+    try:
+        if args.iniciar:
+            iniciar_procesos(args)
+            asyncio.run(iniciar_replica(args))
+        elif args.detener:
+            detener(args)
+        else:
+            asyncio.run(verificar(args))
+    except PyMongoError as exc:
+        sys.exit(f"❌ {exc}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Reporte de consultas lentas y auditoría de índices.
+
+Ejecutar:
+    python reporte_consultas.py              # formas lentas guardadas por la API
+    python reporte_consultas.py --auditar    # explain de cada forma de consulta de los routers
+
+La auditoría usa valores tomados de los documentos existentes, así que conviene
+correrla después de poblar la base (seed_data.py).
+"""
+import argparse
+import asyncio
+import os
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from core.consultas_lentas import COLECCION_CONSULTAS, explicar
+
+load_dotenv()
+
+MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
+DATABASE_NAME = os.getenv("DATABASE_NAME", "freshbowl")
+
+# Formas de consulta de los routers: (ruta, colección, campos del filtro, orden).
+# Los valores de cada campo se toman de un documento real de la colección.
+# Las búsquedas por _id se omiten: siempre usan el índice de _id.
+FORMAS_ROUTERS = [
+    ("GET /api/productos?categoria_id", "productos", ["categoria_id"], None),
+    ("GET /api/productos?categoria_id&activo", "productos", ["categoria_id", "activo"], None),
+    ("GET /api/productos?activo&agotado", "productos", ["activo", "agotado"], None),
+    ("GET /api/productos/{id}/variantes", "variantes", ["producto_id"], None),
+    ("GET /api/categorias?visible", "categorias", ["visible"], None),
+    ("GET /api/categorias/slug/{slug}", "categorias", ["slug"], None),
+    ("GET /api/ingredientes?adicional&disponible", "ingredientes", ["adicional", "disponible"], None),
+    ("GET /api/ingredientes/producto/{id}/ingredientes", "producto_ingredientes", ["producto_id"], None),
+    ("GET /api/carritos?usuario_id", "carritos", ["usuario_id"], None),
+    ("GET /api/carritos/usuario/{id}/activo", "carritos", ["usuario_id", "estado"], None),
+    ("GET /api/carritos/{id}/items", "carrito_items", ["carrito_id"], None),
+    ("GET /api/comprobantes?tipo", "comprobantes", ["tipo"], None),
+    ("GET /api/comprobantes/pedido/{id}", "comprobantes", ["pedido_id"], None),
+    ("GET /api/comprobantes/numero/{numero}", "comprobantes", ["numero"], None),
+    ("GET /api/cupones?activo", "cupones", ["activo"], None),
+    ("GET /api/cupones/codigo/{codigo}", "cupones", ["codigo"], None),
+    ("GET /api/direcciones?usuario_id", "direcciones", ["usuario_id"], None),
+    ("GET /api/direcciones/usuario/{id}/favorita", "direcciones", ["usuario_id", "favorita"], None),
+    ("GET /api/envios?estado", "envios", ["estado"], None),
+    ("GET /api/envios/tracking/{tracking}", "envios", ["tracking"], None),
+    ("GET /api/notificaciones?usuario_id&estado", "notificaciones", ["usuario_id", "estado"], None),
+    ("GET /api/pagos?pedido_id", "pagos", ["pedido_id"], None),
+    ("GET /api/pagos?estado", "pagos", ["estado"], None),
+    ("GET /api/pedidos", "pedidos", [], [("creado_en", -1)]),
+    ("GET /api/pedidos?estado", "pedidos", ["estado"], [("creado_en", -1)]),
+    ("GET /api/pedidos/usuario/{id}/historial", "pedidos", ["usuario_id"], [("creado_en", -1)]),
+    ("GET /api/pedidos/{id}/items", "pedido_items", ["pedido_id"], None),
+    ("GET /api/roles/usuario/{id}", "usuario_roles", ["usuario_id"], None),
+    ("POST /api/roles/asignar", "usuario_roles", ["usuario_id", "rol_id"], None),
+    ("POST /api/usuarios/login", "usuarios", ["email"], None),
+    ("GET /api/sync?since", "catalogo_cambios", ["seq"], [("seq", 1)]),
+]
+
+
+async def reporte(db, limite: int):
+    print(f"🐢 Consultas lentas guardadas ({COLECCION_CONSULTAS})\n")
+    consultas = await db[COLECCION_CONSULTAS].find().sort("total_ms", -1).limit(limite).to_list(length=limite)
+    if not consultas:
+        print("   Sin registros. ¿La API corrió con CONSULTA_LENTA_MS configurado?")
+        return
+
+    for consulta in consultas:
+        promedio = consulta["total_ms"] / max(consulta["conteo"], 1)
+        explain = consulta.get("explain") or {}
+        alertas = ", ".join(explain.get("alertas", [])) or "-"
+        print(f"• {consulta['coleccion']}.{consulta['comando']}  {consulta['forma']}")
+        print(
+            f"   conteo={consulta['conteo']}  total={consulta['total_ms']:.0f}ms  "
+            f"promedio={promedio:.1f}ms  max={consulta['max_ms']:.0f}ms  alertas={alertas}"
+        )
+        if explain.get("etapas"):
+            print(
+                f"   plan={'/'.join(explain['etapas'])}  examinados={explain['docs_examinados']}  "
+                f"devueltos={explain['devueltos']}  ratio={explain['ratio']}"
+            )
+
+
+async def auditar(db):
+    print("🔎 Auditoría de índices por forma de consulta\n")
+    sin_indice = 0
+    for ruta, coleccion, campos, orden in FORMAS_ROUTERS:
+        muestra = await db[coleccion].find_one() or {}
+        filtro = {campo: muestra.get(campo) for campo in campos}
+        if coleccion == "catalogo_cambios":
+            filtro = {"seq": {"$gt": muestra.get("seq", 0)}}
+
+        comando = {"find": coleccion, "filter": filtro}
+        if orden:
+            comando["sort"] = dict(orden)
+        try:
+            analisis = await explicar(db, "find", comando)
+        except Exception as exc:
+            print(f"   ⚠️  {ruta}: {exc}")
+            continue
+
+        if analisis["alertas"]:
+            sin_indice += 1
+        marca = "❌" if analisis["alertas"] else "✅"
+        vacia = "" if muestra else "  (colección vacía)"
+        print(
+            f"{marca} {ruta:<48} {'/'.join(analisis['etapas']):<28} "
+            f"examinados={analisis['docs_examinados']:<6} devueltos={analisis['devueltos']:<6} "
+            f"{' '.join(analisis['alertas'])}{vacia}"
+        )
+
+    print(f"\n📊 {sin_indice} de {len(FORMAS_ROUTERS)} formas sin un índice adecuado")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Reporte de consultas lentas")
+    parser.add_argument("--auditar", action="store_true", help="Ejecutar explain de cada forma de consulta de los routers")
+    parser.add_argument("--limite", type=int, default=30, help="Cantidad de formas a mostrar en el reporte")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(MONGODB_URL)
+    db = client[DATABASE_NAME]
+    try:
+        if args.auditar:
+            await auditar(db)
+        else:
+            await reporte(db, args.limite)
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
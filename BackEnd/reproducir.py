@@ -0,0 +1,237 @@
+"""
+Reproduce tráfico capturado (CAPTURA_ACTIVA=true) contra otra instancia.
+
+Las peticiones se envían respetando los tiempos originales, a la velocidad
+pedida (--velocidad 1 = tiempo real, 5 = cinco veces más rápido, 0 = lo más
+rápido posible). Los IDs se remapean: cuando una alta capturada devolvió un
+_id y su reproducción devuelve otro, ese ID se reemplaza en el path, la query
+y el cuerpo de las peticiones siguientes (que esperan a que el alta termine).
+Los IDs que no se crearon durante la captura se envían tal cual, así que
+conviene reproducir sobre una copia de la base de origen.
+
+El resultado por ruta (p50/p95/p99, errores, latencia original) se puede
+guardar en JSON; --comparar muestra la diferencia entre dos corridas, por
+ejemplo la misma captura contra dos builds.
+
+Requiere httpx (pip install httpx).
+
+Ejecutar:
+    python reproducir.py capturas/*.ndjson --url http://staging:8000 --velocidad 2 --salida build_a.json
+    python reproducir.py --comparar build_a.json build_b.json
+"""
+import argparse
+import asyncio
+import glob
+import json
+import re
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List
+
+import httpx
+
+_OBJECT_ID = re.compile(r"\b[0-9a-f]{24}\b")
+# Tiempo máximo que una petición espera el alta de la que depende
+ESPERA_DEPENDENCIA = 30
+
+
+def percentil(ordenados: List[float], p: float) -> float:
+    if not ordenados:
+        return 0.0
+    indice = min(len(ordenados) - 1, max(0, round(p / 100 * len(ordenados)) - 1))
+    return ordenados[indice]
+
+
+def cargar(patrones: List[str]) -> List[dict]:
+    registros = []
+    for patron in patrones:
+        for ruta in sorted(glob.glob(patron)):
+            with open(ruta, encoding="utf-8") as archivo:
+                registros.extend(json.loads(linea) for linea in archivo if linea.strip())
+    registros.sort(key=lambda r: r["ts"])
+    return registros
+
+
+class Reproductor:
+    def __init__(self, cliente: httpx.AsyncClient, args):
+        self.cliente = cliente
+        self.args = args
+        # ID capturado -> ID creado en esta reproducción
+        self.mapa: Dict[str, str] = {}
+        # Altas en curso: quien use su ID espera a que terminen
+        self.altas: Dict[str, asyncio.Event] = {}
+        self.latencias: Dict[str, List[float]] = defaultdict(list)
+        self.originales: Dict[str, List[float]] = defaultdict(list)
+        self.errores: Dict[str, int] = defaultdict(int)
+        self.diferencias_estado: Dict[str, int] = defaultdict(int)
+        self._semaforo = asyncio.Semaphore(args.concurrencia)
+
+    def _remapear(self, valor):
+        if isinstance(valor, str):
+            return _OBJECT_ID.sub(lambda m: self.mapa.get(m.group(0), m.group(0)), valor)
+        if isinstance(valor, list):
+            return [self._remapear(v) for v in valor]
+        if isinstance(valor, dict):
+            return {k: self._remapear(v) for k, v in valor.items()}
+        return valor
+
+    async def _esperar_dependencias(self, registro: dict):
+        texto = json.dumps([registro["path"], registro["query"], registro["cuerpo"]])
+        for id_capturado in set(_OBJECT_ID.findall(texto)):
+            evento = self.altas.get(id_capturado)
+            if evento is not None and not evento.is_set():
+                try:
+                    await asyncio.wait_for(evento.wait(), ESPERA_DEPENDENCIA)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def enviar(self, registro: dict):
+        clave = f"{registro['metodo']} {registro['ruta'] or 'sin_ruta'}"
+        try:
+            await self._esperar_dependencias(registro)
+            kwargs = {"params": self._remapear(registro["query"])}
+            if registro["cuerpo"] is not None:
+                kwargs["json"] = self._remapear(registro["cuerpo"])
+            async with self._semaforo:
+                inicio = time.perf_counter()
+                try:
+                    respuesta = await self.cliente.request(
+                        registro["metodo"], self._remapear(registro["path"]), **kwargs
+                    )
+                except httpx.HTTPError:
+                    respuesta = None
+                duracion = time.perf_counter() - inicio
+
+            self.latencias[clave].append(duracion)
+            self.originales[clave].append(registro["duracion_ms"] / 1000)
+            if respuesta is None or respuesta.status_code >= 500:
+                self.errores[clave] += 1
+            elif respuesta.status_code != registro["estado"]:
+                self.diferencias_estado[clave] += 1
+
+            if registro.get("id_creado") and respuesta is not None and respuesta.status_code < 300:
+                try:
+                    nuevo = respuesta.json().get("_id")
+                except (ValueError, AttributeError):
+                    nuevo = None
+                if isinstance(nuevo, str):
+                    self.mapa[registro["id_creado"]] = nuevo
+        finally:
+            evento = self.altas.get(registro.get("id_creado") or "")
+            if evento is not None:
+                evento.set()
+
+    async def reproducir(self, registros: List[dict]):
+        if not registros:
+            return
+        inicio_captura = registros[0]["ts"]
+        inicio = time.perf_counter()
+        tareas = []
+        for registro in registros:
+            if self.args.solo_lectura and registro["metodo"] != "GET":
+                continue
+            if self.args.velocidad > 0:
+                objetivo = (registro["ts"] - inicio_captura) / self.args.velocidad
+                espera = objetivo - (time.perf_counter() - inicio)
+                if espera > 0:
+                    await asyncio.sleep(espera)
+            if registro.get("id_creado"):
+                self.altas[registro["id_creado"]] = asyncio.Event()
+            tareas.append(asyncio.create_task(self.enviar(registro)))
+        await asyncio.gather(*tareas)
+
+    def resumen(self, duracion: float) -> dict:
+        rutas = {}
+        for clave, valores in sorted(self.latencias.items()):
+            ordenados = sorted(valores)
+            originales = sorted(self.originales[clave])
+            rutas[clave] = {
+                "peticiones": len(ordenados),
+                "errores": self.errores.get(clave, 0),
+                "estado_distinto": self.diferencias_estado.get(clave, 0),
+                "p50_ms": round(percentil(ordenados, 50) * 1000, 1),
+                "p95_ms": round(percentil(ordenados, 95) * 1000, 1),
+                "p99_ms": round(percentil(ordenados, 99) * 1000, 1),
+                "original_p95_ms": round(percentil(originales, 95) * 1000, 1),
+            }
+        return {
+            "fecha": datetime.utcnow().isoformat(),
+            "url": self.args.url,
+            "velocidad": self.args.velocidad,
+            "duracion_s": round(duracion, 1),
+            "peticiones": sum(len(v) for v in self.latencias.values()),
+            "ids_remapeados": len(self.mapa),
+            "rutas": rutas,
+        }
+
+
+def imprimir(resumen: dict):
+    print(f"\n📊 {resumen['peticiones']} peticiones en {resumen['duracion_s']} s "
+          f"({resumen['ids_remapeados']} IDs remapeados)\n")
+    print(f"{'ruta':<48}{'n':>7}{'err':>6}{'≠est':>6}{'p50':>9}{'p95':>9}{'p99':>9}{'orig p95':>10}")
+    for clave, datos in resumen["rutas"].items():
+        print(f"{clave:<48}{datos['peticiones']:>7}{datos['errores']:>6}{datos['estado_distinto']:>6}"
+              f"{datos['p50_ms']:>9}{datos['p95_ms']:>9}{datos['p99_ms']:>9}{datos['original_p95_ms']:>10}")
+
+
+def comparar(ruta_a: str, ruta_b: str):
+    with open(ruta_a, encoding="utf-8") as archivo:
+        a = json.load(archivo)["rutas"]
+    with open(ruta_b, encoding="utf-8") as archivo:
+        b = json.load(archivo)["rutas"]
+
+    print(f"{'ruta':<48}{'p50 A':>9}{'p50 B':>9}{'Δp50':>8}{'p95 A':>9}{'p95 B':>9}{'Δp95':>8}")
+    filas = []
+    for clave in sorted(set(a) & set(b)):
+        cambio = b[clave]["p95_ms"] / a[clave]["p95_ms"] - 1 if a[clave]["p95_ms"] else 0.0
+        filas.append((cambio, clave))
+    # Primero lo que más empeoró
+    for cambio, clave in sorted(filas, reverse=True):
+        ra, rb = a[clave], b[clave]
+        cambio_p50 = rb["p50_ms"] / ra["p50_ms"] - 1 if ra["p50_ms"] else 0.0
+        print(f"{clave:<48}{ra['p50_ms']:>9}{rb['p50_ms']:>9}{cambio_p50:>+8.0%}"
+              f"{ra['p95_ms']:>9}{rb['p95_ms']:>9}{cambio:>+8.0%}")
+    for clave in sorted(set(a) ^ set(b)):
+        print(f"{clave:<48}  solo en {'A' if clave in a else 'B'}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Reproducir tráfico capturado")
+    parser.add_argument("archivos", nargs="*", help="Archivos NDJSON de captura (admite comodines)")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--velocidad", type=float, default=1.0, help="1 = tiempo real, N = N veces más rápido, 0 = sin pausas")
+    parser.add_argument("--concurrencia", type=int, default=200, help="Máximo de peticiones en vuelo")
+    parser.add_argument("--solo-lectura", action="store_true", help="Reproducir solo los GET")
+    parser.add_argument("--salida", help="Guardar el resumen por ruta en un archivo JSON")
+    parser.add_argument("--comparar", nargs=2, metavar=("A", "B"), help="Comparar dos resúmenes guardados")
+    args = parser.parse_args()
+
+    if args.comparar:
+        comparar(*args.comparar)
+        return
+
+    registros = cargar(args.archivos)
+    if not registros:
+        sys.exit("❌ No hay registros de captura")
+    duracion_captura = registros[-1]["ts"] - registros[0]["ts"]
+    print(f"▶️  {len(registros)} peticiones capturadas en {duracion_captura:.0f} s, "
+          f"reproduciendo contra {args.url} a {args.velocidad or 'máxima'}x")
+
+    limites = httpx.Limits(max_connections=args.concurrencia)
+    async with httpx.AsyncClient(base_url=args.url, limits=limites, timeout=30) as cliente:
+        reproductor = Reproductor(cliente, args)
+        inicio = time.perf_counter()
+        await reproductor.reproducir(registros)
+        resumen = reproductor.resumen(time.perf_counter() - inicio)
+
+    imprimir(resumen)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as archivo:
+            json.dump(resumen, archivo, indent=2)
+        print(f"\n💾 Resumen guardado en {args.salida}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,132 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse
+from core.admin import requerir_admin
+from core.coalescencia import estadisticas_coalescencia
+from core.escritura_diferida import escritura_diferida
+from core.consultas_lentas import registro_consultas, CONSULTA_LENTA_MS
+from core.perfilado import listar_perfiles, leer_perfil
+from core.memoria import perfil_memoria, MEMORIA_FRAMES
+from core.bloqueos import vigilante, BLOQUEO_UMBRAL
+from core.swr import estadisticas_swr
+from database import caches, invalidar_cache
+
+router = APIRouter(dependencies=[Depends(requerir_admin)])
+
+# ============= CACHÉ =============
+
+@router.get("/cache")
+async def get_estadisticas_cache():
+    """Obtener hits, misses y evictions de la caché por _id de cada colección"""
+    return {nombre: cache.estadisticas() for nombre, cache in caches.items()}
+
+@router.delete("/cache/{coleccion}", status_code=status.HTTP_204_NO_CONTENT)
+async def limpiar_cache(coleccion: str):
+    """Vaciar la caché por _id de una colección"""
+    if coleccion not in caches:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Colección sin caché")
+    
+    invalidar_cache(coleccion)
+    return None
+
+# ============= COALESCENCIA =============
+
+@router.get("/coalescencia")
+async def get_estadisticas_coalescencia():
+    """Obtener cuántas consultas se ejecutaron y cuántas se ahorraron por ruta"""
+    return estadisticas_coalescencia.resumen()
+
+# ============= ESCRITURA DIFERIDA =============
+
+@router.get("/escrituras-diferidas")
+async def get_escrituras_diferidas():
+    """Obtener los documentos con actualizaciones pendientes de escribir por colección"""
+    return escritura_diferida.resumen()
+
+# ============= MODO DEGRADADO =============
+
+@router.get("/degradado")
+async def get_estado_degradado():
+    """Obtener el estado del circuit breaker y cuántas copias stale se sirvieron"""
+    return estadisticas_swr.resumen()
+
+# ============= CONSULTAS LENTAS =============
+
+@router.get("/consultas-lentas")
+async def get_consultas_lentas(limite: int = Query(50, ge=1, le=500)):
+    """Obtener las formas de consulta más lentas de este proceso, con su explain"""
+    return {
+        "umbral_ms": CONSULTA_LENTA_MS,
+        "consultas": registro_consultas.resumen(limite),
+    }
+
+@router.delete("/consultas-lentas", status_code=status.HTTP_204_NO_CONTENT)
+async def reiniciar_consultas_lentas():
+    """Vaciar el registro en memoria de consultas lentas (lo ya guardado se conserva)"""
+    registro_consultas.reiniciar()
+    return None
+
+# ============= PERFILES DE CPU =============
+
+@router.get("/perfiles")
+async def get_perfiles():
+    """Listar los perfiles de CPU guardados (más recientes primero)"""
+    return listar_perfiles()
+
+@router.get("/perfiles/{perfil_id}", response_class=PlainTextResponse)
+async def get_perfil(perfil_id: str):
+    """Descargar un perfil en formato de pilas colapsadas (speedscope / flamegraph.pl)"""
+    contenido = leer_perfil(perfil_id)
+    if contenido is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Perfil no encontrado")
+    return contenido
+
+# ============= MEMORIA =============
+
+@router.get("/memoria")
+async def get_memoria():
+    """Obtener RSS, estado de tracemalloc, snapshots guardados y memoria por ruta"""
+    return perfil_memoria.estado()
+
+@router.post("/memoria/tracemalloc", status_code=status.HTTP_204_NO_CONTENT)
+async def activar_tracemalloc(frames: int = Query(MEMORIA_FRAMES, ge=1, le=50)):
+    """Activar tracemalloc (agrega costo a cada asignación mientras esté activo)"""
+    perfil_memoria.iniciar_tracemalloc(frames)
+    return None
+
+@router.delete("/memoria/tracemalloc", status_code=status.HTTP_204_NO_CONTENT)
+async def desactivar_tracemalloc():
+    """Desactivar tracemalloc y descartar snapshots y estadísticas por ruta"""
+    perfil_memoria.detener_tracemalloc()
+    return None
+
+@router.post("/memoria/snapshots")
+async def tomar_snapshot(limite: int = Query(20, ge=1, le=200)):
+    """Tomar un snapshot y devolver los principales sitios de asignación"""
+    try:
+        return await perfil_memoria.tomar_snapshot(limite)
+    except RuntimeError as exc:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(exc))
+
+@router.get("/memoria/diff")
+async def get_diferencia_memoria(
+    desde: Optional[int] = None,
+    hasta: Optional[int] = None,
+    agrupar: str = Query("lineno", pattern="^(lineno|filename|traceback)$"),
+    limite: int = Query(20, ge=1, le=200)
+):
+    """Comparar dos snapshots (por defecto los dos últimos) por línea o por módulo"""
+    try:
+        return await perfil_memoria.diferencia(desde, hasta, agrupar, limite)
+    except LookupError as exc:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(exc))
+
+# ============= BLOQUEOS DEL EVENT LOOP =============
+
+@router.get("/bloqueos")
+async def get_bloqueos():
+    """Obtener los últimos bloqueos del event loop con la pila y la ruta responsable"""
+    return {
+        "umbral_ms": BLOQUEO_UMBRAL * 1000,
+        "bloqueos": list(reversed(vigilante.historial)),
+    }
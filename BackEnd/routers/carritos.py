@@ -5,11 +5,23 @@ from models.carrito import (
     CarritoCreate, CarritoUpdate, CarritoResponse,
     CarritoItemCreate, CarritoItemUpdate, CarritoItemResponse
 )
-from database import get_collection
+from database import get_collection, find_by_id, invalidar_cache
+from core.escritura_diferida import escritura_diferida
 from datetime import datetime
 
 router = APIRouter()
 
+def serialize_doc(doc):
+    """Convertir ObjectId a string para serialización"""
+    if doc is None:
+        return None
+    doc["_id"] = str(doc["_id"])
+    return doc
+
+def serialize_docs(docs):
+    """Convertir lista de documentos"""
+    return [serialize_doc(doc) for doc in docs]
+
 # ============= CARRITOS =============
 
 @router.post("/", response_model=CarritoResponse, status_code=status.HTTP_201_CREATED)
@@ -23,7 +35,7 @@ async def create_carrito(carrito: CarritoCreate):
     result = await collection.insert_one(carrito_dict)
     created_carrito = await collection.find_one({"_id": result.inserted_id})
     
-    return created_carrito
+    return serialize_doc(created_carrito)
 
 @router.get("/", response_model=List[CarritoResponse])
 async def get_carritos(skip: int = 0, limit: int = 100, usuario_id: Optional[str] = None):
@@ -35,7 +47,7 @@ async def get_carritos(skip: int = 0, limit: int = 100, usuario_id: Optional[str
         query["usuario_id"] = usuario_id
     
     carritos = await collection.find(query).skip(skip).limit(limit).to_list(length=limit)
-    return carritos
+    return serialize_docs(carritos)
 
 @router.get("/{carrito_id}", response_model=CarritoResponse)
 async def get_carrito(carrito_id: str):
@@ -49,7 +61,7 @@ async def get_carrito(carrito_id: str):
     if not carrito:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Carrito no encontrado")
     
-    return carrito
+    return serialize_doc(carrito)
 
 @router.get("/usuario/{usuario_id}/activo", response_model=CarritoResponse)
 async def get_carrito_activo_usuario(usuario_id: str):
@@ -64,7 +76,7 @@ async def get_carrito_activo_usuario(usuario_id: str):
     if not carrito:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Carrito activo no encontrado")
     
-    return carrito
+    return serialize_doc(carrito)
 
 @router.put("/{carrito_id}", response_model=CarritoResponse)
 async def update_carrito(carrito_id: str, carrito: CarritoUpdate):
@@ -84,12 +96,13 @@ async def update_carrito(carrito_id: str, carrito: CarritoUpdate):
         {"_id": ObjectId(carrito_id)},
         {"$set": update_data}
     )
+    invalidar_cache("carritos", carrito_id)
     
     if result.modified_count == 0:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Carrito no encontrado")
     
     updated_carrito = await collection.find_one({"_id": ObjectId(carrito_id)})
-    return updated_carrito
+    return serialize_doc(updated_carrito)
 
 @router.delete("/{carrito_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_carrito(carrito_id: str):
@@ -100,6 +113,7 @@ async def delete_carrito(carrito_id: str):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="ID inválido")
     
     result = await collection.delete_one({"_id": ObjectId(carrito_id)})
+    invalidar_cache("carritos", carrito_id)
     
     if result.deleted_count == 0:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Carrito no encontrado")
@@ -112,13 +126,12 @@ async def delete_carrito(carrito_id: str):
 async def add_item_carrito(carrito_id: str, item: CarritoItemCreate):
     """Agregar un item al carrito"""
     items_collection = get_collection("carrito_items")
-    carritos_collection = get_collection("carritos")
     
     # Verificar que el carrito existe
     if not ObjectId.is_valid(carrito_id):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="ID de carrito inválido")
     
-    carrito = await carritos_collection.find_one({"_id": ObjectId(carrito_id)})
+    carrito = await find_by_id("carritos", carrito_id)
     if not carrito:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Carrito no encontrado")
     
@@ -128,13 +141,10 @@ async def add_item_carrito(carrito_id: str, item: CarritoItemCreate):
     result = await items_collection.insert_one(item_dict)
     created_item = await items_collection.find_one({"_id": result.inserted_id})
     
-    # Actualizar timestamp del carrito
-    await carritos_collection.update_one(
-        {"_id": ObjectId(carrito_id)},
-        {"$set": {"actualizado_en": datetime.utcnow()}}
-    )
+    # Actualizar timestamp del carrito (diferido: se agrupa con los demás toques)
+    escritura_diferida.actualizar("carritos", ObjectId(carrito_id), {"$max": {"actualizado_en": datetime.utcnow()}})
     
-    return created_item
+    return serialize_doc(created_item)
 
 @router.get("/{carrito_id}/items", response_model=List[CarritoItemResponse])
 async def get_items_carrito(carrito_id: str):
@@ -142,7 +152,7 @@ async def get_items_carrito(carrito_id: str):
     collection = get_collection("carrito_items")
     
     items = await collection.find({"carrito_id": carrito_id}).to_list(length=100)
-    return items
+    return serialize_docs(items)
 
 @router.put("/items/{item_id}", response_model=CarritoItemResponse)
 async def update_item_carrito(item_id: str, item: CarritoItemUpdate):
@@ -167,14 +177,10 @@ async def update_item_carrito(item_id: str, item: CarritoItemUpdate):
     
     updated_item = await collection.find_one({"_id": ObjectId(item_id)})
     
-    # Actualizar timestamp del carrito
-    carritos_collection = get_collection("carritos")
-    await carritos_collection.update_one(
-        {"_id": ObjectId(updated_item["carrito_id"])},
-        {"$set": {"actualizado_en": datetime.utcnow()}}
-    )
+    # Actualizar timestamp del carrito (diferido: se agrupa con los demás toques)
+    escritura_diferida.actualizar("carritos", ObjectId(updated_item["carrito_id"]), {"$max": {"actualizado_en": datetime.utcnow()}})
     
-    return updated_item
+    return serialize_doc(updated_item)
 
 @router.delete("/items/{item_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_item_carrito(item_id: str):
@@ -191,11 +197,7 @@ async def delete_item_carrito(item_id: str):
     
     result = await collection.delete_one({"_id": ObjectId(item_id)})
     
-    # Actualizar timestamp del carrito
-    carritos_collection = get_collection("carritos")
-    await carritos_collection.update_one(
-        {"_id": ObjectId(item["carrito_id"])},
-        {"$set": {"actualizado_en": datetime.utcnow()}}
-    )
+    # Actualizar timestamp del carrito (diferido: se agrupa con los demás toques)
+    escritura_diferida.actualizar("carritos", ObjectId(item["carrito_id"]), {"$max": {"actualizado_en": datetime.utcnow()}})
     
     return None
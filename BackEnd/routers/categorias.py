@@ -2,7 +2,8 @@ from fastapi import APIRouter, HTTPException, status
 from typing import List
 from bson import ObjectId
 from models.categoria import CategoriaCreate, CategoriaUpdate, CategoriaResponse
-from database import get_collection
+from database import get_collection, find_by_id
+from core.catalogo import registrar_cambio
 
 router = APIRouter()
 
@@ -25,6 +26,7 @@ async def create_categoria(categoria: CategoriaCreate):
     categoria_dict = categoria.dict()
     result = await collection.insert_one(categoria_dict)
     created_categoria = await collection.find_one({"_id": result.inserted_id})
+    await registrar_cambio("categorias", str(result.inserted_id))
     
     return serialize_doc(created_categoria)
 
@@ -43,12 +45,10 @@ async def get_categorias(skip: int = 0, limit: int = 100, visible: bool = None):
 @router.get("/{categoria_id}", response_model=CategoriaResponse)
 async def get_categoria(categoria_id: str):
     """Obtener una categoría por ID"""
-    collection = get_collection("categorias")
-    
     if not ObjectId.is_valid(categoria_id):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="ID inválido")
     
-    categoria = await collection.find_one({"_id": ObjectId(categoria_id)})
+    categoria = await find_by_id("categorias", categoria_id)
     if not categoria:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Categoría no encontrada")
     
@@ -87,6 +87,7 @@ async def update_categoria(categoria_id: str, categoria: CategoriaUpdate):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Categoría no encontrada")
     
     updated_categoria = await collection.find_one({"_id": ObjectId(categoria_id)})
+    await registrar_cambio("categorias", categoria_id)
     return updated_categoria
 
 @router.delete("/{categoria_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -102,4 +103,5 @@ async def delete_categoria(categoria_id: str):
     if result.deleted_count == 0:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Categoría no encontrada")
     
+    await registrar_cambio("categorias", categoria_id, "delete")
     return None
@@ -6,6 +6,17 @@ from database import get_collection
 
 router = APIRouter()
 
+def serialize_doc(doc):
+    """Convertir ObjectId a string para serialización"""
+    if doc is None:
+        return None
+    doc["_id"] = str(doc["_id"])
+    return doc
+
+def serialize_docs(docs):
+    """Convertir lista de documentos"""
+    return [serialize_doc(doc) for doc in docs]
+
 @router.post("/", response_model=EnvioResponse, status_code=status.HTTP_201_CREATED)
 async def create_envio(envio: EnvioCreate):
     """Crear un nuevo envío"""
@@ -15,7 +26,7 @@ async def create_envio(envio: EnvioCreate):
     result = await collection.insert_one(envio_dict)
     created_envio = await collection.find_one({"_id": result.inserted_id})
     
-    return created_envio
+    return serialize_doc(created_envio)
 
 @router.get("/", response_model=List[EnvioResponse])
 async def get_envios(skip: int = 0, limit: int = 100, estado: str = None):
@@ -27,7 +38,7 @@ async def get_envios(skip: int = 0, limit: int = 100, estado: str = None):
         query["estado"] = estado
     
     envios = await collection.find(query).skip(skip).limit(limit).to_list(length=limit)
-    return envios
+    return serialize_docs(envios)
 
 @router.get("/{envio_id}", response_model=EnvioResponse)
 async def get_envio(envio_id: str):
@@ -41,7 +52,7 @@ async def get_envio(envio_id: str):
     if not envio:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Envío no encontrado")
     
-    return envio
+    return serialize_doc(envio)
 
 @router.get("/tracking/{tracking}", response_model=EnvioResponse)
 async def get_envio_by_tracking(tracking: str):
@@ -52,7 +63,7 @@ async def get_envio_by_tracking(tracking: str):
     if not envio:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Envío no encontrado")
     
-    return envio
+    return serialize_doc(envio)
 
 @router.put("/{envio_id}", response_model=EnvioResponse)
 async def update_envio(envio_id: str, envio: EnvioUpdate):
@@ -76,7 +87,7 @@ async def update_envio(envio_id: str, envio: EnvioUpdate):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Envío no encontrado")
     
     updated_envio = await collection.find_one({"_id": ObjectId(envio_id)})
-    return updated_envio
+    return serialize_doc(updated_envio)
 
 @router.post("/{envio_id}/actualizar-estado")
 async def actualizar_estado_envio(envio_id: str, estado: str):
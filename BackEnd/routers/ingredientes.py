@@ -5,7 +5,8 @@ from models.ingrediente import (
     IngredienteCreate, IngredienteUpdate, IngredienteResponse,
     ProductoIngredienteCreate, ProductoIngredienteResponse
 )
-from database import get_collection
+from database import get_collection, find_by_id
+from core.catalogo import registrar_cambio
 
 router = APIRouter()
 
@@ -26,6 +27,7 @@ async def create_ingrediente(ingrediente: IngredienteCreate):
     ingrediente_dict = ingrediente.model_dump()
     result = await collection.insert_one(ingrediente_dict)
     created_ingrediente = await collection.find_one({"_id": result.inserted_id})
+    await registrar_cambio("ingredientes", str(result.inserted_id))
     
     return serialize_doc(created_ingrediente)
 
@@ -74,12 +76,10 @@ async def get_alertas_stock():
 @router.get("/{ingrediente_id}", response_model=dict)
 async def get_ingrediente(ingrediente_id: str):
     """Obtener un ingrediente por ID"""
-    collection = get_collection("ingredientes")
-    
     if not ObjectId.is_valid(ingrediente_id):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="ID inválido")
     
-    ingrediente = await collection.find_one({"_id": ObjectId(ingrediente_id)})
+    ingrediente = await find_by_id("ingredientes", ingrediente_id)
     if not ingrediente:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Ingrediente no encontrado")
     
@@ -109,6 +109,7 @@ async def update_ingrediente(ingrediente_id: str, ingrediente: IngredienteUpdate
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Ingrediente no encontrado")
     
     updated_ingrediente = await collection.find_one({"_id": ObjectId(ingrediente_id)})
+    await registrar_cambio("ingredientes", ingrediente_id)
     return serialize_doc(updated_ingrediente)
 
 @router.delete("/{ingrediente_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -124,6 +125,7 @@ async def delete_ingrediente(ingrediente_id: str):
     if result.deleted_count == 0:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Ingrediente no encontrado")
     
+    await registrar_cambio("ingredientes", ingrediente_id, "delete")
     return None
 
 # ============= PRODUCTO-INGREDIENTE =============
@@ -134,11 +136,8 @@ async def create_producto_ingrediente(relacion: ProductoIngredienteCreate):
     collection = get_collection("producto_ingredientes")
     
     # Verificar que producto e ingrediente existen
-    productos_collection = get_collection("productos")
-    ingredientes_collection = get_collection("ingredientes")
-    
     if ObjectId.is_valid(relacion.producto_id):
-        producto = await productos_collection.find_one({"_id": ObjectId(relacion.producto_id)})
+        producto = await find_by_id("productos", relacion.producto_id)
     else:
         producto = None
     
@@ -146,7 +145,7 @@ async def create_producto_ingrediente(relacion: ProductoIngredienteCreate):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Producto no encontrado")
     
     if ObjectId.is_valid(relacion.ingrediente_id):
-        ingrediente = await ingredientes_collection.find_one({"_id": ObjectId(relacion.ingrediente_id)})
+        ingrediente = await find_by_id("ingredientes", relacion.ingrediente_id)
     else:
         ingrediente = None
     
@@ -156,6 +155,7 @@ async def create_producto_ingrediente(relacion: ProductoIngredienteCreate):
     relacion_dict = relacion.dict()
     result = await collection.insert_one(relacion_dict)
     created_relacion = await collection.find_one({"_id": result.inserted_id})
+    await registrar_cambio("producto_ingredientes", str(result.inserted_id))
     
     return created_relacion
 
@@ -180,4 +180,5 @@ async def delete_producto_ingrediente(relacion_id: str):
     if result.deleted_count == 0:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Relación no encontrada")
     
+    await registrar_cambio("producto_ingredientes", relacion_id, "delete")
     return None
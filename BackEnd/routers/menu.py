@@ -0,0 +1,43 @@
+from fastapi import APIRouter, HTTPException, Request, Response, status
+from core.cache_http import CATALOGO_CACHE_CONTROL, etag_coincidente, etag_con_codificacion
+from core.compresion import elegir_codificacion
+from core.menu import menu_cache
+
+router = APIRouter()
+
+@router.get("/")
+async def get_menu(request: Request):
+    """Obtener el menú completo (categorías, productos, variantes e ingredientes)"""
+    try:
+        snapshot = await menu_cache.obtener()
+    except RuntimeError as exc:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(exc))
+    
+    etag = snapshot.etag
+    codificacion = elegir_codificacion(request.headers.get("accept-encoding"))
+    if codificacion not in snapshot.representaciones:
+        codificacion = None
+    
+    # Cada codificación es una representación distinta: su propio ETag fuerte
+    headers = {
+        "ETag": etag_con_codificacion(etag, codificacion),
+        "Cache-Control": CATALOGO_CACHE_CONTROL,
+        "Vary": "Accept-Encoding",
+    }
+    # La última reconstrucción falló: se sirve el snapshot anterior
+    if menu_cache.ultimo_error is not None:
+        headers["X-Data-Stale"] = "1"
+    
+    etag_cliente = etag_coincidente(request.headers.get("if-none-match"), etag)
+    if etag_cliente:
+        headers["ETag"] = etag_cliente
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    if codificacion:
+        headers["Content-Encoding"] = codificacion
+    
+    return Response(
+        content=snapshot.representaciones[codificacion],
+        media_type="application/json",
+        headers=headers
+    )
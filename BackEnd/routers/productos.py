@@ -5,7 +5,8 @@ from models.producto import (
     ProductoCreate, ProductoUpdate, ProductoResponse,
     VarianteCreate, VarianteUpdate, VarianteResponse
 )
-from database import get_collection
+from database import get_collection, find_by_id
+from core.catalogo import registrar_cambio
 
 router = APIRouter()
 
@@ -30,6 +31,7 @@ async def create_producto(producto: ProductoCreate):
     producto_dict = producto.dict()
     result = await collection.insert_one(producto_dict)
     created_producto = await collection.find_one({"_id": result.inserted_id})
+    await registrar_cambio("productos", str(result.inserted_id))
     
     return serialize_doc(created_producto)
 
@@ -58,12 +60,10 @@ async def get_productos(
 @router.get("/{producto_id}", response_model=ProductoResponse)
 async def get_producto(producto_id: str):
     """Obtener un producto por ID"""
-    collection = get_collection("productos")
-    
     if not ObjectId.is_valid(producto_id):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="ID inválido")
     
-    producto = await collection.find_one({"_id": ObjectId(producto_id)})
+    producto = await find_by_id("productos", producto_id)
     if not producto:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Producto no encontrado")
     
@@ -91,6 +91,7 @@ async def update_producto(producto_id: str, producto: ProductoUpdate):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Producto no encontrado")
     
     updated_producto = await collection.find_one({"_id": ObjectId(producto_id)})
+    await registrar_cambio("productos", producto_id)
     return serialize_doc(updated_producto)
 
 @router.delete("/{producto_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -106,6 +107,7 @@ async def delete_producto(producto_id: str):
     if result.deleted_count == 0:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Producto no encontrado")
     
+    await registrar_cambio("productos", producto_id, "delete")
     return None
 
 # ============= VARIANTES =============
@@ -116,11 +118,10 @@ async def create_variante(producto_id: str, variante: VarianteCreate):
     collection = get_collection("variantes")
     
     # Verificar que el producto existe
-    productos_collection = get_collection("productos")
     if not ObjectId.is_valid(producto_id):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="ID de producto inválido")
     
-    producto = await productos_collection.find_one({"_id": ObjectId(producto_id)})
+    producto = await find_by_id("productos", producto_id)
     if not producto:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Producto no encontrado")
     
@@ -129,6 +130,7 @@ async def create_variante(producto_id: str, variante: VarianteCreate):
     
     result = await collection.insert_one(variante_dict)
     created_variante = await collection.find_one({"_id": result.inserted_id})
+    await registrar_cambio("variantes", str(result.inserted_id))
     
     return created_variante
 
@@ -162,6 +164,7 @@ async def update_variante(variante_id: str, variante: VarianteUpdate):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Variante no encontrada")
     
     updated_variante = await collection.find_one({"_id": ObjectId(variante_id)})
+    await registrar_cambio("variantes", variante_id)
     return updated_variante
 
 @router.delete("/variantes/{variante_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -177,4 +180,5 @@ async def delete_variante(variante_id: str):
     if result.deleted_count == 0:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Variante no encontrada")
     
+    await registrar_cambio("variantes", variante_id, "delete")
     return None
@@ -0,0 +1,65 @@
+from fastapi import APIRouter, Query
+from bson import ObjectId
+from core.catalogo import COLECCIONES_CATALOGO
+from core.cambios import COLECCION_LOG, contiguas, estado_log
+from database import get_collection
+
+router = APIRouter()
+
+def serialize_doc(doc):
+    """Convertir ObjectId a string para serialización"""
+    if doc is None:
+        return None
+    doc["_id"] = str(doc["_id"])
+    return doc
+
+@router.get("/")
+async def sync_catalogo(since: int = 0, limit: int = Query(1000, ge=1, le=5000)):
+    """
+    Obtener los cambios del catálogo posteriores a la secuencia `since`.
+    Si el log ya no cubre ese punto se responde `full_resync: true` y el
+    cliente debe descargar el catálogo completo (por ejemplo desde /api/menu).
+    """
+    estado = await estado_log()
+
+    if since <= 0 or since < estado["min_seq"] - 1 or since > estado["seq"]:
+        return {"full_resync": True, "seq": estado["seq"], "cambios": {}}
+
+    entradas = await get_collection(COLECCION_LOG).find(
+        {"seq": {"$gt": since}}
+    ).sort("seq", 1).limit(limit).to_list(length=limit)
+    leidas = len(entradas)
+    # El cursor no debe saltarse una secuencia reservada que aún no se inserta
+    entradas = contiguas(entradas, since)
+
+    # Solo interesa la última operación de cada documento
+    ultimas = {}
+    for entrada in entradas:
+        ultimas[(entrada["coleccion"], entrada["doc_id"])] = entrada["operacion"]
+
+    cambios = {}
+    for coleccion in COLECCIONES_CATALOGO:
+        ids = [doc_id for (col, doc_id), op in ultimas.items() if col == coleccion and op != "delete"]
+        tombstones = [doc_id for (col, doc_id), op in ultimas.items() if col == coleccion and op == "delete"]
+
+        upserts = []
+        if ids:
+            object_ids = [ObjectId(doc_id) for doc_id in ids if ObjectId.is_valid(doc_id)]
+            docs = await get_collection(coleccion).find({"_id": {"$in": object_ids}}).to_list(length=None)
+            encontrados = set()
+            for doc in docs:
+                upserts.append(serialize_doc(doc))
+                encontrados.add(doc["_id"])
+            # Documentos borrados sin entrada de borrado: se informan como tombstones
+            tombstones.extend(doc_id for doc_id in ids if doc_id not in encontrados)
+
+        if upserts or tombstones:
+            cambios[coleccion] = {"upserts": upserts, "tombstones": tombstones}
+
+    hay_mas = leidas == limit and len(entradas) == leidas
+    return {
+        "full_resync": False,
+        "seq": entradas[-1]["seq"] if entradas else since,
+        "hay_mas": hay_mas,
+        "cambios": cambios
+    }
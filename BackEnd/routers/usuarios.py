@@ -2,11 +2,19 @@ from fastapi import APIRouter, HTTPException, status
 from typing import List
 from bson import ObjectId
 from models.usuario import UsuarioCreate, UsuarioUpdate, UsuarioResponse, UsuarioLogin
-from database import get_collection
-from passlib.context import CryptContext
+from database import get_collection, find_by_id, invalidar_cache
+from core.trazas import trazar
 
 router = APIRouter()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+_pwd_context = None
+
+def get_pwd_context():
+    """CryptContext de bcrypt, creado en el primer uso (passlib no se importa al arrancar)"""
+    global _pwd_context
+    if _pwd_context is None:
+        from passlib.context import CryptContext
+        _pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    return _pwd_context
 
 def serialize_doc(doc):
     """Convierte ObjectId a string para serialización JSON"""
@@ -20,10 +28,12 @@ def serialize_docs(docs):
     return [serialize_doc(doc) for doc in docs]
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    with trazar("bcrypt.hash"):
+        return get_pwd_context().hash(password)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    with trazar("bcrypt.verify"):
+        return get_pwd_context().verify(plain_password, hashed_password)
 
 @router.post("/", status_code=status.HTTP_201_CREATED)
 async def create_usuario(usuario: UsuarioCreate):
@@ -56,12 +66,10 @@ async def get_usuarios(skip: int = 0, limit: int = 100):
 @router.get("/{usuario_id}")
 async def get_usuario(usuario_id: str):
     """Obtener un usuario por ID"""
-    collection = get_collection("usuarios")
-    
     if not ObjectId.is_valid(usuario_id):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="ID inválido")
     
-    usuario = await collection.find_one({"_id": ObjectId(usuario_id)})
+    usuario = await find_by_id("usuarios", usuario_id)
     if not usuario:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Usuario no encontrado")
     
@@ -84,6 +92,7 @@ async def update_usuario(usuario_id: str, usuario: UsuarioUpdate):
         {"_id": ObjectId(usuario_id)},
         {"$set": update_data}
     )
+    invalidar_cache("usuarios", usuario_id)
     
     if result.modified_count == 0:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Usuario no encontrado")
@@ -100,6 +109,7 @@ async def delete_usuario(usuario_id: str):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="ID inválido")
     
     result = await collection.delete_one({"_id": ObjectId(usuario_id)})
+    invalidar_cache("usuarios", usuario_id)
     
     if result.deleted_count == 0:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Usuario no encontrado")
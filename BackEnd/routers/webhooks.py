@@ -0,0 +1,27 @@
+from fastapi import APIRouter, HTTPException, Request, status
+from core.webhooks import (
+    HEADER_FIRMA, WEBHOOK_SECRETOS, EventoInvalido, bandeja_webhooks, firma_valida, leer_evento, webhooks_recibidos,
+)
+
+router = APIRouter()
+
+@router.post("/pagos/{pasarela}")
+async def recibir_webhook_pago(pasarela: str, request: Request):
+    """Recibir un cambio de estado de pago desde la pasarela (se procesa en segundo plano)"""
+    if pasarela not in WEBHOOK_SECRETOS:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Pasarela no configurada")
+    
+    cuerpo = await request.body()
+    if not firma_valida(pasarela, cuerpo, request.headers.get(HEADER_FIRMA)):
+        webhooks_recibidos.inc((pasarela, "firma_invalida"))
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Firma inválida")
+    
+    try:
+        evento = leer_evento(pasarela, cuerpo)
+    except EventoInvalido as exc:
+        webhooks_recibidos.inc((pasarela, "invalido"))
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+    
+    # La pasarela reintenta hasta recibir un 2xx: un duplicado también se confirma
+    nuevo = await bandeja_webhooks.recibir(evento)
+    return {"recibido": True, "duplicado": not nuevo}
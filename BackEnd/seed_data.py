@@ -10,8 +10,6 @@ from passlib.context import CryptContext
 MONGO_URL = "mongodb://localhost:27017"
 DB_NAME = "freshbowl"
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 # Datos de prueba
 CATEGORIAS = [
     {"nombre": "Ensaladas Clásicas", "descripcion": "Las favoritas de siempre", "activa": True},
@@ -103,11 +101,12 @@ PRODUCTOS = [
     },
 ]
 
+# Las contraseñas se hashean en usuarios_demo(), no al importar el módulo
 USUARIOS = [
     {
         "nombre": "Admin Fresh Bowl",
         "email": "admin@freshbowl.cl",
-        "hash_password": pwd_context.hash("admin123"),
+        "password": "admin123",
         "telefono": "+56912345678",
         "email_verificado": True,
         "activo": True
@@ -115,13 +114,23 @@ USUARIOS = [
     {
         "nombre": "Cliente Demo",
         "email": "cliente@demo.cl",
-        "hash_password": pwd_context.hash("demo123"),
+        "password": "demo123",
         "telefono": "+56987654321",
         "email_verificado": True,
         "activo": True
     }
 ]
 
+def usuarios_demo():
+    """USUARIOS con la contraseña reemplazada por su hash bcrypt"""
+    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    usuarios = []
+    for usuario in USUARIOS:
+        usuario = dict(usuario)
+        usuario["hash_password"] = pwd_context.hash(usuario.pop("password"))
+        usuarios.append(usuario)
+    return usuarios
+
 async def seed_database():
     print("🌱 Conectando a MongoDB...")
     client = AsyncIOMotorClient(MONGO_URL)
@@ -151,7 +160,7 @@ async def seed_database():
     
     # Insertar usuarios
     print("👤 Insertando usuarios...")
-    user_result = await db.usuarios.insert_many(USUARIOS)
+    user_result = await db.usuarios.insert_many(usuarios_demo())
     print(f"   ✅ {len(user_result.inserted_ids)} usuarios creados")
     
     # Mostrar resumen
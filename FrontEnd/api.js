@@ -37,6 +37,11 @@
       
       // Para respuestas 204 No Content
       if (res.status === 204) return { success: true };
+
+      // El backend sirvió una copia guardada porque la base de datos no responde
+      if (res.headers.get("X-Data-Stale")) {
+        console.warn("API: datos posiblemente desactualizados", url);
+      }
       
       return await res.json();
     } catch (err) {
@@ -149,6 +154,13 @@
     return await safeFetch(`${API_BASE}/productos/${productoId}`);
   }
 
+  // ============= MENÚ =============
+
+  // Menú completo en una sola petición (categorías → productos → variantes → ingredientes)
+  async function getMenu() {
+    return await safeFetch(`${API_BASE}/menu/`);
+  }
+
   // ============= CATEGORÍAS =============
   
   async function getCategorias() {
@@ -348,6 +360,7 @@
     // Productos
     getProductos,
     getProducto,
+    getMenu,
     
     // Ingredientes
     getIngredientes,